@@ -1,24 +1,43 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from services.startup_report import startup_report
+from flask import Flask, request, jsonify, Response, g
 from config.config import AppConfig
 from services.text_processor_service import TextProcessorService
+from services.preprocessing_service import PreprocessingService
 from services.vllm_service import VllmService
 from services.automatic_review_service import AutomaticReviewService
+from services.health_service import HealthService
+from services.json_codec import FastJSONProvider, HAS_ORJSON
+from services.paper_registry_service import PaperRegistryService, PaperNotFoundError
+from services.review_archive_service import ReviewArchiveService, ReviewNotFoundError
+from services.single_flight import IdempotencyStore, IdempotencyConflictError
+from services.request_context import set_request_context, reset_request_context, get_request_context, parse_priority
+from services.rate_limiter import TokenRateLimiter, RateLimitExceededError
+from services.usage_service import UsageRecorder
+from services.logging_service import configure_logging, restart_after_fork as restart_logging_after_fork
+from services.cache_service import LRUCache
+from services.compression_service import RequestDecompressionMiddleware, compress_response
+from services.tracing_service import trace_span, start_trace, finish_trace, encode_trace_header, RequestProfiler
+from services.metrics_service import (
+    render_metrics, configure_multiprocess as configure_multiprocess_metrics, reset_metrics_after_fork, CONTENT_TYPE_LATEST, TEXT_PROCESSING_SECONDS, DB_WRITE_SECONDS, IDEMPOTENT_REQUESTS_TOTAL
+)
 from models.paper_models import PaperRequest
+import functools
+import hashlib
 import logging
+import math
 import time
 import json
 import random
 import uuid
 from datetime import datetime
-import mysql.connector
-from mysql.connector import Error
 from contextlib import contextmanager
 import os
+import threading
 
-# 配置日志
+# 启动阶段的日志；create_app 中按 LoggingConfig 切换为队列 + 后台写出
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+startup_report.record_imports()
 
 # MySQL 数据库配置
 DB_CONFIG = {
@@ -59,10 +78,53 @@ def prepare_deep_review_sections(sections):
                 prepared[name] = content
     return [{"name": name, "content": prepared[name]} for name in desired_order if name in prepared]
 
+# 每个进程的数据库连接池大小，0 表示每次新建连接
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+
+# 连接池按进程创建：fork 出的 worker 不能复用父进程的连接
+_db_pool = None
+_db_pool_pid = None
+_db_pool_lock = threading.Lock()
+
+def _get_db_pool():
+    global _db_pool, _db_pool_pid
+    if DB_POOL_SIZE <= 0:
+        return None
+    with _db_pool_lock:
+        if _db_pool is None or _db_pool_pid != os.getpid():
+            from mysql.connector import Error
+            from mysql.connector.pooling import MySQLConnectionPool
+            try:
+                _db_pool = MySQLConnectionPool(pool_name=f"review_{os.getpid()}", pool_size=DB_POOL_SIZE, **DB_CONFIG)
+                _db_pool_pid = os.getpid()
+                logger.info("数据库连接池已创建: %s 个连接", DB_POOL_SIZE)
+            except Error as e:
+                logger.warning(f"数据库连接池创建失败，使用单独连接: {str(e)}")
+                _db_pool = None
+        return _db_pool
+
+def reset_db_pool():
+    """丢弃继承自父进程的连接池（fork 后调用），下次使用时重新创建"""
+    global _db_pool, _db_pool_pid
+    _db_pool = None
+    _db_pool_pid = None
+
 @contextmanager
-def get_db():
-    """获取数据库连接"""
-    conn = mysql.connector.connect(**DB_CONFIG)
+def get_db(pooled=True):
+    """获取数据库连接（默认从连接池获取，close 时归还）"""
+    # mysql.connector 首次使用时导入，不增加进程启动（含预处理子进程）的耗时与内存
+    import mysql.connector
+    from mysql.connector.errors import PoolError
+    
+    pool = _get_db_pool() if pooled else None
+    conn = None
+    if pool is not None:
+        try:
+            conn = pool.get_connection()
+        except PoolError:
+            logger.warning("数据库连接池已耗尽，使用单独连接")
+    if conn is None:
+        conn = mysql.connector.connect(**DB_CONFIG)
     try:
         yield conn
     finally:
@@ -70,8 +132,10 @@ def get_db():
 
 def init_db():
     """初始化数据库表"""
+    from mysql.connector import Error
     try:
-        with get_db() as conn:
+        # 启动时只用一次，不创建连接池（preload 时避免父进程持有连接）
+        with get_db(pooled=False) as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS blind_review_sessions (
@@ -104,6 +168,9 @@ def init_db():
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
+            cursor.execute(PaperRegistryService.CREATE_TABLE_SQL)
+            cursor.execute(ReviewArchiveService.CREATE_TABLE_SQL)
+            cursor.execute(UsageRecorder.CREATE_TABLE_SQL)
             conn.commit()
             cursor.close()
             logger.info("数据库表初始化成功")
@@ -111,33 +178,385 @@ def init_db():
         logger.error(f"数据库初始化失败: {str(e)}")
         raise
 
+def probe_db():
+    """数据库连通性探测（健康检查使用）"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1')
+        cursor.fetchall()
+        cursor.close()
+
 # 存储盲评会话信息（内存缓存，用于快速查询当前会话）
 blind_review_sessions = {}
 
-def create_app():
+def create_app(start_background_tasks=True):
+    """
+    创建应用
+    
+    Args:
+        start_background_tasks: 是否立即启动后台线程（健康检查等）。
+            gunicorn preload 时在父进程中创建应用，传 False，由各 worker 在 init_worker_process 中启动
+    """
+    create_started = time.perf_counter()
     app = Flask(__name__)
     
-    # JSON配置
+    # JSON配置（安装 orjson 时使用高性能编解码）
+    app.json = FastJSONProvider(app)
     app.config['JSON_AS_ASCII'] = False  
     app.config['JSON_Sort_KEYS'] = False
     app.json.ensure_ascii = False
+    logger.info("JSON 编解码: %s", 'orjson' if HAS_ORJSON else 'json')
     
+    # flask_cors 与 mysql.connector 只在创建应用时导入（预处理子进程导入本模块时不加载）
+    from flask_cors import CORS
+    from mysql.connector import Error
     CORS(app)
     
     # 初始化服务
     config = AppConfig()
+    configure_logging(config.logging)
+    configure_multiprocess_metrics(config.metrics.multiprocess_dir, config.metrics.flush_interval)
+    
+    # 请求体大小上限：Flask 在读取时兜底，before_request 按 Content-Length 提前拒绝
+    app.config['MAX_CONTENT_LENGTH'] = config.server.max_request_bytes
+    # gzip / zstd 请求体在进入 Flask 前解压，解压后大小同样受 max_request_bytes 限制
+    app.wsgi_app = RequestDecompressionMiddleware(app.wsgi_app, config.server.max_request_bytes)
     vllm_service = VllmService(config)
-    automatic_review_service = AutomaticReviewService(config, vllm_service)
+    # 每次生成的 token 用量与性能记录（后台批量写入）
+    usage_recorder = UsageRecorder(config.usage, get_db)
+    
+    # 论文解析与 token 统计的进程池（PREPROCESS_WORKERS=0 时在请求线程内执行）
+    preprocessing = PreprocessingService(config.preprocessing, config.normalization.steps)
+    # 配置了 TOKENIZER_PATH 时按 tokenizer 统计 prompt 长度，否则按字符数估算
+    automatic_review_service = AutomaticReviewService(
+        config, vllm_service, usage_recorder,
+        token_counter=preprocessing.count_tokens if preprocessing.has_tokenizer else None
+    )
     
     # 初始化数据库
     init_db()
     
+    # 依赖健康检查（后台探测，接口只读缓存）
+    health_service = HealthService(config, vllm_service, db_probe=probe_db)
+    if config.health.enabled and start_background_tasks:
+        health_service.start()
+    
+    # 提示词模板与（进程内的）tokenizer 在 fork 前加载，各 worker 共享
+    automatic_review_service.preload_templates()
+    preprocessing.preload()
+    
+    # 供 init_worker_process 在 fork 后重置
+    app.extensions["review_services"] = {
+        "config": config,
+        "vllm_service": vllm_service,
+        "health_service": health_service,
+        "preprocessing": preprocessing,
+        "usage_recorder": usage_recorder
+    }
+    
+    # 论文注册：上传一次，之后按 paper_id 评审
+    paper_registry = PaperRegistryService(get_db, preprocessing=preprocessing)
+    
+    # 盲评结果归档：按 session_id 重新获取
+    review_archive = ReviewArchiveService(get_db, config.cache.review_archive_max_bytes)
+    
+    # 启动时校验规范化步骤配置，避免到请求时才报错
+    TextProcessorService(normalization_steps=config.normalization.steps)
+    
+    # 论文文本缓存：(内容哈希, include_authors, 规范化步骤) -> (论文文本, token 数)
+    processed_text_cache = LRUCache("processed_text", config.cache.processed_text_max_bytes)
+    
+    # 按 token 成本的客户端限流
+    rate_limiter = TokenRateLimiter(config.rate_limit, config.server.worker_processes)
+    # X-API-Key 由调用方提供，只信任已登记的 key；否则每次换一个 key 就能拿到一个新的满桶
+    registered_api_keys = frozenset(config.rate_limit.api_keys)
+    
+    def load_paper_content(paper_request, text_processor, endpoint, generations):
+        """
+        获取论文文本及其 token 数（无 tokenizer 时为 None）
+        已注册论文直接用提取好的各部分组装，否则解析 paper_json；结果按内容哈希缓存
+        use_chunking 且论文超过单次评审预算时，返回分块摘要后的文本
+        
+        generations 为本次请求要执行的生成 [(模型名, 模板)]，用于在生成（包括分块摘要）之前预扣 token 额度
+        """
+        with trace_span("process_paper_json", paper_id=paper_request.paper_id), TEXT_PROCESSING_SECONDS.labels(endpoint=endpoint).time():
+            # paper_id 本身就是内容哈希，与 paper_json 共用缓存
+            content_hash = paper_request.paper_id or TextProcessorService.compute_content_hash(paper_request.paper_json)
+            cache_key = (content_hash, bool(paper_request.include_authors), text_processor.normalization_steps)
+            result = processed_text_cache.get(cache_key)
+            if result is not None:
+                logger.info("论文文本缓存命中: %s", content_hash[:12])
+            else:
+                # 解析、规范化与分词在预处理进程池中执行，不占用本进程的 GIL
+                include_authors = bool(paper_request.include_authors)
+                if paper_request.paper_id:
+                    sections = paper_registry.get_sections(paper_request.paper_id)
+                    paper_content = preprocessing.assemble_text(sections, include_authors)
+                else:
+                    paper_content = preprocessing.process_paper_json(paper_request.paper_json, include_authors)
+                
+                result = (paper_content, preprocessing.count_tokens(paper_content))
+                processed_text_cache.put(cache_key, result)
+        
+        reserve_review_tokens(paper_request, text_processor, *result, generations)
+        if paper_request.use_chunking:
+            result = condense_paper_content(paper_request, text_processor, cache_key, *result)
+        return result
+    
+    def reserve_review_tokens(paper_request, text_processor, paper_content, token_count, generations):
+        """按论文 token 数与 max_tokens 预扣额度，超出时抛出 RateLimitExceededError；请求结束后按实际用量结算"""
+        if not rate_limiter.enabled:
+            return
+        prompt_tokens = token_count if token_count is not None else text_processor.estimate_tokens(paper_content)
+        cost = 0
+        for model_name, template in generations:
+            if paper_request.max_tokens == "auto":
+                completion_tokens = automatic_review_service.token_budget.auto_max_tokens(vllm_service.get_model(model_name), template)
+            else:
+                completion_tokens = int(paper_request.max_tokens)
+            cost += prompt_tokens + completion_tokens
+        g.rate_limit_reservation = rate_limiter.reserve(g.rate_limit_client, cost)
+        g.rate_limit_prompt_tokens = prompt_tokens * len(generations)
+    
+    def settle_review_tokens():
+        """按实际用量结算预扣的额度；合并到其他请求的生成不计入（该请求没有调用 vLLM）"""
+        reservation = g.pop('rate_limit_reservation', None)
+        if reservation is None:
+            return
+        usage = get_request_context().usage
+        actual = 0
+        if usage.calls:
+            # 流式调用不返回 prompt 用量，至少按论文 token 数计
+            actual = max(usage.prompt_tokens, g.pop('rate_limit_prompt_tokens', 0)) + usage.completion_tokens
+        rate_limiter.reconcile(reservation, actual)
+    
+    def rate_limited_response(error, body):
+        response = jsonify(body)
+        response.headers["Retry-After"] = str(max(math.ceil(error.retry_after), 1))
+        return response, 429
+    
+    def condense_paper_content(paper_request, text_processor, cache_key, paper_content, token_count):
+        """超过单次评审预算的论文改用分块摘要后的文本（同样按内容哈希缓存）"""
+        estimated = token_count if token_count is not None else text_processor.estimate_tokens(paper_content)
+        if estimated <= config.chunking.single_pass_max_tokens:
+            return paper_content, token_count
+        
+        condensed_key = cache_key + ("condensed",)
+        cached = processed_text_cache.get(condensed_key)
+        if cached is not None:
+            logger.info("分块摘要缓存命中: %s", cache_key[0][:12])
+            return cached
+        
+        logger.info("论文约 %d token，超过单次评审预算 %d，使用分块评审", estimated, config.chunking.single_pass_max_tokens)
+        if paper_request.paper_id:
+            sections = paper_registry.get_sections(paper_request.paper_id)
+        else:
+            sections = text_processor.extract_sections(paper_request.paper_json)
+        condensed = automatic_review_service.condense_paper(sections, text_processor, paper_request.temperature)
+        
+        result = (condensed, preprocessing.count_tokens(condensed))
+        processed_text_cache.put(condensed_key, result)
+        logger.info("分块摘要完成: %d 字符 => %d 字符", len(paper_content), len(condensed))
+        return result
+    
+    def all_reviews_failed_response(error_message, *review_results):
+        """两个模型均失败时的响应：有端点熔断时返回 503 与 Retry-After，否则 500"""
+        errors = "; ".join(result.get("error", "未知错误") for result in review_results)
+        response = jsonify({"error": f"{error_message}: {errors}"})
+        retry_after = [result["retry_after"] for result in review_results if result.get("circuit_open")]
+        if retry_after:
+            response.headers["Retry-After"] = str(min(retry_after))
+            return response, 503
+        return response, 500
+    
+    # Idempotency-Key：相同 key 的并发请求只执行一次，成功的响应在 ttl 内可重放（保存在本 worker 进程内，不跨 worker）
+    idempotency = IdempotencyStore(config.cache.idempotency_max_bytes, config.cache.idempotency_ttl)
+    
+    def idempotent(view):
+        """评审接口装饰器：带 Idempotency-Key 头时，重试请求（包括连接断开后的重试）取回原请求的结果"""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get('Idempotency-Key', '').strip()
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > 255:
+                return jsonify({"error": "Idempotency-Key 过长（最多 255 个字符）"}), 400
+            
+            def execute():
+                response = app.make_response(view(*args, **kwargs))
+                headers = [(name, value) for name, value in response.headers.items()
+                           if name not in ('Content-Type', 'Content-Length')]
+                return response.get_data(), response.status_code, response.mimetype, headers
+            
+            fingerprint = IdempotencyStore.fingerprint(request.get_data(cache=True))
+            try:
+                # key 由客户端自行生成，按客户端区分，不同客户端用了相同的 key 不会取到彼此的响应
+                (body, status, mimetype, headers), outcome = idempotency.run(
+                    (request.endpoint, g.rate_limit_client, key), fingerprint, execute,
+                    should_store=lambda value: 200 <= value[1] < 300
+                )
+            except IdempotencyConflictError as e:
+                IDEMPOTENT_REQUESTS_TOTAL.labels(endpoint=request.endpoint, outcome="conflict").inc()
+                return jsonify({"error": str(e)}), 422
+            
+            IDEMPOTENT_REQUESTS_TOTAL.labels(endpoint=request.endpoint, outcome=outcome).inc()
+            response = Response(body, status=status, mimetype=mimetype, headers=headers)
+            if outcome != "executed":
+                logger.info("Idempotency-Key 命中（%s）: %s", outcome, request.endpoint)
+                response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        return wrapper
+    
+    # 单请求阶段追踪与采样式性能剖析
+    request_profiler = RequestProfiler(config)
+    trace_header = config.tracing.debug_header
+    
+    @app.before_request
+    def reject_oversized_body():
+        content_length = request.content_length
+        if content_length is not None and content_length > config.server.max_request_bytes:
+            logger.warning(f"请求体过大: {content_length} 字节 > {config.server.max_request_bytes} 字节")
+            return jsonify({
+                "error": f"请求体过大: {content_length} 字节，上限 {config.server.max_request_bytes} 字节"
+            }), 413
+    
+    @app.after_request
+    def compress_large_response(response):
+        return compress_response(
+            response,
+            request.headers.get('Accept-Encoding', ''),
+            min_bytes=config.server.response_compression_min_bytes,
+            level=config.server.compression_level
+        )
+    
+    @app.before_request
+    def bind_request_context():
+        # 限流按已登记的 API key（只保留哈希）或直连对端 IP 计量；调度器另外接受 X-Client-Id 区分同一来源下的客户端
+        api_key = request.headers.get('X-API-Key', '').strip()
+        if api_key and api_key in registered_api_keys:
+            g.rate_limit_client = "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        else:
+            g.rate_limit_client = f"ip:{request.remote_addr}"
+        # 日志按 request_id 关联：沿用调用方的 X-Request-Id，没有时生成
+        g.request_id = request.headers.get('X-Request-Id', '').strip()[:64] or uuid.uuid4().hex
+        # 调度器按优先级（X-Review-Priority: interactive / bulk，默认 interactive）与客户端排队
+        g.request_context_token = set_request_context(
+            priority=parse_priority(request.headers.get('X-Review-Priority', '')),
+            client_id=request.headers.get('X-Client-Id') or g.rate_limit_client,
+            endpoint=request.endpoint,
+            request_id=g.request_id
+        )
+    
+    @app.after_request
+    def add_request_id_header(response):
+        request_id = getattr(g, 'request_id', None)
+        if request_id:
+            response.headers['X-Request-Id'] = request_id
+        return response
+    
+    @app.before_request
+    def begin_request_trace():
+        g.request_start = time.perf_counter()
+        g.trace_root, g.trace_token = start_trace(request.path, method=request.method)
+        g.profile_state = None
+        if request.method == 'POST':
+            forced = request.headers.get(trace_header, '').lower() == 'profile'
+            if request_profiler.should_profile(forced=forced):
+                g.profile_state = request_profiler.start(forced=forced)
+    
+    @app.after_request
+    def end_request_trace(response):
+        root = getattr(g, 'trace_root', None)
+        if root is None:
+            return response
+        finish_trace(root, g.trace_token)
+        g.trace_root = None
+        duration = time.perf_counter() - g.request_start
+        
+        profile_prefix = None
+        if g.profile_state is not None:
+            profile_prefix = request_profiler.stop(g.profile_state, request.path, duration, root)
+            g.profile_state = None
+        
+        if request.headers.get(trace_header):
+            response.headers['X-Review-Trace'] = encode_trace_header(
+                root, config.tracing.header_max_bytes, full_trace=f"{profile_prefix}.json" if profile_prefix else None
+            )
+        return response
+    
+    @app.teardown_request
+    def unbind_request_context(exc):
+        token = getattr(g, 'request_context_token', None)
+        if token is not None:
+            settle_review_tokens()
+            reset_request_context(token)
+            g.request_context_token = None
+    
+    @app.teardown_request
+    def cleanup_request_trace(exc):
+        # 未经过 after_request 的异常请求，确保追踪与剖析状态被释放
+        root = getattr(g, 'trace_root', None)
+        if root is not None:
+            finish_trace(root, g.trace_token)
+            g.trace_root = None
+        if getattr(g, 'profile_state', None) is not None:
+            request_profiler.stop(g.profile_state, request.path, time.perf_counter() - g.request_start, root)
+            g.profile_state = None
+    
     @app.route('/api/papers/health', methods=['GET'])
     def health():
-        """健康检查接口"""
-        return jsonify({"message": "Paper Review Backend is running!"}), 200
+        """健康检查接口 - 返回缓存的依赖状态"""
+        status = health_service.get_status()
+        status["caches"] = {
+            processed_text_cache.name: processed_text_cache.stats(),
+            review_archive.cache.name: review_archive.cache.stats(),
+            idempotency.cache.name: idempotency.stats()
+        }
+        status["preprocessing"] = preprocessing.stats()
+        status["scheduler"] = vllm_service.get_scheduler_stats()
+        status["rate_limit"] = rate_limiter.stats()
+        status["usage"] = usage_recorder.stats()
+        status["startup"] = startup_report.snapshot()
+        status["token_budget"] = automatic_review_service.token_budget.get_stats()
+        strict = request.args.get('strict', 'false').lower() == 'true'
+        if strict and status["status"] != "ok":
+            return jsonify(status), 503
+        return jsonify(status), 200
+    
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus 指标接口"""
+        return Response(render_metrics(), content_type=CONTENT_TYPE_LATEST)
+    
+    @app.route('/api/papers/registry', methods=['POST'])
+    def register_paper():
+        """论文注册接口 - 解析一次并保存，返回 paper_id"""
+        try:
+            data = request.get_json() or {}
+            paper_json = data.get('paper_json')
+            if not paper_json or not isinstance(paper_json, dict):
+                return jsonify({"error": "必须提供 paper_json（JSON格式的论文数据）"}), 400
+            
+            result = paper_registry.register(paper_json)
+            return jsonify(result), 201 if result["created"] else 200
+            
+        except Exception as e:
+            logger.error(f"论文注册失败: {str(e)}")
+            return jsonify({"error": f"论文注册失败: {str(e)}"}), 500
+    
+    @app.route('/api/papers/registry/<paper_id>', methods=['GET'])
+    def get_registered_paper(paper_id):
+        """查询已注册论文信息"""
+        try:
+            return jsonify(paper_registry.describe(paper_id)), 200
+        except PaperNotFoundError as e:
+            return jsonify({"error": str(e)}), 404
+        except Exception as e:
+            logger.error(f"查询论文失败: {str(e)}")
+            return jsonify({"error": f"查询论文失败: {str(e)}"}), 500
     
     @app.route('/api/papers/automatic-review', methods=['POST'])
+    @idempotent
     def automatic_review():
         """自动评审接口"""
         try:
@@ -150,29 +569,26 @@ def create_app():
             start_time = time.time()
             
             # 文本处理器
-            text_processor = TextProcessorService(include_authors=paper_request.include_authors)
+            text_processor = TextProcessorService(include_authors=paper_request.include_authors,
+                                                  normalization_steps=config.normalization.steps)
             
             # 获取完整论文内容
-            paper_content = text_processor.process_paper_json(paper_request.paper_json, auto_truncate=False)
+            paper_content, paper_token_length = load_paper_content(paper_request, text_processor, "automatic_review",
+                                                                    [(None, "automatic_review")])
             
             # 记录原始论文内容长度
-            logger.info(f"论文内容长度: {len(paper_content):,} 字符")
+            logger.info("论文内容长度: %d 字符", len(paper_content))
             
             # 检查是否可能超出模型上下文窗口
-            if text_processor.tokenizer:
-                try:
-                    tokens = text_processor.tokenizer.encode(paper_content)
-                    paper_token_length = len(tokens)
-                    logger.info(f"论文 token 数量: {paper_token_length:,}")
-                    if paper_token_length > text_processor.MAX_TOKENS:
-                        logger.warning(f"警告: 论文 token 数量 ({paper_token_length}) 超过了设定的最大限制 ({text_processor.MAX_TOKENS})，可能会被模型截断")
-                except Exception as e:
-                    logger.warning(f"计算 token 数量时出错: {str(e)}")
+            if paper_token_length is not None:
+                logger.info("论文 token 数量: %d", paper_token_length)
+                if paper_token_length > text_processor.MAX_TOKENS:
+                    logger.warning(f"警告: 论文 token 数量 ({paper_token_length}) 超过了设定的最大限制 ({text_processor.MAX_TOKENS})，可能会被模型截断")
             
             # 生成评审
             logger.info("开始生成评审，正在调用模型...")
-            logger.info(f"使用温度设置: {paper_request.temperature}")
-            logger.info(f"最大生成token设置: {paper_request.max_tokens}")
+            logger.info("使用温度设置: %s", paper_request.temperature)
+            logger.info("最大生成token设置: %s", paper_request.max_tokens)
             review_result = automatic_review_service.generate_review(
                 paper_content=paper_content, 
                 temperature=paper_request.temperature,
@@ -193,13 +609,31 @@ def create_app():
                 reviews = automatic_review_service.format_automatic_review_to_frontend(full_review_result)
                 reviews = filter_missing_sections(reviews)
 
-                return jsonify(reviews), 200
+                response = jsonify(reviews)
+                # 响应体是章节列表，用量放在响应头中
+                response.headers["X-Review-Usage"] = json.dumps(review_result.get("usage", {}), separators=(",", ":"))
+                return response, 200
             else:
-                return jsonify([{
+                response = jsonify([{
                     "name": "Error",
                     "content": f"评审生成失败: {review_result.get('error', '未知错误')}"
-                }]), 500        
+                }])
+                if review_result.get("circuit_open"):
+                    # 端点熔断：立即返回 503，提示客户端稍后重试
+                    response.headers["Retry-After"] = str(review_result["retry_after"])
+                    return response, 503
+                return response, 500        
             
+        except PaperNotFoundError as e:
+            return jsonify([{
+                "name": "Error",
+                "content": str(e)
+            }]), 404
+        except RateLimitExceededError as e:
+            return rate_limited_response(e, [{
+                "name": "Error",
+                "content": str(e)
+            }])
         except Exception as e:
             logger.error(f"Automatic_Review评审失败: {str(e)}")
             return jsonify([{
@@ -208,6 +642,7 @@ def create_app():
             }]), 500
     
     @app.route('/api/papers/blind-review', methods=['POST'])
+    @idempotent
     def blind_review():
         """盲评接口 - 同时调用两个模型并随机打乱顺序"""
         try:
@@ -220,13 +655,15 @@ def create_app():
             start_time = time.time()
             
             # 文本处理器
-            text_processor = TextProcessorService(include_authors=paper_request.include_authors)
+            text_processor = TextProcessorService(include_authors=paper_request.include_authors,
+                                                  normalization_steps=config.normalization.steps)
             
             # 获取完整论文内容
-            paper_content = text_processor.process_paper_json(paper_request.paper_json, auto_truncate=False)
+            paper_content, paper_token_length = load_paper_content(paper_request, text_processor, "blind_review",
+                                                                    [(None, "automatic_review"), ("deep-review-7b", "deep_review")])
             
             # 记录原始论文内容长度
-            logger.info(f"论文内容长度: {len(paper_content):,} 字符")
+            logger.info("论文内容长度: %d 字符", len(paper_content))
             
             # 并行生成两个评审
             logger.info("开始生成两个模型的评审...")
@@ -282,6 +719,11 @@ def create_app():
                     "content": f"Deep Review 评审失败: {deep_review_result.get('error', '未知错误')}"
                 }]
             
+            # 两个模型均失败时不创建会话；只有一个失败时返回降级结果
+            degraded = "error" in automatic_review_result or "error" in deep_review_result
+            if "error" in automatic_review_result and "error" in deep_review_result:
+                return all_reviews_failed_response("盲评生成失败", automatic_review_result, deep_review_result)
+            
             # 创建会话ID
             session_id = str(uuid.uuid4())
             
@@ -300,16 +742,17 @@ def create_app():
             random.shuffle(reviews_list)
             
             # 存储会话信息到 MySQL 数据库
-            with get_db() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO blind_review_sessions 
-                    (session_id, timestamp, review_a_model, review_b_model)
-                    VALUES (%s, %s, %s, %s)
-                ''', (session_id, datetime.now(), 
-                      reviews_list[0]["model"], reviews_list[1]["model"]))
-                conn.commit()
-                cursor.close()
+            with trace_span("db_write", table="blind_review_sessions"), DB_WRITE_SECONDS.labels(table="blind_review_sessions").time():
+                with get_db() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        INSERT INTO blind_review_sessions 
+                        (session_id, timestamp, review_a_model, review_b_model)
+                        VALUES (%s, %s, %s, %s)
+                    ''', (session_id, datetime.now(), 
+                          reviews_list[0]["model"], reviews_list[1]["model"]))
+                    conn.commit()
+                    cursor.close()
             
             # 同时保持内存缓存
             blind_review_sessions[session_id] = {
@@ -324,8 +767,8 @@ def create_app():
                 }
             }
             
-            logger.info(f"盲评会话 {session_id} 创建成功")
-            logger.info(f"Review A: {reviews_list[0]['model']}, Review B: {reviews_list[1]['model']}")
+            logger.info("盲评会话 %s 创建成功", session_id)
+            logger.info("Review A: %s, Review B: %s", reviews_list[0]['model'], reviews_list[1]['model'])
             
             # 构建返回结果
             result = {
@@ -340,17 +783,48 @@ def create_app():
                         "sections": reviews_list[1]["reviews"]
                     }
                 ],
-                "processing_time": time.time() - start_time
+                "processing_time": time.time() - start_time,
+                # 两个评审合计的用量（不按评审区分，避免泄露模型分配）
+                "usage": get_request_context().usage.snapshot()
             }
+            if degraded:
+                result["degraded"] = True
+            
+            # 归档格式化后的评审（不含模型分配），刷新页面或再次查看时直接读取
+            archived = {key: value for key, value in result.items() if key not in ("processing_time", "usage")}
+            archived["created_at"] = blind_review_sessions[session_id]["timestamp"]
+            try:
+                review_archive.save(session_id, archived, (reviews_list[0]["model"], reviews_list[1]["model"]))
+            except Exception as e:
+                logger.warning(f"盲评结果归档失败: {session_id}: {str(e)}")
             
             return jsonify(result), 200
             
+        except PaperNotFoundError as e:
+            return jsonify({"error": str(e)}), 404
+        except RateLimitExceededError as e:
+            return rate_limited_response(e, {"error": str(e)})
         except Exception as e:
             logger.error(f"盲评失败: {str(e)}")
             return jsonify({
                 "error": f"盲评生成失败: {str(e)}"
             }), 500
     
+    @app.route('/api/papers/blind-review/<session_id>', methods=['GET'])
+    def get_blind_review(session_id):
+        """按 session_id 获取已归档的盲评结果（不重新生成）"""
+        try:
+            body = review_archive.get_json(session_id)
+            response = Response(body, status=200, mimetype='application/json')
+            # 归档结果不会变化，允许浏览器缓存
+            response.headers["Cache-Control"] = "private, max-age=3600"
+            return response
+        except ReviewNotFoundError as e:
+            return jsonify({"error": str(e)}), 404
+        except Exception as e:
+            logger.error(f"获取盲评结果失败: {str(e)}")
+            return jsonify({"error": f"获取盲评结果失败: {str(e)}"}), 500
+    
     @app.route('/api/papers/blind-review/submit-selection', methods=['POST'])
     def submit_selection():
         """提交用户选择的评审"""
@@ -362,32 +836,35 @@ def create_app():
             if not session_id or not selected_review_id:
                 return jsonify({"error": "缺少必要参数"}), 400
             
-            # 查找会话信息
+            # 查找会话信息（内存中没有时，如其他 worker 创建或服务已重启，从归档读取）
             session = blind_review_sessions.get(session_id)
-            if not session:
-                return jsonify({"error": "会话不存在"}), 404
+            if session:
+                models = {"review_a": session["review_a"]["model"], "review_b": session["review_b"]["model"]}
+            else:
+                try:
+                    models = review_archive.get_models(session_id)
+                except ReviewNotFoundError:
+                    return jsonify({"error": "会话不存在"}), 404
             
             # 确定用户选择的是哪个模型
-            if selected_review_id == "review_a":
-                selected_model = session["review_a"]["model"]
-            elif selected_review_id == "review_b":
-                selected_model = session["review_b"]["model"]
-            else:
+            if selected_review_id not in models:
                 return jsonify({"error": "无效的评审ID"}), 400
+            selected_model = models[selected_review_id]
             
             # 记录选择到 MySQL 数据库
-            with get_db() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO user_selections 
-                    (session_id, timestamp, selected_review_id, selected_model)
-                    VALUES (%s, %s, %s, %s)
-                ''', (session_id, datetime.now(), 
-                      selected_review_id, selected_model))
-                conn.commit()
-                cursor.close()
+            with trace_span("db_write", table="user_selections"), DB_WRITE_SECONDS.labels(table="user_selections").time():
+                with get_db() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        INSERT INTO user_selections 
+                        (session_id, timestamp, selected_review_id, selected_model)
+                        VALUES (%s, %s, %s, %s)
+                    ''', (session_id, datetime.now(), 
+                          selected_review_id, selected_model))
+                    conn.commit()
+                    cursor.close()
             
-            logger.info(f"用户选择记录成功: 会话 {session_id}, 选择 {selected_review_id} ({selected_model})")
+            logger.info("用户选择记录成功: 会话 %s, 选择 %s (%s)", session_id, selected_review_id, selected_model)
             
             return jsonify({
                 "message": "选择已记录",
@@ -445,6 +922,7 @@ def create_app():
             return jsonify({"error": f"获取统计失败: {str(e)}"}), 500
 
     @app.route('/api/papers/test-blind-review', methods=['POST'])
+    @idempotent
     def test_blind_review():
         """测试盲评接口 - 存储原始模型输出"""
         try:
@@ -455,10 +933,12 @@ def create_app():
             
             start_time = time.time()
             
-            text_processor = TextProcessorService(include_authors=paper_request.include_authors)
-            paper_content = text_processor.process_paper_json(paper_request.paper_json, auto_truncate=False)
+            text_processor = TextProcessorService(include_authors=paper_request.include_authors,
+                                                  normalization_steps=config.normalization.steps)
+            paper_content, paper_token_length = load_paper_content(paper_request, text_processor, "test_blind_review",
+                                                                    [(None, "automatic_review"), ("deep-review-7b", "deep_review")])
             
-            logger.info(f"论文内容长度: {len(paper_content):,} 字符")
+            logger.info("论文内容长度: %d 字符", len(paper_content))
             logger.info("开始生成两个模型的评审...")
             
             # 1. 生成 Automatic_Review 评审
@@ -513,6 +993,10 @@ def create_app():
                     "content": f"Deep Review 评审失败: {deep_review_result.get('error', '未知错误')}"
                 }]
             
+            degraded = "error" in automatic_review_result or "error" in deep_review_result
+            if "error" in automatic_review_result and "error" in deep_review_result:
+                return all_reviews_failed_response("测试盲评生成失败", automatic_review_result, deep_review_result)
+            
             session_id = str(uuid.uuid4())
             
             reviews_list = [
@@ -531,21 +1015,22 @@ def create_app():
             random.shuffle(reviews_list)
             
             # 存储会话信息和原始输出到数据库
-            with get_db() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO test_review_sessions 
-                    (session_id, timestamp, review_a_model, review_b_model, 
-                     review_a_raw_output, review_b_raw_output)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                ''', (session_id, datetime.now(), 
-                      reviews_list[0]["model"], reviews_list[1]["model"],
-                      reviews_list[0]["raw_output"], reviews_list[1]["raw_output"]))
-                conn.commit()
-                cursor.close()
+            with trace_span("db_write", table="test_review_sessions"), DB_WRITE_SECONDS.labels(table="test_review_sessions").time():
+                with get_db() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('''
+                        INSERT INTO test_review_sessions 
+                        (session_id, timestamp, review_a_model, review_b_model, 
+                         review_a_raw_output, review_b_raw_output)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                    ''', (session_id, datetime.now(), 
+                          reviews_list[0]["model"], reviews_list[1]["model"],
+                          reviews_list[0]["raw_output"], reviews_list[1]["raw_output"]))
+                    conn.commit()
+                    cursor.close()
             
-            logger.info(f"测试盲评会话 {session_id} 创建成功")
-            logger.info(f"Review A: {reviews_list[0]['model']}, Review B: {reviews_list[1]['model']}")
+            logger.info("测试盲评会话 %s 创建成功", session_id)
+            logger.info("Review A: %s, Review B: %s", reviews_list[0]['model'], reviews_list[1]['model'])
             
             result = {
                 "session_id": session_id,
@@ -561,11 +1046,19 @@ def create_app():
                         "raw_output": reviews_list[1]["raw_output"]
                     }
                 ],
-                "processing_time": time.time() - start_time
+                "processing_time": time.time() - start_time,
+                # 两个评审合计的用量（不按评审区分，避免泄露模型分配）
+                "usage": get_request_context().usage.snapshot()
             }
+            if degraded:
+                result["degraded"] = True
             
             return jsonify(result), 200
             
+        except PaperNotFoundError as e:
+            return jsonify({"error": str(e)}), 404
+        except RateLimitExceededError as e:
+            return rate_limited_response(e, {"error": str(e)})
         except Exception as e:
             logger.error(f"测试盲评失败: {str(e)}")
             return jsonify({
@@ -573,7 +1066,7 @@ def create_app():
             }), 500
     
     def test_vllm():
-        """测试vLLM连接"""
+        """测试vLLM连接（会向 GPU 发送一次真实生成，默认不注册，见 TEST_VLLM_ENDPOINT_ENABLED）"""
         try:
             result = vllm_service.generate_text(
                 prompt="This is a test document about machine learning research. Please briefly review this document.",
@@ -584,8 +1077,30 @@ def create_app():
         except Exception as e:
             return jsonify({"error": f"vLLM连接失败: {str(e)}"}), 500
     
+    if config.server.test_vllm_enabled:
+        app.route('/api/papers/test-vllm', methods=['POST'])(test_vllm)
+    
+    startup_report.record("create_app", time.perf_counter() - create_started)
     return app
 
+def init_worker_process(app):
+    """
+    gunicorn worker 初始化（fork 之后，见 gunicorn.conf.py）
+    父进程中创建的 HTTP / 数据库连接、子进程和线程都不能在 worker 中复用，逐一重建
+    """
+    services = app.extensions["review_services"]
+    with startup_report.phase("worker_init"):
+        restart_logging_after_fork()
+        # 先清零指标，之后各服务重建时设置的 gauge 计入本 worker
+        reset_metrics_after_fork()
+        reset_db_pool()
+        services["vllm_service"].reset_after_fork()
+        services["preprocessing"].reset_after_fork()
+        services["usage_recorder"].reset_after_fork()
+        if services["config"].health.enabled:
+            services["health_service"].start()
+
 if __name__ == '__main__':
     app = create_app()
-    app.run(host='0.0.0.0', port=8036, debug=True)
\ No newline at end of file
+    debug = os.getenv('FLASK_DEBUG', 'false').lower() in ('1', 'true', 'yes')
+    app.run(host='0.0.0.0', port=8036, debug=debug)
\ No newline at end of file
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CPU 热点路径基准测试 - 基于仓库自带的论文语料
+
+覆盖 TextProcessorService.process_paper_json（可选 tokenizer）、_extract_references、
+两个评审分段解析器、prompt 组装以及 JSON 响应序列化。结果与 baselines.json 对比，
+任一用例变慢超过容忍倍数即以非零状态退出。
+
+用法:
+    python benchmarks/bench_hot_paths.py                    # 与基线对比
+    python benchmarks/bench_hot_paths.py --update-baseline  # 重新生成基线
+    python benchmarks/bench_hot_paths.py --tokenizer /path/to/tokenizer
+"""
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from services.text_processor_service import TextProcessorService
+from services.automatic_review_service import AutomaticReviewService
+from services.json_codec import json_loads, json_dumps_bytes, HAS_ORJSON
+
+PAPERS_DIR = ROOT / "static" / "papers"
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines.json"
+
+
+def load_papers() -> Dict[str, dict]:
+    """加载 static/papers 下的论文 JSON"""
+    papers = {}
+    for path in sorted(PAPERS_DIR.glob("*.json")):
+        with open(path, 'r', encoding='utf-8') as f:
+            papers[path.stem] = json.load(f)
+    return papers
+
+
+def load_review_outputs() -> Dict[str, str]:
+    """加载仓库中录制的模型原始输出，作为分段解析器的输入"""
+    outputs = {}
+
+    chunks = []
+    with open(ROOT / "output_stream.jsonl", 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if event.get("type") == "content":
+                chunks.append(event.get("content", ""))
+    outputs["output_stream"] = "".join(chunks)
+
+    with open(ROOT / "output_static.json", 'r', encoding='utf-8') as f:
+        outputs["output_static"] = json.load(f).get("response") or ""
+
+    return outputs
+
+
+def load_responses() -> Dict[str, object]:
+    """加载录制的接口响应，用于序列化基准"""
+    responses = {}
+    for name in ["blind_review_result.json", "automatic_review_result3.json", "automatic_review_result4.json"]:
+        with open(ROOT / name, 'r', encoding='utf-8') as f:
+            responses[Path(name).stem] = json.load(f)
+    return responses
+
+
+def build_cases(tokenizer_path: str = None) -> List[Tuple[str, Callable[[], object]]]:
+    """构建所有基准用例 (名称, 无参函数)"""
+    cases = []
+    papers = load_papers()
+    outputs = load_review_outputs()
+    responses = load_responses()
+
+    processor = TextProcessorService(include_authors=False)
+    review_service = AutomaticReviewService(config=None, vllm_service=None)
+
+    tokenizer_processor = None
+    if tokenizer_path:
+        tokenizer_processor = TextProcessorService(include_authors=False, tokenizer_path=tokenizer_path)
+        if not tokenizer_processor.tokenizer:
+            print(f"tokenizer 加载失败，跳过 tokenizer 用例: {tokenizer_path}")
+            tokenizer_processor = None
+
+    for name, paper in papers.items():
+        cases.append((f"process_paper_json/{name}", lambda p=paper: processor.process_paper_json(p, auto_truncate=False)))
+        if tokenizer_processor:
+            cases.append((f"process_paper_json_tokenizer/{name}", lambda p=paper: tokenizer_processor.process_paper_json(p, auto_truncate=True)))
+        cases.append((f"extract_references/{name}", lambda p=paper: processor._extract_references(p)))
+
+        paper_content = processor.process_paper_json(paper, auto_truncate=False)
+        cases.append((f"build_review_prompt/{name}", lambda c=paper_content: review_service.build_review_prompt(c)))
+        cases.append((f"build_deep_review_prompt/{name}", lambda c=paper_content: review_service.build_deep_review_prompt(c)))
+
+    for name, content in outputs.items():
+        cases.append((f"parse_review_sections/{name}", lambda c=content: review_service._parse_review_sections(c)))
+        cases.append((f"parse_deep_review_sections/{name}", lambda c=content: review_service._parse_deep_review_sections(c)))
+
+    for name, payload in responses.items():
+        cases.append((f"json_dumps/{name}", lambda d=payload: json.dumps(d, ensure_ascii=False)))
+        cases.append((f"json_dumps_fast/{name}", lambda d=payload: json_dumps_bytes(d)))
+
+    # 请求体解析：对比标准库与 json_codec（orjson 可用时）
+    request_bodies = {"test_request_json": (ROOT / "test_request_json.json").read_bytes()}
+    for name in ["2412.05579v2", "2305.14251v2"]:
+        request_bodies[f"paper/{name}"] = (PAPERS_DIR / f"{name}.json").read_bytes()
+    for name, body in request_bodies.items():
+        cases.append((f"json_loads/{name}", lambda b=body: json.loads(b)))
+        cases.append((f"json_loads_fast/{name}", lambda b=body: json_loads(b)))
+
+    return cases
+
+
+# 单次采样的最短时长：更短的用例在一次采样内循环多次，避免计时器分辨率与调度抖动主导最小值
+MIN_SAMPLE_SECONDS = 0.002
+
+
+def calibrate_loops(func: Callable[[], object]) -> int:
+    """与 timeit.autorange 类似：找到使单次采样不短于 MIN_SAMPLE_SECONDS 的循环次数"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - start >= MIN_SAMPLE_SECONDS:
+            return loops
+        loops *= 2
+
+
+def run_case(func: Callable[[], object], repeat: int, warmup: int = 2) -> float:
+    """返回单次调用的最短耗时（秒）；与 timeit 一致，最小值受机器噪声影响最小"""
+    for _ in range(warmup):
+        func()
+    loops = calibrate_loops(func)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        timings.append((time.perf_counter() - start) / loops)
+    return min(timings)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="CPU 热点路径基准测试")
+    parser.add_argument("--repeat", type=int, default=20, help="每个用例的重复次数")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="相对基线的最大允许倍数")
+    parser.add_argument("--min-delta-ms", type=float, default=0.02,
+                        help="变慢的绝对差值（毫秒）需超过 max(该值, 基线的 10%%) 才视为回归")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="基线文件路径")
+    parser.add_argument("--update-baseline", action="store_true", help="用本次结果更新基线（与已有基线合并）")
+    parser.add_argument("--tokenizer", default=None, help="HuggingFace tokenizer 路径，提供时额外运行 tokenizer 用例")
+    parser.add_argument("--filter", default=None, help="只运行名称包含该字符串的用例")
+    args = parser.parse_args()
+
+    # 只关注耗时，不输出服务日志
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("services").setLevel(logging.ERROR)
+
+    cases = build_cases(args.tokenizer)
+    if args.filter:
+        cases = [(name, func) for name, func in cases if args.filter in name]
+
+    baseline = {}
+    if args.baseline.exists():
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f).get("results", {})
+
+    results = {}
+    regressions = []
+    print(f"{'用例':<60} {'最短(ms)':>12} {'基线(ms)':>12} {'倍数':>8}")
+    print("-" * 96)
+    for name, func in cases:
+        best = run_case(func, args.repeat)
+        results[name] = best
+
+        base = None if args.update_baseline else baseline.get(name)
+        if base:
+            ratio = best / base
+            # 不少用例的基线不到 0.1 ms，固定的 0.2 ms 下限会掩盖真实回归，因此下限随基线缩放
+            min_delta_ms = max(args.min_delta_ms, 0.1 * base * 1000)
+            regressed = ratio > args.tolerance and (best - base) * 1000 > min_delta_ms
+            if regressed:
+                regressions.append((name, best, base, ratio))
+            flag = "  <-- 回归" if regressed else ""
+            print(f"{name:<60} {best * 1000:>12.3f} {base * 1000:>12.3f} {ratio:>8.2f}{flag}")
+        else:
+            print(f"{name:<60} {best * 1000:>12.3f} {'-':>12} {'-':>8}")
+
+    if args.update_baseline:
+        # 与已有基线合并，便于只更新部分用例（--filter）
+        merged = dict(baseline)
+        merged.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                "meta": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "repeat": args.repeat,
+                    "orjson": HAS_ORJSON
+                },
+                "results": merged
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已写入: {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"\n{len(regressions)} 个用例超过基线 {args.tolerance} 倍:")
+        for name, best, base, ratio in regressions:
+            print(f"  {name}: {base * 1000:.3f} ms => {best * 1000:.3f} ms ({ratio:.2f}x)")
+        return 1
+
+    print("\n所有用例均在基线范围内")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地 vLLM 替身 - OpenAI 兼容接口，回放仓库中录制的模型输出
+
+用于在不占用 GPU 的情况下压测 Flask/数据库层。支持流式与非流式
+/v1/chat/completions、/health、/v1/models，可配置 prefill 延迟、生成速度、
+错误率和并发上限。
+
+用法:
+    python benchmarks/fake_vllm_server.py --port 8011 --model scientific-reviewer-7b
+    python benchmarks/fake_vllm_server.py --port 8012 --model deep-review-7b --tokens-per-second 40 --error-rate 0.02
+"""
+
+import argparse
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_REPLAY_FILES = [
+    "output_stream.jsonl",
+    "output_static.json",
+    "automatic_review_result3.json",
+    "automatic_review_result4.json",
+]
+
+_TOKEN_PATTERN = re.compile(r'\s*\S+|\s+')
+
+
+def _sections_to_text(sections: list) -> str:
+    """将前端格式的分段列表还原为模型风格的原始文本"""
+    parts = []
+    for section in sections:
+        name = section.get("name") or section.get("title") or ""
+        content = section.get("content", "")
+        parts.append(f"**{name}:**\n{content}\n")
+    return "\n".join(parts)
+
+
+def load_replay(path: Path) -> List[str]:
+    """从录制文件中读出 token 序列（流式录制保留原始分块，其余按空白切分）"""
+    if path.suffix == ".jsonl":
+        tokens = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[6:])
+                if event.get("type") == "content" and event.get("content"):
+                    tokens.append(event["content"])
+        return tokens
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    if isinstance(data, dict) and isinstance(data.get("response"), str):
+        text = data["response"]
+    elif isinstance(data, dict) and isinstance(data.get("reviews"), list):
+        reviews = data["reviews"]
+        if reviews and "sections" in reviews[0]:
+            text = "\n".join(_sections_to_text(review.get("sections", [])) for review in reviews)
+        else:
+            text = _sections_to_text(reviews)
+    elif isinstance(data, list):
+        text = _sections_to_text(data)
+    else:
+        raise ValueError(f"无法识别的录制格式: {path}")
+    return _TOKEN_PATTERN.findall(text)
+
+
+class FakeVllmState:
+    """服务端共享状态"""
+
+    def __init__(self, args):
+        self.models = args.model
+        self.prefill_ms = args.prefill_ms
+        self.prefill_ms_per_1k_chars = args.prefill_ms_per_1k_chars
+        self.tokens_per_second = args.tokens_per_second
+        self.error_rate = args.error_rate
+        self.reject_over_limit = args.reject_over_limit
+        self.semaphore = threading.BoundedSemaphore(args.max_concurrency) if args.max_concurrency > 0 else None
+
+        self.replays = []
+        for name in args.replay:
+            path = Path(name)
+            if not path.is_absolute():
+                path = ROOT / path
+            tokens = load_replay(path)
+            if tokens:
+                self.replays.append(tokens)
+                print(f"已加载回放 {path.name}: {len(tokens)} tokens")
+        if not self.replays:
+            raise SystemExit("没有可用的回放数据")
+        self._replay_cycle = itertools.cycle(self.replays)
+        self._cycle_lock = threading.Lock()
+
+        self.lock = threading.Lock()
+        self.active = 0
+        self.served = 0
+
+    def next_replay(self) -> List[str]:
+        with self._cycle_lock:
+            return next(self._replay_cycle)
+
+
+class FakeVllmHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: FakeVllmState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path == "/v1/models":
+            self._send_json(200, {
+                "object": "list",
+                "data": [{"id": model, "object": "model", "owned_by": "fake-vllm"} for model in self.state.models]
+            })
+        else:
+            self._send_json(404, {"error": {"message": f"Not Found: {self.path}"}})
+
+    def do_POST(self):
+        if self.path != "/v1/chat/completions":
+            self._send_json(404, {"error": {"message": f"Not Found: {self.path}"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "invalid JSON"}})
+            return
+
+        model = payload.get("model")
+        if model not in self.state.models:
+            self._send_json(404, {"error": {"message": f"The model `{model}` does not exist."}})
+            return
+
+        semaphore = self.state.semaphore
+        if semaphore is not None:
+            if not semaphore.acquire(blocking=not self.state.reject_over_limit):
+                self._send_json(429, {"error": {"message": "too many concurrent requests"}})
+                return
+        with self.state.lock:
+            self.state.active += 1
+        try:
+            self._handle_completion(payload, model)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前断开（例如提前终止生成），视为正常
+            pass
+        finally:
+            with self.state.lock:
+                self.state.active -= 1
+                self.state.served += 1
+            if semaphore is not None:
+                semaphore.release()
+
+    def _handle_completion(self, payload: dict, model: str):
+        state = self.state
+        prompt_chars = sum(len(str(message.get("content", ""))) for message in payload.get("messages", []))
+        prompt_tokens = max(1, prompt_chars // 4)
+        max_tokens = int(payload.get("max_tokens") or 8192)
+
+        # prefill：基础延迟 + 按 prompt 长度线性增长
+        prefill = (state.prefill_ms + state.prefill_ms_per_1k_chars * prompt_chars / 1000) / 1000
+        time.sleep(prefill)
+
+        if random.random() < state.error_rate:
+            self._send_json(500, {"error": {"message": "injected failure"}})
+            return
+
+        replay = state.next_replay()
+        tokens = replay[:max_tokens]
+        finish_reason = "length" if len(replay) > max_tokens else "stop"
+        interval = 1.0 / state.tokens_per_second if state.tokens_per_second > 0 else 0.0
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens)
+        }
+        request_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if not payload.get("stream"):
+            time.sleep(interval * len(tokens))
+            self._send_json(200, {
+                "id": request_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": finish_reason
+                }],
+                "usage": usage
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_event(data: str):
+            chunk = f"data: {data}\n\n".encode('utf-8')
+            self.wfile.write(f"{len(chunk):x}\r\n".encode('ascii') + chunk + b"\r\n")
+            self.wfile.flush()
+
+        def chunk_payload(delta: dict, finish=None, include_usage=None):
+            event = {
+                "id": request_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if delta is not None else []
+            }
+            if include_usage is not None:
+                event["usage"] = include_usage
+            return json.dumps(event, ensure_ascii=False)
+
+        stream_options = payload.get("stream_options") or {}
+        # vLLM 的 continuous_usage_stats：每个分片附带截至目前的用量
+        continuous = stream_options.get("include_usage") and stream_options.get("continuous_usage_stats")
+
+        write_event(chunk_payload({"role": "assistant", "content": ""}))
+        for index, token in enumerate(tokens):
+            if interval:
+                time.sleep(interval)
+            running = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": index + 1,
+                "total_tokens": prompt_tokens + index + 1
+            } if continuous else None
+            write_event(chunk_payload({"content": token}, include_usage=running))
+        write_event(chunk_payload({}, finish=finish_reason))
+        if stream_options.get("include_usage"):
+            write_event(chunk_payload(None, include_usage=usage))
+        write_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="本地 vLLM 替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--model", action="append", default=None, help="对外提供的模型名，可重复指定")
+    parser.add_argument("--replay", action="append", default=None, help="回放文件（相对仓库根目录），可重复指定")
+    parser.add_argument("--prefill-ms", type=float, default=200.0, help="首 token 前的固定延迟（毫秒）")
+    parser.add_argument("--prefill-ms-per-1k-chars", type=float, default=5.0, help="每 1000 个 prompt 字符增加的 prefill 延迟（毫秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="单请求生成速度，0 表示不限速")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入 500 错误的概率")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="同时生成的请求上限，0 表示不限制")
+    parser.add_argument("--reject-over-limit", action="store_true", help="超过并发上限时返回 429，默认排队等待")
+    args = parser.parse_args()
+
+    args.model = args.model or ["scientific-reviewer-7b", "deep-review-7b"]
+    args.replay = args.replay or DEFAULT_REPLAY_FILES
+
+    FakeVllmHandler.state = FakeVllmState(args)
+    server = ThreadingHTTPServer((args.host, args.port), FakeVllmHandler)
+    server.daemon_threads = True
+    print(f"fake vLLM 已启动: http://{args.host}:{args.port}  模型: {', '.join(args.model)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+评审接口压测 - 按目标 RPS 开环发送请求，统计延迟分位数、吞吐和错误率
+
+配合 fake_vllm_server.py 使用即可在不占用 GPU 的情况下测量 Flask/数据库层的并发表现。
+
+用法:
+    python benchmarks/load_test.py --rps 2 --duration 60 --endpoint automatic-review --endpoint blind-review
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def load_papers(paths: List[str]) -> List[dict]:
+    papers = []
+    for pattern in paths:
+        for path in sorted(ROOT.glob(pattern)) if not Path(pattern).is_absolute() else [Path(pattern)]:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            papers.append(data.get("paper_json", data))
+    return papers
+
+
+class LoadStats:
+    """按接口汇总结果（线程安全），延迟分位数只统计成功请求"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.status: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, latency: float, outcome: str):
+        with self.lock:
+            if outcome == "200":
+                self.latencies[endpoint].append(latency)
+            self.status[endpoint][outcome] += 1
+
+    def report(self, elapsed: float) -> Dict[str, dict]:
+        summary = {}
+        for endpoint, outcomes in self.status.items():
+            outcomes = dict(outcomes)
+            total = sum(outcomes.values())
+            ok = outcomes.get("200", 0)
+            ok_latencies = self.latencies.get(endpoint, [])
+            summary[endpoint] = {
+                "requests": total,
+                "throughput_rps": round(total / elapsed, 3) if elapsed else 0.0,
+                "success_rps": round(ok / elapsed, 3) if elapsed else 0.0,
+                "error_rate": round(1 - ok / total, 4) if total else 0.0,
+                "p50_ms": round(percentile(ok_latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(ok_latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(ok_latencies, 99) * 1000, 1),
+                "max_ms": round(max(ok_latencies) * 1000, 1) if ok_latencies else 0.0,
+                "outcomes": outcomes
+            }
+        return summary
+
+
+def send_request(session: requests.Session, base_url: str, endpoint: str, paper: dict, args, stats: LoadStats):
+    body = {
+        "paper_json": paper,
+        "temperature": args.temperature,
+        "max_tokens": args.max_tokens,
+        "include_authors": False
+    }
+    start = time.perf_counter()
+    try:
+        response = session.post(f"{base_url}/{endpoint}", json=body, timeout=args.timeout)
+        outcome = str(response.status_code)
+    except requests.exceptions.Timeout:
+        outcome = "timeout"
+    except requests.exceptions.RequestException:
+        outcome = "connection_error"
+    stats.record(endpoint, time.perf_counter() - start, outcome)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="评审接口压测")
+    parser.add_argument("--base-url", default="http://localhost:8036/api/papers")
+    parser.add_argument("--endpoint", action="append", default=None, help="压测接口（automatic-review / blind-review），可重复指定，请求在其间随机分配")
+    parser.add_argument("--rps", type=float, default=1.0, help="目标每秒请求数")
+    parser.add_argument("--duration", type=float, default=30.0, help="发送请求的时长（秒）")
+    parser.add_argument("--papers", action="append", default=None, help="论文 JSON 路径或相对仓库根目录的 glob")
+    parser.add_argument("--max-tokens", type=int, default=8192)
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--max-outstanding", type=int, default=256, help="未完成请求上限（客户端线程数）")
+    parser.add_argument("--output", default=None, help="将汇总结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    endpoints = args.endpoint or ["automatic-review", "blind-review"]
+    papers = load_papers(args.papers or ["static/papers/*.json"])
+    if not papers:
+        print("没有可用的论文数据")
+        return 1
+
+    stats = LoadStats()
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=args.max_outstanding)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    print(f"压测 {args.base_url} 接口 {endpoints}，目标 {args.rps} RPS，持续 {args.duration} 秒，论文 {len(papers)} 篇")
+    interval = 1.0 / args.rps
+    start = time.perf_counter()
+    sent = 0
+    with ThreadPoolExecutor(max_workers=args.max_outstanding) as executor:
+        # 开环调度：按固定节奏发送，不等待前一个请求完成
+        while True:
+            next_send = start + sent * interval
+            if next_send - start >= args.duration:
+                break
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send_request, session, args.base_url, random.choice(endpoints), random.choice(papers), args, stats)
+            sent += 1
+        print(f"已发送 {sent} 个请求，等待未完成请求结束...")
+    elapsed = time.perf_counter() - start
+
+    summary = stats.report(elapsed)
+    print(f"\n{'接口':<20} {'请求数':>8} {'吞吐(rps)':>10} {'错误率':>8} {'p50(ms)':>10} {'p95(ms)':>10} {'p99(ms)':>10}")
+    print("-" * 82)
+    for endpoint, row in summary.items():
+        print(f"{endpoint:<20} {row['requests']:>8} {row['success_rps']:>10.3f} {row['error_rate']:>8.2%} "
+              f"{row['p50_ms']:>10.1f} {row['p95_ms']:>10.1f} {row['p99_ms']:>10.1f}")
+        print(f"{'':<20} 结果分布: {row['outcomes']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"args": vars(args), "elapsed_seconds": elapsed, "endpoints": summary}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
 @dataclass
 class VllmConfig:
@@ -12,10 +13,181 @@ class VllmConfig:
     deep_review_model: str = "deep-review-7b"
     
     # 通用配置
-    timeout: int = 300
+    timeout: int = 300  # 单次请求总时长上限（秒）
+    # 分阶段超时（秒）：建立连接、首 token、流式分片间隔
+    connect_timeout: float = 5.0
+    ttft_timeout: float = 120.0
+    idle_timeout: float = 30.0
+    # 每个端点保持的 HTTP 连接数上限
+    http_pool_size: int = 32
     max_context_length: int = 64000
     batch_size: int = 1
     max_parallel_requests: int = 1
+    
+    # 评审生成：Decision 部分完整后提前关闭流，释放剩余生成预算
+    early_stop_enabled: bool = True
+    # 合并相同的进行中生成（prompt、模型、温度、max_tokens 均相同）
+    coalesce_enabled: bool = True
+    # 流式请求要求 vLLM 返回 token 用量
+    stream_usage: bool = True
+    # 传给 vLLM 的 stop 字符串（默认不设置）
+    stop_sequences: Optional[List[str]] = None
+    
+    # 对冲请求：模型有多个副本时，首 token 超过阈值未到则向另一副本发送重复请求
+    hedge_enabled: bool = False
+    # 阈值取观测到的 TTFT 的该分位数，样本不足时用 hedge_default_delay
+    hedge_percentile: float = 0.95
+    hedge_default_delay: float = 10.0
+    hedge_min_delay: float = 0.5
+    # 对冲请求数上限约为主请求数的该比例
+    hedge_budget_ratio: float = 0.1
+    
+    # 熔断：端点连续失败该次数后熔断，recovery_timeout 秒后半开探测
+    circuit_failure_threshold: int = 5
+    circuit_recovery_timeout: float = 30.0
+
+@dataclass
+class HealthConfig:
+    # 后台探测开关与周期（秒）
+    enabled: bool = True
+    probe_interval: float = 15.0
+    probe_timeout: float = 3.0
+
+@dataclass
+class TracingConfig:
+    # 请求头中带上该字段时，在响应头返回阶段耗时
+    debug_header: str = "X-Debug-Trace"
+    # X-Review-Trace 响应头的长度上限（字节），超出时截断追踪树（常见代理的响应头上限为 8 KB）
+    header_max_bytes: int = 4096
+    # 采样式性能剖析（CPU profile + tracemalloc 峰值内存）
+    profile_enabled: bool = False
+    profile_sample_rate: float = 0.01
+    profile_latency_threshold: float = 10.0
+    profile_dir: str = "profiles"
+
+@dataclass
+class ServerConfig:
+    # 请求体大小上限（字节），超过时在解析前直接返回 413
+    max_request_bytes: int = 20 * 1024 * 1024
+    # 响应压缩阈值（字节），小于该大小的响应不压缩，0 表示禁用
+    response_compression_min_bytes: int = 4096
+    # gzip / zstd 压缩级别
+    compression_level: int = 6
+    # 同一实例的 worker 进程数（由 gunicorn.conf.py 设置），进程内的并发与额度按此均分
+    worker_processes: int = 1
+    # 调试用的 POST /api/papers/test-vllm（发送一次真实生成），默认不注册
+    test_vllm_enabled: bool = False
+
+@dataclass
+class CacheConfig:
+    # 处理后论文文本缓存的内存上限（字节）
+    processed_text_max_bytes: int = 128 * 1024 * 1024
+    # 已归档盲评结果缓存的内存上限（字节）
+    review_archive_max_bytes: int = 32 * 1024 * 1024
+    # 按 Idempotency-Key 保留的已完成响应的内存上限（字节）与保留时间（秒）
+    idempotency_max_bytes: int = 16 * 1024 * 1024
+    idempotency_ttl: float = 3600.0
+
+@dataclass
+class NormalizationConfig:
+    # 论文文本规范化步骤（按 whitespace, citations, author_year, dedupe, references 顺序执行），默认不处理，按需开启
+    steps: List[str] = field(default_factory=list)
+
+@dataclass
+class TokenBudgetConfig:
+    # 模型上下文窗口（prompt + 生成）
+    context_window: int = 32768
+    # max_tokens="auto" 时取观测到的生成长度的该分位数
+    percentile: float = 0.99
+    # 在分位数基础上增加的余量比例
+    headroom: float = 0.2
+    # 样本数不足时使用 default_max_tokens
+    min_samples: int = 20
+    default_max_tokens: int = 8192
+    min_max_tokens: int = 512
+    # 每个 (模型, 模板) 保留的最近样本数
+    window_size: int = 1000
+    # 无 tokenizer 时按字符数估算 prompt token 数（取偏小值，估算结果偏保守）
+    chars_per_token: float = 3.0
+
+@dataclass
+class ChunkingConfig:
+    # 论文（估算）token 数超过该值时，use_chunking 请求改用分块摘要（map-reduce）
+    single_pass_max_tokens: int = 22000
+    # 每块正文的 token 上限
+    chunk_tokens: int = 12000
+    # 每块摘要的最大生成 token 数
+    summary_max_tokens: int = 1024
+    # 每个副本同时处理的分块数
+    parallel_per_replica: int = 2
+
+@dataclass
+class PreprocessingConfig:
+    # 论文解析与 token 统计的子进程数，0 表示在请求线程内执行
+    workers: int = 2
+    # HuggingFace tokenizer 路径，不设置时按字符数估算 token
+    tokenizer_path: Optional[str] = None
+    # 合并 token 统计请求的等待时间（毫秒）与单批上限
+    batch_window_ms: float = 5.0
+    max_batch: int = 16
+
+@dataclass
+class SchedulerConfig:
+    # 在 vLLM 前按优先级（interactive / bulk）与客户端排队
+    enabled: bool = True
+    # 每个副本同时进行的请求数（整个实例合计，按 worker 进程数均分）
+    slots_per_replica: int = 16
+    # 为交互式请求保留的并发数（每组副本、整个实例合计，按 worker 进程数均分），批量请求最多使用其余部分
+    interactive_reserved_slots: int = 2
+    # 交互式请求开始延迟（排队 + 首 token）的 p95 目标（秒），超过时减少批量并发
+    interactive_p95_target: float = 10.0
+    # 批量并发的下限，保证批量请求持续推进
+    bulk_min_slots: int = 1
+    # 两次调整批量并发的最小间隔（秒）
+    adjust_interval: float = 5.0
+    # 超过该时间没有交互式请求时，批量请求可使用全部非保留并发（秒）
+    interactive_idle_seconds: float = 60.0
+    # 排队超时（秒）
+    queue_timeout: float = 600.0
+    # 向 vLLM 传递请求优先级（vLLM 需以 --scheduling-policy priority 启动，否则会拒绝请求）
+    vllm_priority: bool = False
+
+@dataclass
+class RateLimitConfig:
+    # 按客户端（已登记的 API key，否则为 IP）的 token 限流
+    enabled: bool = False
+    # 每个客户端每秒恢复的 token 数（prompt + 生成）
+    tokens_per_second: float = 500.0
+    # 令牌桶容量，即允许的突发用量
+    burst_tokens: int = 300000
+    # 已登记的 API key：只有其中的 key 按 key 计量，其余请求按 IP 计量
+    api_keys: List[str] = field(default_factory=list)
+
+@dataclass
+class UsageConfig:
+    # 生成用量的记录方式：db（review_usage 表）、log（JSON Lines 文件）、none
+    sink: str = "db"
+    log_path: str = "logs/review_usage.jsonl"
+    # 合并写入的等待时间（秒）与待写入记录上限
+    flush_interval: float = 2.0
+    max_pending: int = 10000
+
+@dataclass
+class MetricsConfig:
+    # 多进程指标汇总的共享目录（gunicorn.conf.py 默认设置），为空时 /metrics 只输出处理请求的进程
+    multiprocess_dir: Optional[str] = None
+    # 各进程写入指标快照的间隔（秒）
+    flush_interval: float = 5.0
+
+@dataclass
+class LoggingConfig:
+    level: str = "INFO"
+    # 输出格式：json（每行一个 JSON 对象）或 text
+    format: str = "json"
+    # 后台写出队列的容量，队列满时丢弃新记录（0 表示不限）
+    queue_size: int = 10000
+    # 按 logger 采样 INFO 及以下级别的日志：logger 名称前缀（含子 logger，取最长匹配）-> 保留比例
+    sampling: Dict[str, float] = field(default_factory=dict)
 
 class AppConfig:
     def __init__(self):
@@ -33,5 +205,118 @@ class AppConfig:
             automatic_review_model=automatic_review_model,
             deep_review_url=deep_review_url,
             deep_review_model=deep_review_model,
-            timeout=int(os.getenv('VLLM_TIMEOUT', '300'))
-        )
\ No newline at end of file
+            timeout=int(os.getenv('VLLM_TIMEOUT', '300')),
+            connect_timeout=float(os.getenv('VLLM_CONNECT_TIMEOUT', '5')),
+            ttft_timeout=float(os.getenv('VLLM_TTFT_TIMEOUT', '120')),
+            idle_timeout=float(os.getenv('VLLM_IDLE_TIMEOUT', '30')),
+            http_pool_size=int(os.getenv('VLLM_HTTP_POOL_SIZE', '32')),
+            early_stop_enabled=os.getenv('REVIEW_EARLY_STOP', 'true').lower() != 'false',
+            coalesce_enabled=os.getenv('REVIEW_COALESCING', 'true').lower() != 'false',
+            stream_usage=os.getenv('VLLM_STREAM_USAGE', 'true').lower() != 'false',
+            # 多个 stop 字符串以 || 分隔，支持 \n 转义
+            stop_sequences=[
+                item.replace('\\n', '\n') for item in os.getenv('VLLM_STOP_SEQUENCES', '').split('||') if item
+            ] or None,
+            hedge_enabled=os.getenv('VLLM_HEDGE_ENABLED', 'false').lower() == 'true',
+            hedge_percentile=float(os.getenv('VLLM_HEDGE_PERCENTILE', '0.95')),
+            hedge_default_delay=float(os.getenv('VLLM_HEDGE_DEFAULT_DELAY', '10')),
+            hedge_min_delay=float(os.getenv('VLLM_HEDGE_MIN_DELAY', '0.5')),
+            hedge_budget_ratio=float(os.getenv('VLLM_HEDGE_BUDGET_RATIO', '0.1')),
+            circuit_failure_threshold=int(os.getenv('VLLM_CIRCUIT_FAILURE_THRESHOLD', '5')),
+            circuit_recovery_timeout=float(os.getenv('VLLM_CIRCUIT_RECOVERY_TIMEOUT', '30'))
+        )
+        
+        self.health = HealthConfig(
+            enabled=os.getenv('HEALTH_PROBE_ENABLED', 'true').lower() != 'false',
+            probe_interval=float(os.getenv('HEALTH_PROBE_INTERVAL', '15')),
+            probe_timeout=float(os.getenv('HEALTH_PROBE_TIMEOUT', '3'))
+        )
+        
+        self.tracing = TracingConfig(
+            debug_header=os.getenv('TRACE_DEBUG_HEADER', 'X-Debug-Trace'),
+            header_max_bytes=int(os.getenv('TRACE_HEADER_MAX_BYTES', '4096')),
+            profile_enabled=os.getenv('PROFILE_ENABLED', 'false').lower() == 'true',
+            profile_sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0.01')),
+            profile_latency_threshold=float(os.getenv('PROFILE_LATENCY_THRESHOLD', '10')),
+            profile_dir=os.getenv('PROFILE_DIR', 'profiles')
+        )
+        
+        self.server = ServerConfig(
+            max_request_bytes=int(os.getenv('MAX_REQUEST_BYTES', str(20 * 1024 * 1024))),
+            response_compression_min_bytes=int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', '4096')),
+            compression_level=int(os.getenv('COMPRESSION_LEVEL', '6')),
+            worker_processes=max(int(os.getenv('WORKER_PROCESSES', '1')), 1),
+            test_vllm_enabled=os.getenv('TEST_VLLM_ENDPOINT_ENABLED', 'false').lower() == 'true'
+        )
+        
+        self.cache = CacheConfig(
+            processed_text_max_bytes=int(float(os.getenv('PROCESSED_TEXT_CACHE_MB', '128')) * 1024 * 1024),
+            review_archive_max_bytes=int(float(os.getenv('REVIEW_ARCHIVE_CACHE_MB', '32')) * 1024 * 1024),
+            idempotency_max_bytes=int(float(os.getenv('IDEMPOTENCY_CACHE_MB', '16')) * 1024 * 1024),
+            idempotency_ttl=float(os.getenv('IDEMPOTENCY_TTL', '3600'))
+        )
+        
+        steps = os.getenv('PAPER_NORMALIZATION_STEPS', 'none')
+        self.normalization = NormalizationConfig(
+            steps=[step.strip() for step in steps.split(',') if step.strip() and step.strip() != 'none']
+        )
+        
+        self.preprocessing = PreprocessingConfig(
+            workers=int(os.getenv('PREPROCESS_WORKERS', '2')),
+            tokenizer_path=os.getenv('TOKENIZER_PATH') or None,
+            batch_window_ms=float(os.getenv('TOKENIZE_BATCH_WINDOW_MS', '5')),
+            max_batch=int(os.getenv('TOKENIZE_MAX_BATCH', '16'))
+        )
+        
+        self.token_budget = TokenBudgetConfig(
+            context_window=int(os.getenv('MODEL_CONTEXT_WINDOW', '32768')),
+            percentile=float(os.getenv('AUTO_MAX_TOKENS_PERCENTILE', '0.99')),
+            headroom=float(os.getenv('AUTO_MAX_TOKENS_HEADROOM', '0.2')),
+            min_samples=int(os.getenv('AUTO_MAX_TOKENS_MIN_SAMPLES', '20'))
+        )
+        
+        self.chunking = ChunkingConfig(
+            single_pass_max_tokens=int(os.getenv('SINGLE_PASS_MAX_TOKENS', '22000')),
+            chunk_tokens=int(os.getenv('CHUNK_TOKENS', '12000')),
+            summary_max_tokens=int(os.getenv('CHUNK_SUMMARY_MAX_TOKENS', '1024')),
+            parallel_per_replica=int(os.getenv('CHUNK_PARALLEL_PER_REPLICA', '2'))
+        )
+        
+        self.scheduler = SchedulerConfig(
+            enabled=os.getenv('SCHEDULER_ENABLED', 'true').lower() != 'false',
+            slots_per_replica=int(os.getenv('SCHEDULER_SLOTS_PER_REPLICA', '16')),
+            interactive_reserved_slots=int(os.getenv('SCHEDULER_INTERACTIVE_RESERVED', '2')),
+            interactive_p95_target=float(os.getenv('SCHEDULER_INTERACTIVE_P95_TARGET', '10')),
+            queue_timeout=float(os.getenv('SCHEDULER_QUEUE_TIMEOUT', '600')),
+            vllm_priority=os.getenv('VLLM_PRIORITY_ENABLED', 'false').lower() == 'true'
+        )
+        
+        self.rate_limit = RateLimitConfig(
+            enabled=os.getenv('RATE_LIMIT_ENABLED', 'false').lower() == 'true',
+            tokens_per_second=float(os.getenv('RATE_LIMIT_TOKENS_PER_SECOND', '500')),
+            burst_tokens=int(os.getenv('RATE_LIMIT_BURST_TOKENS', '300000')),
+            api_keys=[key.strip() for key in os.getenv('RATE_LIMIT_API_KEYS', '').split(',') if key.strip()]
+        )
+        
+        self.usage = UsageConfig(
+            sink=(os.getenv('USAGE_SINK') or 'db').strip().lower(),
+            log_path=os.getenv('USAGE_LOG_PATH', 'logs/review_usage.jsonl')
+        )
+        
+        self.metrics = MetricsConfig(
+            multiprocess_dir=os.getenv('METRICS_MULTIPROC_DIR') or None,
+            flush_interval=float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+        )
+        
+        # LOG_SAMPLING 格式: services.text_processor_service=0.1,services.vllm_service=0.5
+        sampling = {}
+        for item in os.getenv('LOG_SAMPLING', '').split(','):
+            name, _, rate = item.partition('=')
+            if name.strip() and rate.strip():
+                sampling[name.strip()] = float(rate)
+        self.logging = LoggingConfig(
+            level=(os.getenv('LOG_LEVEL') or 'INFO').strip().upper(),
+            format=(os.getenv('LOG_FORMAT') or 'json').strip().lower(),
+            queue_size=int(os.getenv('LOG_QUEUE_SIZE', '10000')),
+            sampling=sampling
+        )
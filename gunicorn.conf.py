@@ -0,0 +1,56 @@
+"""
+Gunicorn 配置：gunicorn -c gunicorn.conf.py wsgi:app
+
+评审请求大部分时间在等待 vLLM，默认使用 gthread（每个 worker 多线程）；
+安装 gevent 后可设置 GUNICORN_WORKER_CLASS=gevent 改用协程。
+"""
+
+import os
+import tempfile
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8036")
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+# 调度器并发与限流额度按 worker 数均分（AppConfig 读取 WORKER_PROCESSES）
+os.environ["WORKER_PROCESSES"] = str(workers)
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+# gthread 每个 worker 的线程数；gevent 每个 worker 的最大并发连接数
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+# 单次评审可能持续到 VLLM_TIMEOUT，worker 超时需要更长
+timeout = int(os.getenv("GUNICORN_TIMEOUT", str(int(os.getenv("VLLM_TIMEOUT", "300")) + 60)))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# 在父进程中创建应用：配置、提示词模板与 tokenizer 只加载一次，模型预热只执行一次
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+# 各 worker 共用监听端口，每次抓取 /metrics 落到随机的 worker 上：各进程把指标写入共享目录，由处理抓取的进程汇总。
+# 同一台机器上的多个实例需要使用不同的目录
+os.environ.setdefault(
+    "METRICS_MULTIPROC_DIR",
+    os.path.join(tempfile.gettempdir(), "review_metrics_" + bind.replace(":", "_").replace(".", "_"))
+)
+
+if worker_class == "gevent":
+    # preload 时应用在 worker 打补丁之前导入，需在加载配置时尽早打补丁
+    from gevent import monkey
+    monkey.patch_all()
+
+
+def on_starting(server):
+    """清理上次运行留下的指标快照"""
+    from services.metrics_service import clear_multiprocess_dir
+    clear_multiprocess_dir(os.environ["METRICS_MULTIPROC_DIR"])
+
+
+def pre_fork(server, worker):
+    """父进程预加载阶段（模型预热等）的指标写入自己的快照，worker 中从零开始计数"""
+    from services.metrics_service import write_process_metrics
+    write_process_metrics()
+
+
+def post_worker_init(worker):
+    """worker 加载应用后重建进程内的连接池与后台线程"""
+    from app import init_worker_process
+    init_worker_process(worker.wsgi)
@@ -1,27 +1,44 @@
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Union
 
 @dataclass
 class PaperRequest:
-    paper_json: Dict[str, Any]  # JSON格式论文
+    paper_json: Optional[Dict[str, Any]] = None  # JSON格式论文
+    paper_id: Optional[str] = None  # 已注册论文的ID（与paper_json二选一）
     temperature: float = 0.0  # 确定性输出
-    max_tokens: int = 8192  
+    max_tokens: Union[int, str] = 8192  # "auto" 表示按历史生成长度自动确定
     include_authors: bool = False  # 是否包含作者信息（peer review建议False避免偏见）
+    use_chunking: bool = False  # 超长论文先分块摘要再评审（map-reduce）
     
     @classmethod
     def from_dict(cls, data: dict):
-        # 检查是否提供了JSON格式的论文内容
-        if not data.get('paper_json'):
-            raise ValueError("必须提供 paper_json（JSON格式的论文数据）")
+        data = data or {}
+        # 检查是否提供了JSON格式的论文内容或已注册论文ID
+        if not data.get('paper_json') and not data.get('paper_id'):
+            raise ValueError("必须提供 paper_json（JSON格式的论文数据）或 paper_id（已注册论文ID）")
             
         return cls(
-            paper_json=data['paper_json'],
+            paper_json=data.get('paper_json'),
+            paper_id=data.get('paper_id'),
             temperature=data.get('temperature', 0.0),
-            max_tokens=data.get('max_tokens', 8192),
-            include_authors=data.get('include_authors', False)
+            max_tokens=cls._parse_max_tokens(data.get('max_tokens', 8192)),
+            include_authors=data.get('include_authors', False),
+            use_chunking=bool(data.get('use_chunking', False))
         )
 
+    @staticmethod
+    def _parse_max_tokens(value):
+        if isinstance(value, str) and value.strip().lower() == 'auto':
+            return 'auto'
+        try:
+            max_tokens = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"max_tokens 必须是正整数或 \"auto\"，收到: {value!r}")
+        if max_tokens <= 0:
+            raise ValueError(f"max_tokens 必须是正整数或 \"auto\"，收到: {value!r}")
+        return max_tokens
+
 @dataclass
 class PaperResponse:
     success: bool
@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import List, Dict, Any
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
 
 @dataclass
 class VllmMessage:
@@ -13,23 +13,35 @@ class VllmRequest:
     max_tokens: int = 8192 
     temperature: float = 0.0  # 确定性输出
     stream: bool = False  # 添加流式输出支持
+    stop: Optional[List[str]] = None  # 命中任一字符串即停止生成
+    priority: Optional[int] = None  # vLLM 请求优先级（越小越优先，需 --scheduling-policy priority）
+    stream_usage: bool = False  # 流式响应附带 token 用量（stream_options.include_usage）
     
     def to_dict(self):
-        return {
+        data = {
             'model': self.model,
             'messages': [{'role': msg.role, 'content': msg.content} for msg in self.messages],
             'max_tokens': self.max_tokens,
             'temperature': self.temperature,
             'stream': self.stream
         }
+        if self.stop:
+            data['stop'] = self.stop
+        if self.priority is not None:
+            data['priority'] = self.priority
+        if self.stream and self.stream_usage:
+            # continuous_usage_stats 让每个分片都带有截至目前的用量，提前关闭流时同样可以取得
+            data['stream_options'] = {'include_usage': True, 'continuous_usage_stats': True}
+        return data
 
 @dataclass
 class VllmResponse:
     choices: List[Dict[str, Any]]
+    usage: Dict[str, Any] = field(default_factory=dict)  # prompt_tokens / completion_tokens
     
     @classmethod
     def from_dict(cls, data: dict):
-        return cls(choices=data.get('choices', []))
+        return cls(choices=data.get('choices', []), usage=data.get('usage') or {})
     
     def get_content(self) -> str:
         if self.choices and len(self.choices) > 0:
@@ -4,41 +4,150 @@
 Automatic Review Service - 集成Automatic_Review项目的功能
 """
 
+import contextvars
+import hashlib
 import json
 import logging
 import os
 import sys
 import re
-from typing import Dict, List, Optional, Any
+import time
+from typing import Dict, List, Optional, Any, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from config.config import TokenBudgetConfig, ChunkingConfig
+from services.tracing_service import trace_span
+from services.token_budget_service import TokenBudgetService
+from services.circuit_breaker import CircuitOpenError
+from services.metrics_service import (
+    PROMPT_BUILD_SECONDS, SECTION_PARSING_SECONDS, CACHE_HITS_TOTAL, CACHE_MISSES_TOTAL,
+    EARLY_STOP_TOTAL, EARLY_STOP_TOKENS_SAVED_TOTAL, COALESCED_REQUESTS_TOTAL
+)
+from services.single_flight import SingleFlight
 automatic_review_path = Path(__file__).parent.parent.parent / "Automatic_Review"
 if automatic_review_path.exists():
     sys.path.append(str(automatic_review_path))
 
 logger = logging.getLogger(__name__)
 
+# Decision 标题行：**Decision**、## Decision、4. Decision:、Decision: Accept 等；
+# 不匹配正文里的 "Decision-making ..." 之类的句子
+DECISION_HEADER_RE = re.compile(
+    r"^(?P<mark>#{1,6}\s*|\*\*)?\s*(?:\d+\.\s*)?decision\b\s*(?:\*\*)?\s*(?P<sep>:)?\s*(?:\*\*)?\s*(?P<rest>.*)$",
+    re.IGNORECASE
+)
+
+# 各模板 Decision 部分的完成方式：paragraph = 内容后的第一个空行，line = 第一行内容
+DECISION_COMPLETION = {
+    "automatic_review": "paragraph",
+    "deep_review": "line"
+}
+
+
+class SectionCompletionWatcher:
+    """
+    监视流式输出，判断最后一个必需部分（Decision）是否已经完整
+    只按完整的行判断，<think>...</think> 中的内容不参与判断
+    """
+    
+    def __init__(self, completion: str = "paragraph"):
+        self.completion = completion
+        self.complete = False
+        # Decision 完成时所在行末尾在整段输出中的位置，之后的内容可丢弃
+        self.end_offset = None
+        self._buffer = ""
+        self._buffer_offset = 0
+        self._in_think = False
+        self._decision_found = False
+        self._decision_has_content = False
+    
+    def feed(self, chunk: str) -> bool:
+        """输入一个流式分片，返回 Decision 部分是否已完整"""
+        if self.complete:
+            return True
+        self._buffer += chunk
+        if "\n" not in chunk:
+            return False
+        *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            self._buffer_offset += len(line) + 1
+            if self._feed_line(line):
+                self.complete = True
+                self.end_offset = self._buffer_offset
+                return True
+        return False
+    
+    def _strip_think(self, line: str) -> str:
+        visible = []
+        while line:
+            if self._in_think:
+                end = line.find("</think>")
+                if end < 0:
+                    return "".join(visible)
+                line = line[end + len("</think>"):]
+                self._in_think = False
+            else:
+                start = line.find("<think>")
+                if start < 0:
+                    visible.append(line)
+                    break
+                visible.append(line[:start])
+                line = line[start + len("<think>"):]
+                self._in_think = True
+        return "".join(visible)
+    
+    def _feed_line(self, line: str) -> bool:
+        was_in_think = self._in_think
+        stripped = self._strip_think(line).strip()
+        if was_in_think and not stripped:
+            return False
+        
+        if not self._decision_found:
+            match = DECISION_HEADER_RE.match(stripped)
+            if match and (match.group("mark") or match.group("sep") or not match.group("rest")):
+                self._decision_found = True
+                self._decision_has_content = bool(match.group("rest").strip("* "))
+                return self._decision_has_content and self.completion == "line"
+            return False
+        
+        if stripped:
+            self._decision_has_content = True
+            return self.completion == "line"
+        return self._decision_has_content
+
+
 class AutomaticReviewService:
     """自动评审服务 - 集成Automatic_Review项目的功能"""
     
-    def __init__(self, config, vllm_service=None):
+    def __init__(self, config, vllm_service=None, usage_recorder=None, token_counter=None):
         self.config = config
         self.vllm_service = vllm_service
+        # 每次生成的用量记录（UsageRecorder，可选）
+        self.usage_recorder = usage_recorder
         self.automatic_review_path = automatic_review_path
         self.evaluation_path = automatic_review_path / "evaluation"
         self.generation_path = automatic_review_path / "generation"
+        # 提示词模板缓存，避免每个请求都读取文件
+        self._prompt_template_cache: Dict[str, Optional[str]] = {}
+        # 生成长度统计，支持 max_tokens="auto"；token_counter（配置了 tokenizer 时）用于精确统计 prompt 长度
+        self.token_budget = TokenBudgetService(getattr(config, "token_budget", None) or TokenBudgetConfig(),
+                                               token_counter=token_counter)
+        self.chunking = getattr(config, "chunking", None) or ChunkingConfig()
+        # 进行中的生成，供相同请求合并
+        self._inflight_generations = SingleFlight("review_generation")
         
         # 检查Automatic_Review项目是否存在
         if not automatic_review_path.exists():
             logger.warning("Automatic_Review项目不存在，某些功能可能不可用")
     
-    def generate_review(self, paper_content: str, temperature: float = 0.0, max_tokens: int = 8192) -> Dict[str, Any]:
+    def generate_review(self, paper_content: str, temperature: float = 0.0, max_tokens: Union[int, str] = 8192) -> Dict[str, Any]:
         """
         生成评审 - 使用Automatic_Review的原始功能
         
         Args:
             paper_content: 论文内容
             temperature: 温度参数，控制输出的随机性，默认0.0表示确定性输出
-            max_tokens: 最大生成token数量，默认8192
+            max_tokens: 最大生成token数量，默认8192；"auto" 表示按历史生成长度自动确定
             
         Returns:
             包含评审结果的字典
@@ -47,7 +156,16 @@ class AutomaticReviewService:
             return self._generate_review_using_automatic_review(paper_content, temperature, max_tokens)
         except Exception as e:
             logger.error(f"生成评审失败: {str(e)}")
-            return {"error": str(e)}
+            return self._error_result(e)
+    
+    @staticmethod
+    def _error_result(error: Exception) -> Dict[str, Any]:
+        """生成失败时的结果；端点熔断时附带 retry_after，便于接口快速返回降级结果"""
+        result = {"error": str(error)}
+        if isinstance(error, CircuitOpenError):
+            result["circuit_open"] = True
+            result["retry_after"] = round(error.retry_after)
+        return result
     
     def format_automatic_review_to_frontend(self, review_result: Dict[str, Any]) -> List[Dict[str, str]]:
         """
@@ -70,7 +188,8 @@ class AutomaticReviewService:
                 }]
             
             # 解析评审内容的4个结构化部分
-            sections = self._parse_review_sections(content)
+            with trace_span("parse_sections", parser="automatic_review"), SECTION_PARSING_SECONDS.labels(parser="automatic_review").time():
+                sections = self._parse_review_sections(content)
             
             reviews = []
             
@@ -183,11 +302,23 @@ class AutomaticReviewService:
         
         return sentences[:3]  # 最多返回3个相关句子
 
-    def _generate_review_using_automatic_review(self, paper_content: str, temperature: float = 0.0, max_tokens: int = 8192) -> Dict[str, Any]:
+    def _generate_review_using_automatic_review(self, paper_content: str, temperature: float = 0.0, max_tokens: Union[int, str] = 8192) -> Dict[str, Any]:
         """使用Automatic_Review的原始功能生成评审"""
-        prompt_template = self._load_prompt_template("generation", "prompt_generate_review_v2.txt")     
-        if prompt_template:
-            template_parts = prompt_template.split("<paper>")
+        prompt = self.build_review_prompt(paper_content)
+        
+        review_content, usage = self._call_llm_with_usage(prompt, temperature, max_tokens, template="automatic_review")
+        
+        return {
+            "type": "automatic_review",
+            "content": review_content,
+            "source": "Automatic_Review",
+            "usage": usage
+        }
+    
+    def build_review_prompt(self, paper_content: str) -> str:
+        """组装 Automatic_Review 评审 prompt"""
+        start_time = time.perf_counter()
+        prompt_template = self._load_prompt_template("generation", "prompt_generate_review_v2.txt")
         
         # 在<paper>标签处插入论文内容
         if prompt_template and "<paper>" in prompt_template:
@@ -195,16 +326,28 @@ class AutomaticReviewService:
         else:
             prompt = (prompt_template or "") + "\n<paper>\n" + paper_content + "\n</paper>"
         
-        review_content = self._call_llm_for_review(prompt, temperature, max_tokens)
-        
-        return {
-            "type": "automatic_review",
-            "content": review_content,
-            "source": "Automatic_Review"
-        }
+        PROMPT_BUILD_SECONDS.labels(template="automatic_review").observe(time.perf_counter() - start_time)
+        return prompt
+    
+    def preload_templates(self):
+        """预先读取提示词模板（gunicorn preload 时在 fork 前执行，各 worker 共享）"""
+        self._load_prompt_template("generation", "prompt_generate_review_v2.txt")
     
     def _load_prompt_template(self, module: str, filename: str) -> Optional[str]:
-        """加载提示词模板"""
+        """加载提示词模板（带缓存）"""
+        cache_key = f"{module}/{filename}"
+        if cache_key in self._prompt_template_cache:
+            CACHE_HITS_TOTAL.labels(cache="prompt_template").inc()
+            return self._prompt_template_cache[cache_key]
+        
+        CACHE_MISSES_TOTAL.labels(cache="prompt_template").inc()
+        template = self._read_prompt_template(module, filename)
+        if template is not None:
+            self._prompt_template_cache[cache_key] = template
+        return template
+    
+    def _read_prompt_template(self, module: str, filename: str) -> Optional[str]:
+        """从文件读取提示词模板"""
         try:
             if module == "generation":
                 prompt_path = self.generation_path / "prompts" / filename
@@ -228,76 +371,239 @@ class AutomaticReviewService:
         """调用LLM生成评审（使用默认模型）"""
         return self._call_llm_for_review_with_model(prompt, temperature, max_tokens, model_name=None)
     
-    def _call_llm_for_review_with_model(self, prompt: str, temperature: float = 0.0, max_tokens: int = 8192, model_name: str = None) -> str:
-        """调用LLM生成评审（可指定模型）"""
+    def _call_llm_for_review_with_model(self, prompt: str, temperature: float = 0.0, max_tokens: Union[int, str] = 8192, model_name: str = None,
+                                        template: str = None) -> str:
+        """
+        调用LLM生成评审（可指定模型）
+        指定 template 且启用提前终止时走流式生成，Decision 部分完整后立即关闭流
+        """
+        return self._call_llm_with_usage(prompt, temperature, max_tokens, model_name, template)[0]
+    
+    def _call_llm_with_usage(self, prompt: str, temperature: float = 0.0, max_tokens: Union[int, str] = 8192, model_name: str = None,
+                             template: str = None) -> Tuple[str, Dict[str, Any]]:
+        """同 _call_llm_for_review_with_model，额外返回用量统计（token 数、耗时、首 token 延迟、生成速度）"""
         if self.vllm_service:
-            try:
-                # 使用VllmService的通用文本生成方法
-                result = self.vllm_service.generate_text(
-                    prompt=prompt,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                    model_name=model_name
-                )
-                
-                logger.info(f"生成的评审长度: {len(result):,} 字符")
-                return result
-            except Exception as e:
-                logger.error(f"调用VllmService失败: {str(e)}")
-                return f"Error generating review: {str(e)}"
+            # 重复提交与前端重试发起的相同生成合并为一次，共享结果（或异常）
+            key = (template or "generic", self._prompt_hash(prompt), model_name, temperature, max_tokens)
+            return self._coalesce(key, lambda: self._generate_with_model(prompt, temperature, max_tokens, model_name, template))
         else:
             # 如果没有VllmService，返回占位符
-            return "This is a placeholder review content. Please provide VllmService for actual LLM call."
+            return "This is a placeholder review content. Please provide VllmService for actual LLM call.", {}
+    
+    def _generate_with_model(self, prompt: str, temperature: float, max_tokens: Union[int, str], model_name: Optional[str],
+                             template: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+        # 调用失败直接抛出，由调用方返回错误结果，避免把错误信息当作评审内容解析
+        model = self.vllm_service.get_model(model_name)
+        template_key = template or "generic"
+        max_tokens = self.token_budget.resolve(max_tokens, model, template_key, prompt)
+        
+        if template in DECISION_COMPLETION and self._early_stop_enabled():
+            result, usage = self._generate_until_decision(prompt, temperature, max_tokens, model_name, template)
+        else:
+            # 使用VllmService的通用文本生成方法
+            result, usage = self.vllm_service.generate_text_with_usage(
+                prompt=prompt,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                model_name=model_name
+            )
+        self.token_budget.record(model, template_key, usage.get("completion_tokens"))
+        self._record_usage(template_key, usage)
+        
+        logger.info("生成的评审长度: %d 字符, 用量: %s", len(result), usage)
+        return result, usage
     
-    def generate_deep_review(self, paper_content: str, temperature: float = 0.0, max_tokens: int = 8192) -> Dict[str, Any]:
+    @staticmethod
+    def _prompt_hash(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    
+    def _coalesce(self, key: tuple, generate):
+        """相同 key（模板、prompt 哈希、模型、温度、max_tokens）的并发生成只调用一次模型"""
+        vllm_config = getattr(self.config, "vllm", None)
+        if not getattr(vllm_config, "coalesce_enabled", True):
+            return generate()
+        result, shared = self._inflight_generations.do(key, generate)
+        if shared:
+            COALESCED_REQUESTS_TOTAL.labels(template=key[0]).inc()
+            logger.info("已合并到进行中的相同生成: %s %s", key[0], key[1][:12])
+            # 本请求没有调用模型，用量标记为共享
+            content, usage = result
+            result = (content, dict(usage, coalesced=True))
+        return result
+    
+    def _record_usage(self, template: str, usage: Dict[str, Any]):
+        if self.usage_recorder is not None:
+            try:
+                self.usage_recorder.record(template, usage)
+            except Exception as e:
+                logger.warning(f"记录生成用量失败: {str(e)}")
+    
+    def _early_stop_enabled(self) -> bool:
+        vllm_config = getattr(self.config, "vllm", None)
+        return bool(getattr(vllm_config, "early_stop_enabled", False))
+    
+    def _generate_until_decision(self, prompt: str, temperature: float, max_tokens: int, model_name: str, template: str):
+        """流式生成评审，Decision 部分完整后关闭流并记录节省的生成预算；返回 (评审内容, 用量统计)"""
+        watcher = SectionCompletionWatcher(DECISION_COMPLETION[template])
+        chunks = []
+        usage: Dict[str, Any] = {}
+        stream = self.vllm_service.generate_text_stream(
+            prompt=prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            model_name=model_name,
+            usage=usage
+        )
+        try:
+            for chunk in stream:
+                chunks.append(chunk)
+                if watcher.feed(chunk):
+                    break
+        finally:
+            # 关闭生成器即关闭到 vLLM 的连接
+            stream.close()
+        
+        content = "".join(chunks)
+        if not content.strip():
+            raise RuntimeError("vLLM 服务返回空结果")
+        
+        if watcher.complete:
+            content = content[:watcher.end_offset].rstrip()
+            # vLLM 未报告用量时，以分片数估算已生成 token（通常每个分片对应一个 token）
+            generated = usage.get("completion_tokens") or len(chunks)
+            saved = max(max_tokens - generated, 0)
+            usage["early_stop"] = True
+            EARLY_STOP_TOTAL.labels(template=template).inc()
+            EARLY_STOP_TOKENS_SAVED_TOTAL.labels(template=template).inc(saved)
+            logger.info("Decision 已完整，提前终止生成: 已生成约 %s token，释放预算约 %s token", generated, saved)
+        return content, usage
+    
+    def condense_paper(self, sections: Dict[str, str], text_processor, temperature: float = 0.0) -> str:
+        """
+        超长论文的 map 阶段：正文按章节分块，各块并行生成摘要笔记，
+        用笔记替换正文后组装为可一次评审的论文文本
+        
+        Args:
+            sections: TextProcessorService.extract_sections 的结果
+            text_processor: 用于切分与组装的 TextProcessorService
+            temperature: 摘要生成温度
+        """
+        if not self.vllm_service:
+            raise RuntimeError("分块评审需要 VllmService")
+        
+        # 先规范化再切分，各块摘要的输入与单次评审一致
+        sections, _ = text_processor.normalize_sections(sections)
+        chunks = text_processor.chunk_body(sections.get("body", ""), self.chunking.chunk_tokens)
+        if not chunks:
+            return text_processor.assemble_text(sections, auto_truncate=True, normalize=False)
+        
+        title = sections.get("title", "")
+        workers = min(len(chunks), max(self.chunking.parallel_per_replica * self.vllm_service.get_replica_count(), 1))
+        logger.info("分块评审: %s 块, 并发 %s", len(chunks), workers)
+        
+        with trace_span("condense_paper", chunks=len(chunks), workers=workers):
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # copy_context 让各块的追踪 span 挂在当前请求下
+                futures = [
+                    pool.submit(contextvars.copy_context().run, self._summarize_chunk, title, index, len(chunks), chunk, temperature)
+                    for index, chunk in enumerate(chunks)
+                ]
+                notes = [future.result() for future in futures]
+        
+        condensed = dict(sections)
+        condensed["body"] = "\n\n".join(
+            f"[Notes on part {index + 1}/{len(notes)}]\n{note.strip()}" for index, note in enumerate(notes)
+        )
+        return text_processor.assemble_text(condensed, auto_truncate=True, normalize=False)
+    
+    def _summarize_chunk(self, title: str, index: int, total: int, chunk: str, temperature: float) -> str:
+        """生成单个分块的摘要笔记"""
+        prompt = (
+            "You are assisting an expert academic reviewer. The paper below is too long to review in one pass, "
+            "so its main content has been split into parts.\n\n"
+            f"Read part {index + 1} of {total} of the paper titled \"{title}\" and write condensed reviewer notes in plain text:\n"
+            "- the main claims and contributions made in this part\n"
+            "- methods, experimental setup and results (keep key numbers)\n"
+            "- any weaknesses, gaps, or inconsistencies you notice\n"
+            "Do not write a full review and do not give a decision.\n\n"
+            "<paper_part>\n"
+            f"{chunk}\n"
+            "</paper_part>"
+        )
+        key = ("chunk_summary", self._prompt_hash(prompt), None, temperature, self.chunking.summary_max_tokens)
+        with trace_span("summarize_chunk", index=index):
+            content, _ = self._coalesce(key, lambda: self._generate_chunk_summary(prompt, temperature))
+        return content
+    
+    def _generate_chunk_summary(self, prompt: str, temperature: float) -> Tuple[str, Dict[str, Any]]:
+        model = self.vllm_service.get_model(None)
+        content, usage = self.vllm_service.generate_text_with_usage(
+            prompt=prompt,
+            temperature=temperature,
+            max_tokens=self.chunking.summary_max_tokens
+        )
+        self.token_budget.record(model, "chunk_summary", usage.get("completion_tokens"))
+        self._record_usage("chunk_summary", usage)
+        return content, usage
+    
+    def generate_deep_review(self, paper_content: str, temperature: float = 0.0, max_tokens: Union[int, str] = 8192) -> Dict[str, Any]:
         """
         生成深度评审 - 使用 deep review-7b 模型
         
         Args:
             paper_content: 论文内容
             temperature: 温度参数，控制输出的随机性，默认0.0表示确定性输出
-            max_tokens: 最大生成token数量，默认8192
+            max_tokens: 最大生成token数量，默认8192；"auto" 表示按历史生成长度自动确定
             
         Returns:
             包含评审结果的字典
         """
         try:
-            # Deep review prompt
-            deep_review_prompt = (
-                "You are an expert academic reviewer tasked with providing a thorough and balanced evaluation of research papers. Your thinking mode is Fast Mode.\n\n"
-                "Strictly follow the instructions below:\n"
-                "1. Read the paper content between <paper>...</paper>.\n"
-                "2. Return your answer using EXACTLY the following four sections in this order.\n"
-                "3. Use plain text only. Do not add extra sections, headers, bullets, JSON, or braces.\n\n"
-                "Summary:\n"
-                "<Provide a concise paragraph summarizing the work.>\n\n"
-                "Strengths:\n"
-                "<Provide one concise paragraph describing the main strengths.>\n\n"
-                "Weaknesses:\n"
-                "<Provide one concise paragraph describing the main weaknesses or concerns.>\n\n"
-                "Decision:\n"
-                "<Provide a single-word recommendation such as Accept, Weak Accept, Borderline, Weak Reject, or Reject.>\n\n"
-                "Content of the paper to be reviewed:\n"
-                "<paper>\n"
-                f"{paper_content}\n"
-                "</paper>"
-            )
-            review_content = self._call_llm_for_review_with_model(
+            deep_review_prompt = self.build_deep_review_prompt(paper_content)
+            review_content, usage = self._call_llm_with_usage(
                 prompt=deep_review_prompt,
                 temperature=temperature,
                 max_tokens=max_tokens,
-                model_name="deep-review-7b"
+                model_name="deep-review-7b",
+                template="deep_review"
             )
             
             return {
                 "type": "deep_review",
                 "content": review_content,
-                "source": "deep-review-7b"
+                "source": "deep-review-7b",
+                "usage": usage
             }
             
         except Exception as e:
             logger.error(f"生成深度评审失败: {str(e)}")
-            return {"error": str(e)}
+            return self._error_result(e)
+    
+    def build_deep_review_prompt(self, paper_content: str) -> str:
+        """组装 deep review prompt"""
+        start_time = time.perf_counter()
+        # Deep review prompt
+        deep_review_prompt = (
+            "You are an expert academic reviewer tasked with providing a thorough and balanced evaluation of research papers. Your thinking mode is Fast Mode.\n\n"
+            "Strictly follow the instructions below:\n"
+            "1. Read the paper content between <paper>...</paper>.\n"
+            "2. Return your answer using EXACTLY the following four sections in this order.\n"
+            "3. Use plain text only. Do not add extra sections, headers, bullets, JSON, or braces.\n\n"
+            "Summary:\n"
+            "<Provide a concise paragraph summarizing the work.>\n\n"
+            "Strengths:\n"
+            "<Provide one concise paragraph describing the main strengths.>\n\n"
+            "Weaknesses:\n"
+            "<Provide one concise paragraph describing the main weaknesses or concerns.>\n\n"
+            "Decision:\n"
+            "<Provide a single-word recommendation such as Accept, Weak Accept, Borderline, Weak Reject, or Reject.>\n\n"
+            "Content of the paper to be reviewed:\n"
+            "<paper>\n"
+            f"{paper_content}\n"
+            "</paper>"
+        )
+        PROMPT_BUILD_SECONDS.labels(template="deep_review").observe(time.perf_counter() - start_time)
+        return deep_review_prompt
     
     def format_deep_review_to_frontend(self, review_result: Dict[str, Any]) -> List[Dict[str, str]]:
         """
@@ -323,7 +629,8 @@ class AutomaticReviewService:
                 }]
             
             # 解析评审内容的结构化部分
-            sections = self._parse_deep_review_sections(content)
+            with trace_span("parse_sections", parser="deep_review"), SECTION_PARSING_SECONDS.labels(parser="deep_review").time():
+                sections = self._parse_deep_review_sections(content)
             
             reviews = []
             
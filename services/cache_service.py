@@ -0,0 +1,102 @@
+"""
+Cache Service - 进程内按内存上限淘汰的 LRU 缓存
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from services.metrics_service import CACHE_HITS_TOTAL, CACHE_MISSES_TOTAL
+
+
+def estimate_size(value: Any) -> int:
+    """粗略估算缓存值占用的内存（字节），对 str/bytes 与其组成的 tuple/list/dict 足够准确"""
+    if isinstance(value, (str, bytes, bytearray)):
+        return sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """线程安全的 LRU 缓存，按估算内存而非条目数淘汰"""
+
+    def __init__(self, name: str, max_bytes: int, size_fn: Callable[[Any], int] = estimate_size):
+        """
+        Args:
+            name: 缓存名称，用作指标标签
+            max_bytes: 内存上限（字节），0 表示禁用缓存
+            size_fn: 估算单个值大小的函数
+        """
+        self.name = name
+        self.max_bytes = max_bytes
+        self.size_fn = size_fn
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+        if item is None:
+            CACHE_MISSES_TOTAL.labels(cache=self.name).inc()
+            return None
+        CACHE_HITS_TOTAL.labels(cache=self.name).inc()
+        return item[0]
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_bytes <= 0:
+            return
+        size = self.size_fn(value)
+        if size > self.max_bytes:
+            # 单个值超过上限时不缓存，避免清空整个缓存
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._data[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._data:
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return None
+            self.current_bytes -= item[1]
+            return item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,117 @@
+"""
+Circuit Breaker - 按 vLLM 端点的熔断器
+
+连续失败（连接错误、超时、5xx）达到阈值后熔断：在 recovery_timeout 内的调用直接抛出
+CircuitOpenError，不再占用工作线程等待超时；之后进入半开状态放行少量探测请求，
+探测成功则恢复，失败则重新熔断。
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """端点已熔断，调用被直接拒绝"""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"端点 {name} 已熔断，约 {retry_after:.0f} 秒后重试")
+
+
+class CircuitBreaker:
+    """单个端点的熔断器（线程安全）"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0, half_open_max_calls: int = 1):
+        """
+        Args:
+            name: 端点名称（通常为 URL），用于日志与错误信息
+            failure_threshold: 触发熔断的连续失败次数
+            recovery_timeout: 熔断后进入半开状态前的等待时间（秒）
+            half_open_max_calls: 半开状态下同时放行的探测请求数
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._last_error = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+            logger.info("熔断器半开，允许探测请求: %s", self.name)
+        return self._state
+
+    def allow_request(self) -> bool:
+        """是否放行请求（不抛异常，供副本选择使用）"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN:
+                return self._half_open_calls < self.half_open_max_calls
+            return False
+
+    def before_call(self):
+        """调用前检查，熔断时抛出 CircuitOpenError"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return
+            retry_after = max(self.recovery_timeout - (time.monotonic() - self._opened_at), 1.0)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info("熔断器恢复: %s", self.name)
+            self._state = CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self, error: str = None):
+        with self._lock:
+            self._failures += 1
+            self._last_error = error
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(f"熔断器打开: {self.name}，连续失败 {self._failures} 次，最近错误: {error}")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_calls = 0
+
+    def release(self):
+        """调用被主动取消、未得出结论时归还半开探测名额"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "last_error": self._last_error
+            }
@@ -0,0 +1,222 @@
+"""
+Compression Service - 请求体解压与响应压缩
+
+RequestDecompressionMiddleware 在 WSGI 层透明解压 Content-Encoding 为 gzip / zstd 的请求体，
+边读边解压并限制解压后大小，防止压缩炸弹；compress_response 按 Accept-Encoding 协商压缩较大的响应。
+zstd 需要安装 zstandard，未安装时只支持 gzip。
+"""
+
+import gzip
+import io
+import logging
+import zlib
+from typing import Iterable, Optional
+
+from services.json_codec import json_dumps_bytes
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# 这些类型本身已压缩或是流式输出，不再压缩
+SKIP_MIMETYPES = ("text/event-stream", "image/", "video/", "audio/", "application/zip", "application/gzip")
+
+
+class DecompressedSizeExceeded(ValueError):
+    """解压后大小超过上限"""
+
+
+def supported_encodings() -> list:
+    """当前环境支持的请求体编码"""
+    return ["gzip", "zstd"] if HAS_ZSTD else ["gzip"]
+
+
+def _iter_input(stream, content_length: Optional[int], limit: int) -> Iterable[bytes]:
+    """按块读取 wsgi.input，压缩数据本身也不超过 limit"""
+    remaining = content_length
+    total = 0
+    while remaining is None or remaining > 0:
+        size = READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining)
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > limit:
+            raise DecompressedSizeExceeded(f"压缩后的请求体超过上限 {limit} 字节")
+        if remaining is not None:
+            remaining -= len(chunk)
+        yield chunk
+
+
+def _gunzip_stream(chunks: Iterable[bytes], limit: int) -> bytes:
+    # wbits=16+MAX_WBITS 只接受 gzip 头；max_length 保证单步输出不超过剩余配额
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    output = io.BytesIO()
+    for chunk in chunks:
+        data = chunk
+        while data:
+            out = decompressor.decompress(data, limit + 1 - output.tell())
+            output.write(out)
+            if output.tell() > limit:
+                raise DecompressedSizeExceeded(f"解压后的请求体超过上限 {limit} 字节")
+            data = decompressor.unconsumed_tail
+            if decompressor.eof:
+                break
+        if decompressor.eof:
+            break
+    if not decompressor.eof:
+        raise zlib.error("gzip 数据不完整")
+    return output.getvalue()
+
+
+class _ChunkReader:
+    """把输入块迭代器包装成 stream_reader 需要的 read()，并保留已读取的压缩数据"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._pending = b""
+        self.consumed = io.BytesIO()
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b""
+            self._pending = chunk
+        if size is None or size < 0:
+            size = len(self._pending)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        self.consumed.write(data)
+        return data
+
+
+def _unzstd_stream(chunks: Iterable[bytes], limit: int) -> bytes:
+    # decompressobj 没有输出上限，改用 stream_reader 按剩余配额读取
+    source = _ChunkReader(chunks)
+    reader = zstandard.ZstdDecompressor().stream_reader(source, read_size=READ_CHUNK_SIZE,
+                                                        read_across_frames=False)
+    output = io.BytesIO()
+    while True:
+        out = reader.read(min(READ_CHUNK_SIZE, limit + 1 - output.tell()))
+        if not out:
+            break
+        output.write(out)
+        if output.tell() > limit:
+            raise DecompressedSizeExceeded(f"解压后的请求体超过上限 {limit} 字节")
+    # stream_reader 遇到截断的帧只是返回空数据；解压结果已确认不超过 limit，
+    # 再用 decompressobj 过一遍同样的输入确认帧已结束
+    checker = zstandard.ZstdDecompressor().decompressobj()
+    checker.decompress(source.consumed.getvalue())
+    if not checker.eof:
+        raise EOFError("zstd 数据不完整")
+    return output.getvalue()
+
+
+class RequestDecompressionMiddleware:
+    """WSGI 中间件：解压请求体后交给 Flask，路由无需感知压缩"""
+
+    def __init__(self, wsgi_app, max_decompressed_bytes: int):
+        self.wsgi_app = wsgi_app
+        self.max_decompressed_bytes = max_decompressed_bytes
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if not encoding or encoding == "identity":
+            return self.wsgi_app(environ, start_response)
+
+        if encoding not in supported_encodings():
+            return self._error(start_response, "415 Unsupported Media Type",
+                               f"不支持的 Content-Encoding: {encoding}，支持: {', '.join(supported_encodings())}")
+
+        try:
+            content_length = int(environ.get("CONTENT_LENGTH") or 0) or None
+        except ValueError:
+            content_length = None
+
+        chunks = _iter_input(environ["wsgi.input"], content_length, self.max_decompressed_bytes)
+        try:
+            if encoding == "gzip":
+                body = _gunzip_stream(chunks, self.max_decompressed_bytes)
+            else:
+                body = _unzstd_stream(chunks, self.max_decompressed_bytes)
+        except DecompressedSizeExceeded as e:
+            logger.warning(f"拒绝压缩请求体: {str(e)}")
+            return self._error(start_response, "413 Request Entity Too Large", str(e))
+        except (zlib.error, EOFError, OSError) as e:
+            logger.warning(f"请求体解压失败 ({encoding}): {str(e)}")
+            return self._error(start_response, "400 Bad Request", f"请求体 {encoding} 解压失败")
+        except Exception as e:
+            if HAS_ZSTD and isinstance(e, zstandard.ZstdError):
+                logger.warning(f"请求体解压失败 ({encoding}): {str(e)}")
+                return self._error(start_response, "400 Bad Request", f"请求体 {encoding} 解压失败")
+            raise
+
+        logger.debug("请求体解压 (%s): %s -> %s 字节", encoding, content_length, len(body))
+        environ["wsgi.input"] = io.BytesIO(body)
+        environ["CONTENT_LENGTH"] = str(len(body))
+        environ.pop("HTTP_CONTENT_ENCODING", None)
+        environ["review.request_encoding"] = encoding
+        return self.wsgi_app(environ, start_response)
+
+    @staticmethod
+    def _error(start_response, status: str, message: str):
+        body = json_dumps_bytes({"error": message})
+        start_response(status, [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+        return [body]
+
+
+def _accepts(accept_encoding: str, encoding: str) -> bool:
+    """解析 Accept-Encoding，q=0 视为不接受"""
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() != encoding:
+            continue
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def compress_response(response, accept_encoding: str, min_bytes: int, level: int = 6):
+    """
+    按 Accept-Encoding 压缩响应（优先 zstd，其次 gzip），原地修改并返回 response
+
+    流式响应、已编码响应以及小于 min_bytes 的响应保持原样；min_bytes <= 0 表示禁用。
+    """
+    if min_bytes <= 0 or not accept_encoding:
+        return response
+    if response.is_streamed or response.direct_passthrough or "Content-Encoding" in response.headers:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    if (response.mimetype or "").startswith(SKIP_MIMETYPES):
+        return response
+
+    data = response.get_data()
+    if len(data) < min_bytes:
+        return response
+
+    if HAS_ZSTD and _accepts(accept_encoding, "zstd"):
+        encoding = "zstd"
+        compressed = zstandard.ZstdCompressor(level=min(level, 19)).compress(data)
+    elif _accepts(accept_encoding, "gzip"):
+        encoding = "gzip"
+        compressed = gzip.compress(data, compresslevel=level)
+    else:
+        return response
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    logger.debug("响应压缩 (%s): %s -> %s 字节", encoding, len(data), len(compressed))
+    return response
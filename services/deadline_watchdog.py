@@ -0,0 +1,78 @@
+"""
+Deadline Watchdog - 为进行中的流式请求执行分阶段超时
+
+requests 的 timeout 只作用于单次 socket 读取，无法区分“迟迟不出首 token”和
+“正在稳定输出的长评审”。每个流式请求登记一个 Watch，读取线程在推进阶段时更新截止时间；
+后台线程发现超时后调用 on_expire（通常是中断连接），读取线程随即报错并据 expired_phase 判断原因。
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Watch:
+    """单个请求的截止时间"""
+
+    def __init__(self, watchdog: "DeadlineWatchdog", on_expire: Callable[[], None]):
+        self._watchdog = watchdog
+        self._on_expire = on_expire
+        self.deadline: Optional[float] = None
+        self.phase: Optional[str] = None
+        self.expired_phase: Optional[str] = None
+
+    def set_deadline(self, deadline: float, phase: str):
+        """设置新的截止时间（time.monotonic() 时间）与所处阶段"""
+        self.deadline = deadline
+        self.phase = phase
+
+    def cancel(self):
+        self._watchdog._remove(self)
+
+    def _expire(self):
+        self.expired_phase = self.phase
+        try:
+            self._on_expire()
+        except Exception as e:
+            logger.warning(f"超时处理失败: {str(e)}")
+
+
+class DeadlineWatchdog:
+    """单个后台线程按固定间隔检查所有 Watch"""
+
+    def __init__(self, tick: float = 0.2):
+        self.tick = tick
+        self._watches = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, on_expire: Callable[[], None]) -> Watch:
+        watch = Watch(self, on_expire)
+        with self._lock:
+            self._watches.add(watch)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="vllm-deadline-watchdog", daemon=True)
+                self._thread.start()
+        return watch
+
+    def _remove(self, watch: Watch):
+        with self._lock:
+            self._watches.discard(watch)
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick)
+            now = time.monotonic()
+            with self._lock:
+                if not self._watches:
+                    # 没有进行中的请求时退出，下次登记时重新启动
+                    self._thread = None
+                    return
+                expired = [w for w in self._watches if w.deadline is not None and now >= w.deadline]
+                for watch in expired:
+                    self._watches.discard(watch)
+            for watch in expired:
+                watch._expire()
@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Any, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+class HealthService:
+    """依赖健康检查服务 - 后台定期探测 vLLM 与 MySQL，接口只读取缓存结果"""
+
+    def __init__(self, config, vllm_service, db_probe: Optional[Callable[[], None]] = None):
+        """
+        初始化健康检查服务
+
+        Args:
+            config: 应用配置，使用 config.health 中的探测周期和超时
+            vllm_service: VllmService 实例，用于获取端点列表和进行中请求数
+            db_probe: 数据库探测函数，执行失败时抛出异常
+        """
+        self.config = config
+        self.vllm_service = vllm_service
+        self.db_probe = db_probe
+        self.interval = config.health.probe_interval
+        self.timeout = config.health.probe_timeout
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # 探测结果快照，每轮探测结束后整体替换，读取时无需加锁
+        self._backends: Dict[str, Dict[str, Any]] = {}
+        self._database: Dict[str, Any] = {"status": "unknown", "latency_ms": None, "last_error": None}
+        self._last_probe_at: Optional[str] = None
+
+    def start(self):
+        """启动后台探测线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="health-probe", daemon=True)
+        self._thread.start()
+        logger.info("健康检查后台探测已启动，周期: %s 秒", self.interval)
+
+    def stop(self):
+        """停止后台探测线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.probe_once()
+            except Exception as e:
+                logger.warning(f"健康检查探测异常: {str(e)}")
+            self._stop_event.wait(self.interval)
+
+    def probe_once(self):
+        """执行一轮探测并更新缓存"""
+        backends = {}
+        for backend in self.vllm_service.get_backends():
+            previous = self._backends.get(backend["name"], {})
+            backends[backend["name"]] = self._probe_vllm(backend, previous)
+
+        database = self._probe_database(self._database)
+
+        self._backends = backends
+        self._database = database
+        self._last_probe_at = datetime.now().isoformat()
+
+    def _probe_vllm(self, backend: Dict[str, str], previous: Dict[str, Any]) -> Dict[str, Any]:
+        """探测单个 vLLM 端点的 /health 与 /v1/models"""
+        url = backend["url"]
+        result = {
+            "url": url,
+            "model": backend["model"],
+            "status": "down",
+            "model_loaded": False,
+            "latency_ms": None,
+            "last_error": previous.get("last_error"),
+            "last_ok_at": previous.get("last_ok_at")
+        }
+
+        try:
+            start = time.perf_counter()
+            response = requests.get(f"{url}/health", timeout=self.timeout)
+            response.raise_for_status()
+            result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+            response = requests.get(f"{url}/v1/models", timeout=self.timeout)
+            response.raise_for_status()
+            served_models = [item.get("id") for item in response.json().get("data", [])]
+            result["model_loaded"] = backend["model"] in served_models
+
+            result["status"] = "up" if result["model_loaded"] else "degraded"
+            if not result["model_loaded"]:
+                result["last_error"] = f"模型 {backend['model']} 未在服务列表中: {served_models}"
+            result["last_ok_at"] = datetime.now().isoformat()
+        except Exception as e:
+            result["last_error"] = str(e)
+            logger.warning(f"vLLM 端点探测失败 {url}: {str(e)}")
+
+        return result
+
+    def _probe_database(self, previous: Dict[str, Any]) -> Dict[str, Any]:
+        """探测数据库连接"""
+        result = {"status": "unknown", "latency_ms": None, "last_error": previous.get("last_error")}
+        if not self.db_probe:
+            return result
+
+        try:
+            start = time.perf_counter()
+            self.db_probe()
+            result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            result["status"] = "up"
+        except Exception as e:
+            result["status"] = "down"
+            result["last_error"] = str(e)
+            logger.warning(f"数据库探测失败: {str(e)}")
+
+        return result
+
+    def get_status(self) -> Dict[str, Any]:
+        """返回缓存的健康状态，不触发任何探测"""
+        backends = {}
+        for name, info in self._backends.items():
+            backends[name] = dict(
+                info,
+                in_flight=self.vllm_service.get_inflight_count(info["url"]),
+                circuit=self.vllm_service.get_circuit_state(info["url"])
+            )
+
+        if self._last_probe_at is None:
+            status = "starting"
+        elif all(b["status"] == "up" for b in backends.values()) and self._database["status"] in ("up", "unknown"):
+            status = "ok"
+        else:
+            status = "degraded"
+
+        return {
+            "message": "Paper Review Backend is running!",
+            "status": status,
+            "last_probe_at": self._last_probe_at,
+            "probe_interval": self.interval,
+            "backends": backends,
+            "database": self._database
+        }
@@ -0,0 +1,65 @@
+"""
+Hedging - 对冲请求所需的延迟统计与预算
+
+首 token 迟迟未到时向另一个副本发送重复请求，先出结果者胜出。
+LatencyTracker 提供自适应的对冲阈值（观测到的 TTFT 高分位数），
+HedgeBudget 按主请求数累积对冲额度，限制对冲带来的额外负载。
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class LatencyTracker:
+    """按模型统计最近的延迟样本"""
+
+    def __init__(self, window_size: int = 500):
+        self.window_size = window_size
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window_size)
+            samples.append(seconds)
+
+    def percentile(self, key: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """返回分位数，样本不足时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(min_samples, 1):
+            return None
+        index = max(int(math.ceil(q * len(samples))) - 1, 0)
+        return samples[min(index, len(samples) - 1)]
+
+
+class HedgeBudget:
+    """
+    对冲额度：每个主请求存入 ratio 个额度，每次对冲消耗 1 个，额度上限为 burst
+    长期来看对冲请求数不超过主请求数的 ratio 倍
+    """
+
+    def __init__(self, ratio: float = 0.1, burst: float = 5.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self._tokens + self.ratio, self.burst)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    @property
+    def available(self) -> float:
+        return self._tokens
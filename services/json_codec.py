@@ -0,0 +1,82 @@
+"""
+JSON Codec - 高性能 JSON 编解码
+
+安装了 orjson 时使用 orjson（直接输出 UTF-8，相当于 ensure_ascii=False），
+否则回退到标准库 json。Flask 应用通过 FastJSONProvider 接入，
+VllmService 用 json_loads / json_dumps_bytes 处理请求与响应。
+"""
+
+import json
+from typing import Any, Union
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# orjson.JSONDecodeError 继承自 json.JSONDecodeError，调用方统一捕获后者即可
+JSONDecodeError = json.JSONDecodeError
+
+
+def json_loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """解析 JSON（接受 str 或 bytes）"""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps_bytes(obj: Any, sort_keys: bool = False) -> bytes:
+    """序列化为 UTF-8 编码的紧凑 JSON"""
+    if HAS_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys, separators=(',', ':')).encode('utf-8')
+
+
+def json_dumps(obj: Any, sort_keys: bool = False) -> str:
+    """序列化为紧凑 JSON 字符串"""
+    return json_dumps_bytes(obj, sort_keys=sort_keys).decode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider：ensure_ascii=False 的紧凑输出走 orjson，其余情况沿用默认实现"""
+
+    def _fast_path(self) -> bool:
+        return HAS_ORJSON and not self.ensure_ascii
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if not self._fast_path() or kwargs.get('indent') is not None:
+            return super().dumps(obj, **kwargs)
+        return self._dumps_bytes(obj, kwargs.get('sort_keys', self.sort_keys)).decode('utf-8')
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if not HAS_ORJSON or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        if not self._fast_path() or (self.compact is None and current_app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        # 与 jsonify 的参数约定一致：单个位置参数原样序列化，多个位置参数作为列表，关键字参数作为字典
+        if args and kwargs:
+            raise TypeError("jsonify() 不能同时接受位置参数和关键字参数")
+        if len(args) == 1:
+            obj = args[0]
+        else:
+            obj = list(args) if args else (kwargs or None)
+        # 直接输出 bytes，省去 str -> bytes 的二次编码
+        body = self._dumps_bytes(obj, self.sort_keys) + b"\n"
+        return current_app.response_class(body, mimetype=self.mimetype)
+
+    def _dumps_bytes(self, obj: Any, sort_keys: bool) -> bytes:
+        # datetime 交给 Flask 默认的 default 处理，保持与标准实现一致的输出格式
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
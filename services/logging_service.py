@@ -0,0 +1,181 @@
+"""
+Logging Service - 结构化日志与后台写出
+
+每个评审请求产生十几条日志（论文解析、token 统计、每次 vLLM 调用），原先在请求线程中同步格式化并写出。
+configure_logging 把根 logger 的输出换成 QueueHandler：请求线程只把 LogRecord 放入队列，
+格式化（JSON 或文本）与写出由 QueueListener 的后台线程完成。
+每条记录附带当前请求的 request_id、接口与客户端，便于按请求检索；
+高频 logger 可按比例采样（只对 INFO 及以下生效，WARNING 及以上总是保留）。
+"""
+
+import atexit
+import logging
+import queue
+import random
+import sys
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from config.config import LoggingConfig
+from services.json_codec import json_dumps
+from services.metrics_service import LOG_RECORDS_DROPPED_TOTAL
+from services.request_context import get_request_context
+
+LOG_FORMATS = ("json", "text")
+
+# 由 RequestContextFilter 写入 LogRecord 的字段
+CONTEXT_FIELDS = ("request_id", "endpoint", "client_id")
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+
+class RequestContextFilter(logging.Filter):
+    """在产生日志的线程中记下当前请求的标识（后台写出线程看不到请求的 contextvars）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = get_request_context()
+        record.request_id = context.request_id or "-"
+        record.endpoint = context.endpoint
+        record.client_id = context.client_id if context.request_id else ""
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    按 logger 名称前缀以一定比例保留 INFO 及以下级别的记录
+
+    前缀同时覆盖其子 logger（services.vllm_service 也作用于 services.vllm_service.stream），
+    多个前缀匹配时取最长的一个。
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = dict(rates)
+        self._resolved: Dict[str, Optional[float]] = {}
+
+    def rate_for(self, name: str) -> Optional[float]:
+        """返回 name 对应的保留比例，没有匹配的前缀时返回 None"""
+        try:
+            return self._resolved[name]
+        except KeyError:
+            pass
+        rate = None
+        matched = -1
+        for prefix, prefix_rate in self.rates.items():
+            if (name == prefix or name.startswith(prefix + ".")) and len(prefix) > matched:
+                rate, matched = prefix_rate, len(prefix)
+        self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        if rate is None or random.random() < rate:
+            return True
+        LOG_RECORDS_DROPPED_TOTAL.labels(reason="sampled").inc()
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key in CONTEXT_FIELDS:
+            value = getattr(record, key, None)
+            if value and value != "-":
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json_dumps(entry)
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """只把记录放入队列；消息格式化留给后台线程"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 队列在进程内，不需要像默认实现那样预先格式化成可序列化的字符串
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED_TOTAL.labels(reason="queue_full").inc()
+
+
+class _Pipeline:
+    def __init__(self, config: LoggingConfig, handler: BackgroundQueueHandler, output: logging.Handler):
+        self.config = config
+        self.handler = handler
+        self.output = output
+        self.listener: Optional[QueueListener] = None
+
+    def start(self):
+        self.listener = QueueListener(self.handler.queue, self.output, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            # 写出队列中剩余的记录
+            self.listener.stop()
+            self.listener = None
+
+
+_pipeline: Optional[_Pipeline] = None
+
+
+def configure_logging(config: LoggingConfig):
+    """把根 logger 切换为队列 + 后台写出；重复调用时替换之前的配置"""
+    global _pipeline
+    if config.format not in LOG_FORMATS:
+        raise ValueError(f"未知的日志格式: {config.format}，可选: {', '.join(LOG_FORMATS)}")
+
+    stop_logging()
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if config.format == "json" else logging.Formatter(TEXT_FORMAT))
+    handler = BackgroundQueueHandler(queue.Queue(maxsize=config.queue_size))
+    if config.sampling:
+        # 挂在队列 handler 上：所有 logger（包括子 logger）的记录都经过这里，被丢弃的记录不会进入队列
+        handler.addFilter(SamplingFilter(config.sampling))
+    handler.addFilter(RequestContextFilter())
+    root.addHandler(handler)
+    root.setLevel(config.level)
+
+    _pipeline = _Pipeline(config, handler, output)
+    _pipeline.start()
+
+
+def stop_logging():
+    """停止后台写出（写完队列中的记录）"""
+    global _pipeline
+    if _pipeline is None:
+        return
+    _pipeline.stop()
+    logging.getLogger().removeHandler(_pipeline.handler)
+    _pipeline = None
+
+
+def restart_after_fork():
+    """fork 出的 worker 进程中调用：父进程的写出线程不属于当前进程，队列的锁也可能处于持有状态"""
+    if _pipeline is None:
+        return
+    _pipeline.listener = None
+    _pipeline.handler.queue = queue.Queue(maxsize=_pipeline.config.queue_size)
+    _pipeline.start()
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,470 @@
+"""
+Metrics Service - 评审流水线的 Prometheus 指标
+
+不依赖 prometheus_client，直接输出 Prometheus 文本格式（text/plain; version=0.0.4）。
+每个进程维护自己的指标。gunicorn 的各 worker 共用一个端口，每次抓取落到随机的 worker 上，
+因此多 worker 部署时各进程定期把指标快照写入共享目录（MultiprocessMetrics，类似 prometheus_client
+的 multiprocess 模式），/metrics 汇总目录中所有进程：计数器与直方图求和（已退出进程的数据保留），
+gauge 按 pid 标签分别输出（只包含存活的进程）。
+"""
+
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple, Sequence
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 默认桶：覆盖毫秒级的文本处理到数分钟的生成
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape_label_value(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: Dict[str, str] = None) -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.extend(f'{name}="{_escape_label_value(value)}"' for name, value in extra.items())
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """指标基类：维护按标签值区分的子指标"""
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *labelvalues, **labelkwargs):
+        """按标签取子指标，用法与 prometheus_client 相同"""
+        if labelkwargs:
+            labelvalues = tuple(str(labelkwargs[name]) for name in self.labelnames)
+        else:
+            labelvalues = tuple(str(value) for value in labelvalues)
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+
+        child = self._children.get(labelvalues)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(labelvalues, self._new_child())
+        return child
+
+    def _unlabeled(self):
+        if self.labelnames:
+            raise ValueError(f"指标 {self.name} 需要先调用 labels()")
+        return self._children[()]
+
+    def reset(self):
+        """清空所有值（fork 出的 worker 中调用，父进程的值由父进程自己上报）"""
+        with self._lock:
+            self._children = {}
+            if not self.labelnames:
+                self._children[()] = self._new_child()
+
+    def samples(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        """(标签值, 值) 列表，值可 JSON 序列化"""
+        return [(labelvalues, self._child_value(child)) for labelvalues, child in sorted(self._children.items())]
+
+    def _child_value(self, child) -> Any:
+        return child.get()
+
+    def render(self, samples: Optional[List[Tuple[Tuple[str, ...], Dict[str, str], Any]]] = None) -> List[str]:
+        """samples 为 (标签值, 附加标签, 值) 列表，默认为本进程的值"""
+        if samples is None:
+            samples = [(labelvalues, None, value) for labelvalues, value in self.samples()]
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        for labelvalues, extra, value in samples:
+            lines.extend(self._render_sample(labelvalues, extra, value))
+        return lines
+
+    def _render_sample(self, labelvalues, extra, value) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, labelvalues, extra)} {_format_value(value)}']
+
+
+class _ValueChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = float(value)
+
+    def get(self) -> float:
+        return self._value
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    metric_type = 'counter'
+
+    def _new_child(self):
+        return _ValueChild()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabeled().inc(amount)
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+    metric_type = 'gauge'
+
+    def _new_child(self):
+        return _ValueChild()
+
+    def inc(self, amount: float = 1.0):
+        self._unlabeled().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._unlabeled().dec(amount)
+
+    def set(self, value: float):
+        self._unlabeled().set(value)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        buckets = tuple(sorted(float(b) for b in buckets))
+        if buckets[-1] != math.inf:
+            buckets = buckets + (math.inf,)
+        self.buckets = buckets
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._unlabeled().observe(value)
+
+    def time(self):
+        return self._unlabeled().time()
+
+    def _child_value(self, child) -> Any:
+        return child.snapshot()
+
+    def _render_sample(self, labelvalues, extra, value) -> List[str]:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, labelvalues, dict(extra or {}, le=_format_value(bound)))
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, labelvalues, extra)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标重复注册: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def metrics(self) -> List[_Metric]:
+        return list(self._metrics.values())
+
+    def reset(self):
+        for metric in self.metrics():
+            metric.reset()
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MultiprocessMetrics:
+    """多进程指标汇总：各进程把快照写入共享目录，抓取时合并"""
+
+    FILE_PATTERN = "metrics_*.json"
+
+    def __init__(self, registry: MetricsRegistry, directory: str, flush_interval: float = 5.0):
+        """
+        Args:
+            registry: 指标注册表
+            directory: 共享目录（同一实例的所有进程相同，不同实例不能共用）
+            flush_interval: 写入快照的间隔（秒）；抓取时其他 worker 的数据最多延迟这么久
+        """
+        self.registry = registry
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        # 创建者进程；preload 时为 gunicorn 父进程
+        self.pid = os.getpid()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"metrics_{pid}.json")
+
+    def write(self):
+        """写入本进程的快照（先写临时文件再替换，读取方不会看到写了一半的文件）"""
+        pid = os.getpid()
+        snapshot = {metric.name: metric.samples() for metric in self.registry.metrics()}
+        path = self._path(pid)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.write()
+            except Exception as e:
+                logger.warning(f"写入指标快照失败: {str(e)}")
+
+    def reset_after_fork(self):
+        """fork 出的 worker 进程中调用：从零开始计数（父进程的值已由父进程写入自己的文件），并启动写入线程"""
+        if os.getpid() != self.pid:
+            self.registry.reset()
+            self.pid = os.getpid()
+        self._thread = None
+        self._stop = threading.Event()
+        self.write()
+        self.start()
+
+    def render(self) -> str:
+        self.write()
+        merged: Dict[str, Dict[Tuple[Tuple[str, ...], Tuple[Tuple[str, str], ...]], Any]] = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, self.FILE_PATTERN))):
+            try:
+                pid = int(os.path.basename(path)[len("metrics_"):-len(".json")])
+                with open(path, encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except (ValueError, OSError) as e:
+                logger.warning(f"读取指标快照失败: {path}: {str(e)}")
+                continue
+            alive = pid == os.getpid() or _process_alive(pid)
+            for name, samples in snapshot.items():
+                metric = self.registry.get(name)
+                if metric is None:
+                    continue
+                values = merged.setdefault(name, {})
+                for labelvalues, value in samples:
+                    labelvalues = tuple(labelvalues)
+                    if metric.metric_type == 'gauge':
+                        # gauge 是各进程的瞬时值，求和没有意义；已退出进程的值不再有效
+                        if alive:
+                            values[(labelvalues, (("pid", str(pid)),))] = value
+                    elif metric.metric_type == 'histogram':
+                        counts, total, count = value
+                        previous = values.get((labelvalues, ()))
+                        if previous is not None:
+                            counts = [a + b for a, b in zip(previous[0], counts)]
+                            total += previous[1]
+                            count += previous[2]
+                        values[(labelvalues, ())] = (counts, total, count)
+                    else:
+                        values[(labelvalues, ())] = values.get((labelvalues, ()), 0.0) + value
+
+        lines = []
+        for metric in self.registry.metrics():
+            samples = [
+                (labelvalues, dict(extra), value)
+                for (labelvalues, extra), value in sorted(merged.get(metric.name, {}).items())
+            ]
+            lines.extend(metric.render(samples))
+        return '\n'.join(lines) + '\n'
+
+
+def clear_multiprocess_dir(directory: str):
+    """删除上次运行留下的快照（gunicorn 启动时调用）"""
+    for path in glob.glob(os.path.join(directory, "metrics_*.json*")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+registry = MetricsRegistry()
+
+_multiprocess: Optional[MultiprocessMetrics] = None
+
+
+def configure_multiprocess(directory: Optional[str], flush_interval: float = 5.0):
+    """设置共享目录后 /metrics 汇总所有进程；directory 为空时只输出本进程"""
+    global _multiprocess
+    _multiprocess = MultiprocessMetrics(registry, directory, flush_interval) if directory else None
+
+
+def render_metrics() -> str:
+    return _multiprocess.render() if _multiprocess is not None else registry.render()
+
+
+def write_process_metrics():
+    """写入本进程的快照（gunicorn 父进程在 fork worker 前调用，保留预加载阶段的指标）"""
+    if _multiprocess is not None:
+        _multiprocess.write()
+
+
+def reset_metrics_after_fork():
+    if _multiprocess is not None:
+        _multiprocess.reset_after_fork()
+
+# 各阶段耗时
+TEXT_PROCESSING_SECONDS = registry.register(Histogram(
+    'review_text_processing_seconds', '论文 JSON 转文本耗时（秒）', ['endpoint']))
+PROMPT_BUILD_SECONDS = registry.register(Histogram(
+    'review_prompt_build_seconds', '评审 prompt 组装耗时（秒）', ['template']))
+TIME_TO_FIRST_TOKEN_SECONDS = registry.register(Histogram(
+    'vllm_time_to_first_token_seconds', '流式生成首 token 延迟（秒）', ['model']))
+GENERATION_SECONDS = registry.register(Histogram(
+    'vllm_generation_seconds', 'vLLM 生成总耗时（秒）', ['model', 'mode']))
+SECTION_PARSING_SECONDS = registry.register(Histogram(
+    'review_section_parsing_seconds', '评审结果分段解析耗时（秒）', ['parser']))
+DB_WRITE_SECONDS = registry.register(Histogram(
+    'review_db_write_seconds', '数据库写入耗时（秒）', ['table']))
+COMPLETION_TOKENS = registry.register(Histogram(
+    'review_completion_tokens', '单次评审生成的 token 数', ['model', 'template'],
+    buckets=(128, 256, 512, 1024, 2048, 3072, 4096, 6144, 8192, 16384, 32768)))
+SCHEDULER_QUEUE_WAIT_SECONDS = registry.register(Histogram(
+    'scheduler_queue_wait_seconds', 'vLLM 请求在调度器中的排队时间（秒）', ['group', 'priority']))
+TOKENIZE_BATCH_SIZE = registry.register(Histogram(
+    'review_tokenize_batch_size', '合并后每次批量编码的文本数',
+    buckets=(1, 2, 4, 8, 16, 32, 64)))
+
+# 计数器
+PROMPT_TOKENS_TOTAL = registry.register(Counter(
+    'vllm_prompt_tokens_total', 'vLLM 报告的 prompt token 总数', ['model']))
+COMPLETION_TOKENS_TOTAL = registry.register(Counter(
+    'vllm_completion_tokens_total', 'vLLM 报告的生成 token 总数', ['model']))
+NORMALIZATION_TOKENS_REMOVED_TOTAL = registry.register(Counter(
+    'paper_normalization_tokens_removed_total', '论文文本规范化各步骤减少的 token 数', ['step']))
+CACHE_HITS_TOTAL = registry.register(Counter(
+    'review_cache_hits_total', '缓存命中次数', ['cache']))
+CACHE_MISSES_TOTAL = registry.register(Counter(
+    'review_cache_misses_total', '缓存未命中次数', ['cache']))
+ERRORS_TOTAL = registry.register(Counter(
+    'vllm_errors_total', 'vLLM 调用失败次数', ['model']))
+VLLM_TIMEOUTS_TOTAL = registry.register(Counter(
+    'vllm_timeouts_total', 'vLLM 请求各阶段超时次数（connect / ttft / idle / total）', ['backend', 'phase']))
+HEDGED_REQUESTS_TOTAL = registry.register(Counter(
+    'vllm_hedged_requests_total', '对冲请求结果（hedge_won / primary_won / budget_exhausted）', ['model', 'outcome']))
+EARLY_STOP_TOTAL = registry.register(Counter(
+    'review_early_stop_total', 'Decision 完整后提前终止生成的次数', ['template']))
+EARLY_STOP_TOKENS_SAVED_TOTAL = registry.register(Counter(
+    'review_early_stop_tokens_saved_total', '提前终止释放的生成预算（max_tokens 减去已生成分片数）', ['template']))
+COALESCED_REQUESTS_TOTAL = registry.register(Counter(
+    'review_coalesced_requests_total', '合并到相同进行中生成的请求数', ['template']))
+IDEMPOTENT_REQUESTS_TOTAL = registry.register(Counter(
+    'review_idempotent_requests_total', '带 Idempotency-Key 的请求（executed / joined / replayed / conflict）', ['endpoint', 'outcome']))
+RATE_LIMIT_REJECTED_TOTAL = registry.register(Counter(
+    'rate_limit_rejected_total', '超出 token 额度被拒绝（429）的请求数'))
+RATE_LIMIT_TOKENS_TOTAL = registry.register(Counter(
+    'rate_limit_charged_tokens_total', '限流结算时按实际用量计入的 token 数'))
+LOG_RECORDS_DROPPED_TOTAL = registry.register(Counter(
+    'log_records_dropped_total', '未写出的日志记录（sampled = 按比例采样丢弃，queue_full = 写出队列已满）', ['reason']))
+
+# 进行中请求
+INFLIGHT_REQUESTS = registry.register(Gauge(
+    'vllm_inflight_requests', '各 vLLM 端点进行中的请求数', ['backend']))
+SCHEDULER_QUEUE_DEPTH = registry.register(Gauge(
+    'scheduler_queue_depth', '调度器中排队的 vLLM 请求数', ['group', 'priority']))
+SCHEDULER_BULK_LIMIT = registry.register(Gauge(
+    'scheduler_bulk_limit', '当前允许的批量请求并发数', ['group']))
+
+# 冷启动（见 services/startup_report.py）
+STARTUP_PHASE_SECONDS = registry.register(Gauge(
+    'process_startup_phase_seconds', '进程启动各阶段耗时（imports / create_app / worker_init）', ['phase']))
+STARTUP_RSS_BYTES = registry.register(Gauge(
+    'process_startup_rss_bytes', '进程启动各阶段结束时的常驻内存（字节）', ['phase']))
@@ -0,0 +1,174 @@
+"""
+Paper Registry Service - 论文注册：上传一次，按 paper_id 评审
+
+注册时只解析一次 paper_json，将提取出的各部分文本（压缩后）与 token 统计写入
+paper_registry 表；paper_id 即论文内容哈希，相同论文重复注册得到同一个 id。
+"""
+
+import logging
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from services.json_codec import json_loads, json_dumps_bytes
+from services.preprocessing_service import PreprocessingService
+from services.text_processor_service import TextProcessorService
+
+logger = logging.getLogger(__name__)
+
+
+class PaperNotFoundError(LookupError):
+    """paper_id 未注册"""
+
+
+class PaperRegistryService:
+    """论文注册服务"""
+
+    CREATE_TABLE_SQL = '''
+        CREATE TABLE IF NOT EXISTS paper_registry (
+            paper_id CHAR(64) PRIMARY KEY,
+            title VARCHAR(1024),
+            sections MEDIUMBLOB,
+            stats TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''
+
+    def __init__(self, db_factory: Callable, max_cached_papers: int = 256, tokenizer_path: str = None,
+                 preprocessing: Optional[PreprocessingService] = None):
+        """
+        Args:
+            db_factory: 返回数据库连接上下文管理器的函数（即 app.get_db）
+            max_cached_papers: 进程内缓存的论文数上限
+            tokenizer_path: 用于统计 token 数的 tokenizer 路径（可选，未提供 preprocessing 时使用）
+            preprocessing: 预处理进程池（可选），提供时解析与 token 统计在子进程中执行
+        """
+        self.db_factory = db_factory
+        self.max_cached_papers = max_cached_papers
+        self.preprocessing = preprocessing
+        self.text_processor = TextProcessorService(include_authors=True, tokenizer_path=None if preprocessing else tokenizer_path)
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, paper_json: Dict[str, Any]) -> Dict[str, Any]:
+        """注册论文，返回 (不含正文的) 注册信息；已注册的论文直接返回已有记录"""
+        paper_id = TextProcessorService.compute_content_hash(paper_json)
+
+        existing = self._get_entry(paper_id)
+        if existing:
+            logger.info("论文已注册，复用: %s", paper_id)
+            return self._describe(existing, created=False)
+
+        if self.preprocessing:
+            sections = self.preprocessing.extract_sections(paper_json, include_authors=True)
+        else:
+            sections = self.text_processor.extract_sections(paper_json, include_authors=True)
+        stats = self._compute_stats(sections)
+        entry = {
+            "paper_id": paper_id,
+            "title": sections.get("title", ""),
+            "sections": sections,
+            "stats": stats,
+            "created_at": datetime.now().isoformat()
+        }
+
+        with self.db_factory() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT IGNORE INTO paper_registry (paper_id, title, sections, stats)
+                VALUES (%s, %s, %s, %s)
+            ''', (paper_id, entry["title"][:1024],
+                  zlib.compress(json_dumps_bytes(sections)), json_dumps_bytes(stats).decode('utf-8')))
+            conn.commit()
+            cursor.close()
+
+        self._remember(entry)
+        logger.info("论文注册成功: %s, 正文 %d 字符", paper_id, stats['body_chars'])
+        return self._describe(entry, created=True)
+
+    def get_sections(self, paper_id: str) -> Dict[str, str]:
+        """按 paper_id 获取已提取的各部分文本"""
+        entry = self._get_entry(paper_id)
+        if not entry:
+            raise PaperNotFoundError(f"论文未注册: {paper_id}")
+        return entry["sections"]
+
+    def describe(self, paper_id: str) -> Dict[str, Any]:
+        """获取注册信息（不含正文）"""
+        entry = self._get_entry(paper_id)
+        if not entry:
+            raise PaperNotFoundError(f"论文未注册: {paper_id}")
+        return self._describe(entry, created=False)
+
+    def _get_entry(self, paper_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._cache.get(paper_id)
+            if entry:
+                self._cache.move_to_end(paper_id)
+                return entry
+
+        entry = self._load_from_db(paper_id)
+        if entry:
+            self._remember(entry)
+        return entry
+
+    def _load_from_db(self, paper_id: str) -> Optional[Dict[str, Any]]:
+        with self.db_factory() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                'SELECT paper_id, title, sections, stats, created_at FROM paper_registry WHERE paper_id = %s',
+                (paper_id,)
+            )
+            row = cursor.fetchone()
+            cursor.close()
+
+        if not row:
+            return None
+        created_at = row.get("created_at")
+        return {
+            "paper_id": row["paper_id"],
+            "title": row.get("title") or "",
+            "sections": json_loads(zlib.decompress(row["sections"])),
+            "stats": json_loads(row["stats"]) if row.get("stats") else {},
+            "created_at": created_at.isoformat() if hasattr(created_at, "isoformat") else created_at
+        }
+
+    def _remember(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._cache[entry["paper_id"]] = entry
+            self._cache.move_to_end(entry["paper_id"])
+            while len(self._cache) > self.max_cached_papers:
+                self._cache.popitem(last=False)
+
+    def _compute_stats(self, sections: Dict[str, str]) -> Dict[str, Any]:
+        """统计各部分长度与两种组装方式的 token 数（无 tokenizer 时为 None）"""
+        stats = {f"{name}_chars": len(text or "") for name, text in sections.items()}
+        if self.preprocessing:
+            anonymous_text = self.preprocessing.assemble_text(sections, include_authors=False, normalize=False)
+            full_text = self.preprocessing.assemble_text(sections, include_authors=True, normalize=False)
+            stats["text_chars"] = len(anonymous_text)
+            stats["text_chars_with_authors"] = len(full_text)
+            stats["token_count"], stats["token_count_with_authors"] = self.preprocessing.count_tokens_many([anonymous_text, full_text])
+            return stats
+        
+        anonymous_processor = TextProcessorService(include_authors=False)
+        anonymous_processor.tokenizer = self.text_processor.tokenizer
+        anonymous_text = anonymous_processor.assemble_text(sections, auto_truncate=False)
+        full_text = self.text_processor.assemble_text(sections, auto_truncate=False)
+        stats["text_chars"] = len(anonymous_text)
+        stats["text_chars_with_authors"] = len(full_text)
+        stats["token_count"] = anonymous_processor.count_tokens(anonymous_text)
+        stats["token_count_with_authors"] = self.text_processor.count_tokens(full_text)
+        return stats
+
+    @staticmethod
+    def _describe(entry: Dict[str, Any], created: bool) -> Dict[str, Any]:
+        return {
+            "paper_id": entry["paper_id"],
+            "title": entry["title"],
+            "created": created,
+            "created_at": entry.get("created_at"),
+            "stats": entry.get("stats", {})
+        }
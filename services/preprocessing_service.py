@@ -0,0 +1,222 @@
+"""
+Preprocessing Service - 在进程池中执行论文解析与 token 统计
+
+遍历大型 paper_json 与 HuggingFace tokenizer 编码都是 CPU 密集操作且持有 GIL，
+在线程模型下一篇大论文会拖慢同进程内的所有请求（包括 /statistics 等轻量接口）。
+这里把它们交给子进程执行；同一时间到达的 token 统计请求合并为一次批量编码。
+workers 为 0 时在当前进程内执行，行为与直接调用 TextProcessorService 相同。
+"""
+
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config.config import PreprocessingConfig
+from services.metrics_service import TOKENIZE_BATCH_SIZE
+from services.text_processor_service import TextProcessorService
+
+logger = logging.getLogger(__name__)
+
+# 子进程（或 workers=0 时的当前进程）内的状态：tokenizer 只加载一次
+_worker_tokenizer_path: Optional[str] = None
+_worker_normalization_steps: Tuple[str, ...] = ()
+_worker_processors: Dict[Tuple[bool, bool], TextProcessorService] = {}
+
+
+def _init_worker(tokenizer_path: Optional[str], normalization_steps: Sequence[str]):
+    global _worker_tokenizer_path, _worker_normalization_steps
+    _worker_tokenizer_path = tokenizer_path
+    _worker_normalization_steps = tuple(normalization_steps)
+    _worker_processors.clear()
+
+
+def _get_processor(include_authors: bool, normalize: bool = True) -> TextProcessorService:
+    key = (bool(include_authors), bool(normalize))
+    processor = _worker_processors.get(key)
+    if processor is None:
+        shared = next(iter(_worker_processors.values()), None)
+        # tokenizer 在同一进程内的各处理器之间共享
+        processor = TextProcessorService(
+            include_authors=include_authors,
+            tokenizer_path=_worker_tokenizer_path if shared is None else None,
+            normalization_steps=_worker_normalization_steps if normalize else ()
+        )
+        if shared is not None:
+            processor.tokenizer = shared.tokenizer
+        _worker_processors[key] = processor
+    return processor
+
+
+def _extract_sections(paper_json: Dict[str, Any], include_authors: bool) -> Dict[str, str]:
+    return _get_processor(include_authors).extract_sections(paper_json, include_authors=include_authors)
+
+
+def _process_paper_json(paper_json: Dict[str, Any], include_authors: bool) -> str:
+    return _get_processor(include_authors).process_paper_json(paper_json, auto_truncate=False)
+
+
+def _assemble_text(sections: Dict[str, str], include_authors: bool, normalize: bool) -> str:
+    return _get_processor(include_authors, normalize).assemble_text(sections, auto_truncate=False)
+
+
+def _count_tokens_batch(texts: List[str]) -> List[Optional[int]]:
+    tokenizer = _get_processor(False).tokenizer
+    if tokenizer is None:
+        return [None] * len(texts)
+    try:
+        # 与 tokenizer.encode 相同（含特殊 token）；fast tokenizer 的批量编码在 Rust 中并行执行
+        return [len(ids) for ids in tokenizer(texts)["input_ids"]]
+    except Exception as e:
+        logger.warning(f"批量计算token数量失败: {str(e)}")
+        return [None] * len(texts)
+
+
+class PreprocessingService:
+    """论文解析与 token 统计的进程池"""
+
+    def __init__(self, config: PreprocessingConfig, normalization_steps: Sequence[str] = ()):
+        """
+        Args:
+            config: PreprocessingConfig
+            normalization_steps: 组装论文文本时执行的规范化步骤
+        """
+        self.config = config
+        self.normalization_steps = tuple(normalization_steps)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._pending: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._batcher: Optional[threading.Thread] = None
+        # 当前进程同样初始化：workers=0 或进程池损坏时在本进程内执行
+        _init_worker(config.tokenizer_path, self.normalization_steps)
+
+    @property
+    def has_tokenizer(self) -> bool:
+        return bool(self.config.tokenizer_path)
+
+    def preload(self):
+        """workers=0 时在当前进程预先加载 tokenizer（gunicorn preload 时 fork 后各 worker 共享）"""
+        if self.config.workers <= 0 and self.has_tokenizer:
+            _get_processor(False)
+    
+    def reset_after_fork(self):
+        """fork 出的 worker 进程中调用：父进程的子进程与批处理线程不属于当前进程"""
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._batcher = None
+    
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        """首次使用时创建进程池（spawn：不继承父进程中的线程与连接）"""
+        if self.config.workers <= 0:
+            return None
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.config.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.config.tokenizer_path, self.normalization_steps)
+                )
+                logger.info("预处理进程池已启动: %s 个进程", self.config.workers)
+            return self._executor
+
+    def _run(self, fn, *args):
+        executor = self._get_executor()
+        if executor is None:
+            return fn(*args)
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # 子进程异常退出（如 OOM）后重建进程池，本次调用在当前进程内完成
+            logger.error("预处理进程池已损坏，重建后继续")
+            self._reset_executor(executor)
+            return fn(*args) if fn is not _count_tokens_batch else [None] * len(args[0])
+
+    def _reset_executor(self, broken: ProcessPoolExecutor):
+        with self._executor_lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False)
+
+    def extract_sections(self, paper_json: Dict[str, Any], include_authors: bool) -> Dict[str, str]:
+        return self._run(_extract_sections, paper_json, include_authors)
+
+    def process_paper_json(self, paper_json: Dict[str, Any], include_authors: bool) -> str:
+        """paper_json -> 规范化后的论文文本（不截断）"""
+        return self._run(_process_paper_json, paper_json, include_authors)
+
+    def assemble_text(self, sections: Dict[str, str], include_authors: bool, normalize: bool = True) -> str:
+        """extract_sections 的结果 -> 论文文本（不截断）"""
+        return self._run(_assemble_text, sections, include_authors, normalize)
+
+    def count_tokens(self, text: str) -> Optional[int]:
+        """计算 token 数；没有 tokenizer 时返回 None。并发调用会合并为一次批量编码"""
+        return self.count_tokens_many([text])[0]
+
+    def count_tokens_many(self, texts: List[str]) -> List[Optional[int]]:
+        if not self.has_tokenizer or not texts:
+            return [None] * len(texts)
+        futures = []
+        for text in texts:
+            future = Future()
+            self._pending.put((text, future))
+            futures.append(future)
+        self._ensure_batcher()
+        return [future.result() for future in futures]
+
+    def _ensure_batcher(self):
+        with self._executor_lock:
+            if self._batcher is None or not self._batcher.is_alive():
+                self._batcher = threading.Thread(target=self._run_batcher, name="tokenize-batcher", daemon=True)
+                self._batcher.start()
+
+    def _run_batcher(self):
+        """收集 batch_window 内到达的请求（最多 max_batch 个）后一次编码"""
+        window = self.config.batch_window_ms / 1000
+        while True:
+            try:
+                batch = [self._pending.get(timeout=60)]
+            except queue.Empty:
+                # 长时间空闲时退出，下次调用时重新启动
+                with self._executor_lock:
+                    if self._pending.empty():
+                        self._batcher = None
+                        return
+                continue
+            deadline = time.monotonic() + window
+            while len(batch) < self.config.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            TOKENIZE_BATCH_SIZE.observe(len(batch))
+            try:
+                counts = self._run(_count_tokens_batch, [text for text, _ in batch])
+            except Exception as e:
+                logger.warning(f"计算token数量失败: {str(e)}")
+                counts = [None] * len(batch)
+            for (_, future), count in zip(batch, counts):
+                future.set_result(count)
+
+    def shutdown(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.config.workers,
+            "started": self._executor is not None,
+            "tokenizer": self.config.tokenizer_path,
+            "pending_token_counts": self._pending.qsize()
+        }
@@ -0,0 +1,135 @@
+"""
+Rate Limiter - 按 token 成本计量的客户端限流
+
+一篇 300 条参考文献的综述加 8192 max_tokens 消耗的 GPU 是一篇短论文的上百倍，按请求数限流没有意义。
+每个客户端（API key，未提供时为 IP）一个令牌桶，单位是 prompt + 生成 token：
+请求开始生成前按论文 token 数与 max_tokens 预扣估算成本，结束后按实际用量多退少补。
+估算成本超过桶容量的请求在桶满时放行，之后桶为负值，后续请求需要等待更久。
+令牌桶在进程内：gunicorn 多 worker 时额度按 worker 数均分，请求在 worker 间均匀分布时合计额度与配置一致。
+"""
+
+import logging
+import math
+import threading
+import time
+from typing import Any, Dict
+
+from config.config import RateLimitConfig
+from services.metrics_service import RATE_LIMIT_REJECTED_TOTAL, RATE_LIMIT_TOKENS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+# 清理已回满的空闲令牌桶的间隔（秒）
+PRUNE_INTERVAL = 300.0
+
+
+class RateLimitExceededError(Exception):
+    """客户端超出 token 额度"""
+
+    def __init__(self, client_id: str, cost: int, retry_after: float):
+        self.client_id = client_id
+        self.cost = cost
+        self.retry_after = retry_after
+        super().__init__(f"超出 token 额度：本次请求约 {cost:,} token，请 {math.ceil(retry_after)} 秒后重试")
+
+
+class Reservation:
+    """一次预扣：estimated 为预扣的 token 数，reconcile 后不再生效"""
+
+    __slots__ = ("client_id", "estimated", "settled")
+
+    def __init__(self, client_id: str, estimated: int):
+        self.client_id = client_id
+        self.estimated = estimated
+        self.settled = False
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated_at = now
+
+
+class TokenRateLimiter:
+    """按客户端的令牌桶"""
+
+    def __init__(self, config: RateLimitConfig, processes: int = 1):
+        """
+        Args:
+            config: RateLimitConfig（额度为整个实例合计）
+            processes: 同一实例的 worker 进程数，本进程只分到 1 / processes 的额度
+        """
+        self.config = config
+        processes = max(processes, 1)
+        self.tokens_per_second = config.tokens_per_second / processes
+        self.burst_tokens = config.burst_tokens / processes
+        self._buckets: Dict[str, _Bucket] = {}
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.enabled and self.tokens_per_second > 0
+
+    def _refill_locked(self, client_id: str, now: float) -> _Bucket:
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = self._buckets[client_id] = _Bucket(self.burst_tokens, now)
+        else:
+            bucket.tokens = min(bucket.tokens + (now - bucket.updated_at) * self.tokens_per_second,
+                                self.burst_tokens)
+            bucket.updated_at = now
+        return bucket
+
+    def reserve(self, client_id: str, cost: int) -> Reservation:
+        """
+        预扣 cost 个 token；额度不足时抛出 RateLimitExceededError（retry_after 为额度足够所需的秒数）
+        """
+        cost = max(int(cost), 0)
+        now = time.monotonic()
+        with self._lock:
+            self._prune_locked(now)
+            bucket = self._refill_locked(client_id, now)
+            # 超过容量的请求只要求桶满，避免永远无法执行
+            required = min(cost, self.burst_tokens)
+            if bucket.tokens < required:
+                retry_after = (required - bucket.tokens) / self.tokens_per_second
+                RATE_LIMIT_REJECTED_TOTAL.inc()
+                logger.warning(f"客户端 {client_id} 超出 token 额度: 需要 {cost:,}，剩余 {bucket.tokens:,.0f}")
+                raise RateLimitExceededError(client_id, cost, retry_after)
+            bucket.tokens -= cost
+        return Reservation(client_id, cost)
+
+    def reconcile(self, reservation: Reservation, actual: int):
+        """按实际用量调整预扣：多扣的退回，少扣的补扣（可使桶为负）"""
+        if reservation.settled:
+            return
+        reservation.settled = True
+        actual = max(int(actual), 0)
+        RATE_LIMIT_TOKENS_TOTAL.inc(actual)
+        with self._lock:
+            bucket = self._refill_locked(reservation.client_id, time.monotonic())
+            bucket.tokens = min(bucket.tokens + reservation.estimated - actual, self.burst_tokens)
+        if actual != reservation.estimated:
+            logger.info("token 额度结算: %s 预扣 %d，实际 %d", reservation.client_id, reservation.estimated, actual)
+
+    def _prune_locked(self, now: float):
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        full = [
+            client_id for client_id, bucket in self._buckets.items()
+            if bucket.tokens + (now - bucket.updated_at) * self.tokens_per_second >= self.burst_tokens
+        ]
+        for client_id in full:
+            del self._buckets[client_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "tokens_per_second": self.tokens_per_second,
+            "burst_tokens": self.burst_tokens,
+            "clients": len(self._buckets)
+        }
@@ -0,0 +1,76 @@
+"""
+Request Context - 当前请求的标识、接口、优先级、客户端与 token 用量
+
+接口在 before_request 中登记，VllmService 的调度器据此排队并累计实际消耗的 token（供限流结算）；
+保存在 contextvars 中，copy_context 提交到线程池的任务（如分块摘要）同样可见。
+"""
+
+import threading
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+
+# 优先级类别，按调度顺序排列
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITY_CLASSES = (INTERACTIVE, BULK)
+
+
+class TokenUsage:
+    """请求内各次 vLLM 调用实际消耗的 token"""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def add(self, prompt_tokens: int = 0, completion_tokens: int = 0):
+        with self._lock:
+            self.prompt_tokens += prompt_tokens or 0
+            self.completion_tokens += completion_tokens or 0
+            self.calls += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens, "calls": self.calls}
+
+
+@dataclass(frozen=True)
+class RequestContext:
+    priority: str = INTERACTIVE
+    client_id: str = "anonymous"
+    endpoint: str = ""
+    request_id: str = ""
+    usage: TokenUsage = field(default_factory=TokenUsage, compare=False)
+
+
+_DEFAULT_CONTEXT = RequestContext()
+_current_context: ContextVar[RequestContext] = ContextVar('request_context', default=_DEFAULT_CONTEXT)
+
+
+def parse_priority(value: str, default: str = INTERACTIVE) -> str:
+    """请求头中的优先级（interactive / bulk），无法识别时返回 default"""
+    value = (value or "").strip().lower()
+    return value if value in PRIORITY_CLASSES else default
+
+
+def set_request_context(priority: str = INTERACTIVE, client_id: str = "anonymous", endpoint: str = "",
+                        request_id: str = "") -> Token:
+    return _current_context.set(RequestContext(
+        priority=priority, client_id=client_id or "anonymous", endpoint=endpoint or "", request_id=request_id or ""
+    ))
+
+
+def reset_request_context(token: Token):
+    _current_context.reset(token)
+
+
+def get_request_context() -> RequestContext:
+    return _current_context.get()
+
+
+def record_token_usage(prompt_tokens: int = 0, completion_tokens: int = 0):
+    """累计到当前请求的 token 用量（请求之外的调用，如预热，不记录）"""
+    context = _current_context.get()
+    if context is not _DEFAULT_CONTEXT:
+        context.usage.add(prompt_tokens, completion_tokens)
@@ -0,0 +1,97 @@
+"""
+Review Archive Service - 盲评结果归档：按 session_id 重新获取，不再重新生成
+
+每个盲评会话格式化后的评审（不含模型分配）序列化为 JSON 并以 zlib 压缩后写入
+blind_review_archive 表；读取时先查进程内 LRU 缓存（缓存的同样是压缩后的字节），未命中再查数据库。
+"""
+
+import logging
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from services.cache_service import LRUCache
+from services.json_codec import json_dumps_bytes
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewNotFoundError(LookupError):
+    """session_id 没有归档记录"""
+
+
+class ReviewArchiveService:
+    """盲评结果归档"""
+
+    CREATE_TABLE_SQL = '''
+        CREATE TABLE IF NOT EXISTS blind_review_archive (
+            session_id VARCHAR(36) PRIMARY KEY,
+            review_a_model VARCHAR(255),
+            review_b_model VARCHAR(255),
+            payload MEDIUMBLOB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    '''
+
+    def __init__(self, db_factory: Callable, cache_max_bytes: int = 32 * 1024 * 1024):
+        """
+        Args:
+            db_factory: 返回数据库连接上下文管理器的函数（即 app.get_db）
+            cache_max_bytes: 进程内缓存的内存上限（字节），0 表示不缓存
+        """
+        self.db_factory = db_factory
+        # session_id -> (压缩后的 JSON, review_a 模型, review_b 模型)
+        self.cache = LRUCache("blind_review_archive", cache_max_bytes)
+
+    def save(self, session_id: str, result: Dict[str, Any], models: Tuple[str, str]):
+        """
+        归档一个盲评会话
+
+        Args:
+            session_id: 会话 ID
+            result: 返回给前端的结果（session_id、reviews、degraded 等）
+            models: (review_a 模型, review_b 模型)，仅用于提交选择，不随结果返回
+        """
+        payload = zlib.compress(json_dumps_bytes(result))
+        with self.db_factory() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO blind_review_archive (session_id, review_a_model, review_b_model, payload)
+                VALUES (%s, %s, %s, %s)
+            ''', (session_id, models[0], models[1], payload))
+            conn.commit()
+            cursor.close()
+        self.cache.put(session_id, (payload, models[0], models[1]))
+        logger.info("盲评结果已归档: %s, %d 字节", session_id, len(payload))
+
+    def get_json(self, session_id: str) -> bytes:
+        """获取归档结果（JSON 字节，可直接作为响应体）"""
+        payload, _, _ = self._get_entry(session_id)
+        return zlib.decompress(payload)
+
+    def get_models(self, session_id: str) -> Dict[str, str]:
+        """获取会话的模型分配：{"review_a": 模型, "review_b": 模型}"""
+        _, review_a_model, review_b_model = self._get_entry(session_id)
+        return {"review_a": review_a_model, "review_b": review_b_model}
+
+    def _get_entry(self, session_id: str) -> Tuple[bytes, str, str]:
+        entry = self.cache.get(session_id)
+        if entry is None:
+            entry = self._load_from_db(session_id)
+            if entry is None:
+                raise ReviewNotFoundError(f"会话不存在或未归档: {session_id}")
+            self.cache.put(session_id, entry)
+        return entry
+
+    def _load_from_db(self, session_id: str) -> Optional[Tuple[bytes, str, str]]:
+        with self.db_factory() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                'SELECT payload, review_a_model, review_b_model FROM blind_review_archive WHERE session_id = %s',
+                (session_id,)
+            )
+            row = cursor.fetchone()
+            cursor.close()
+
+        if not row:
+            return None
+        return bytes(row["payload"]), row["review_a_model"], row["review_b_model"]
@@ -0,0 +1,194 @@
+"""
+Priority Scheduler - vLLM 请求的准入调度
+
+交互式盲评与批量/离线评审共用同一组 vLLM 实例。每组副本（一个模型）一个调度器，
+按 slots 限制同时进行的请求数：有空闲时交互式请求总是先于批量请求放行，
+同一优先级内按客户端轮询，避免单个客户端的大批量提交占满队列。
+
+批量请求最多使用 slots - interactive_reserved_slots 个并发，并按交互式请求的开始延迟
+（排队 + 首 token）动态调整：p95 超过目标时减半，明显低于目标时逐个恢复；
+一段时间没有交互式请求时，批量请求可以用满全部非保留并发。
+
+调度器在进程内：gunicorn 多 worker 时每个 worker 一个，并发额度按 worker 数均分，
+批量并发也由各 worker 按自己观测到的 p95 分别调整（请求在 worker 间均匀分布时近似整体 p95）。
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional
+
+from config.config import SchedulerConfig
+from services.hedging import LatencyTracker
+from services.metrics_service import SCHEDULER_QUEUE_WAIT_SECONDS, SCHEDULER_QUEUE_DEPTH, SCHEDULER_BULK_LIMIT
+from services.request_context import INTERACTIVE, BULK, PRIORITY_CLASSES
+
+logger = logging.getLogger(__name__)
+
+# 计算交互式开始延迟 p95 的样本窗口（较小的窗口让批量并发调整后尽快反映效果）
+LATENCY_WINDOW = 50
+LATENCY_MIN_SAMPLES = 10
+
+
+class SchedulerQueueTimeoutError(RuntimeError):
+    """排队超过 queue_timeout 仍未获得执行机会"""
+
+
+class Ticket:
+    """一次放行的请求"""
+
+    __slots__ = ("scheduler", "priority", "client_id", "event", "enqueued_at", "admitted", "waited")
+
+    def __init__(self, scheduler: "PriorityScheduler", priority: str, client_id: str):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.client_id = client_id
+        self.event = threading.Event()
+        self.enqueued_at = time.monotonic()
+        self.admitted = False
+        self.waited = 0.0
+
+    def started(self, latency: float = 0.0):
+        """生成开始（收到首 token，非流式请求为放行时）；latency 为放行之后的等待时间"""
+        if self.priority == INTERACTIVE:
+            self.scheduler.observe_interactive_start(self.waited + latency)
+
+
+class PriorityScheduler:
+    """一组副本的优先级 + 客户端公平排队"""
+
+    def __init__(self, name: str, slots: int, config: SchedulerConfig, reserved_slots: Optional[int] = None):
+        """
+        Args:
+            name: 副本组名称（automatic_review / deep_review），用作指标标签
+            slots: 本进程中该组允许同时进行的请求数
+            config: SchedulerConfig
+            reserved_slots: 本进程中为交互式请求保留的并发数，默认 config.interactive_reserved_slots
+        """
+        self.name = name
+        self.config = config
+        self.slots = max(slots, 1)
+        self.reserved_slots = config.interactive_reserved_slots if reserved_slots is None else reserved_slots
+        self.max_bulk = max(self.slots - self.reserved_slots, 1)
+        self.bulk_min = min(max(config.bulk_min_slots, 1), self.max_bulk)
+        self.bulk_limit = self.max_bulk
+        self._lock = threading.Lock()
+        # 优先级 -> (客户端 -> 排队中的请求)，OrderedDict 的顺序即轮询顺序
+        self._queues: Dict[str, "OrderedDict[str, Deque[Ticket]]"] = {p: OrderedDict() for p in PRIORITY_CLASSES}
+        self._running: Dict[str, int] = {p: 0 for p in PRIORITY_CLASSES}
+        self._latency = LatencyTracker(window_size=LATENCY_WINDOW)
+        self._last_adjust = 0.0
+        self._last_interactive_at: Optional[float] = None
+        SCHEDULER_BULK_LIMIT.labels(group=name).set(self.bulk_limit)
+
+    def acquire(self, priority: str, client_id: str) -> Ticket:
+        """排队直到获得执行机会；超过 queue_timeout 抛出 SchedulerQueueTimeoutError"""
+        ticket = Ticket(self, priority, client_id)
+        with self._lock:
+            if priority == INTERACTIVE:
+                self._last_interactive_at = ticket.enqueued_at
+            self._queues[priority].setdefault(client_id, deque()).append(ticket)
+            SCHEDULER_QUEUE_DEPTH.labels(group=self.name, priority=priority).inc()
+            self._dispatch_locked()
+
+        if not ticket.event.wait(self.config.queue_timeout):
+            with self._lock:
+                if not ticket.admitted:
+                    self._remove_locked(ticket)
+                    SCHEDULER_QUEUE_DEPTH.labels(group=self.name, priority=priority).dec()
+                    logger.warning(f"vLLM 请求排队超时: {self.name} {priority} 客户端 {client_id}")
+                    raise SchedulerQueueTimeoutError(
+                        f"排队超过 {self.config.queue_timeout:g}s 未获得执行机会（{self.name}, {priority}）"
+                    )
+
+        ticket.waited = time.monotonic() - ticket.enqueued_at
+        SCHEDULER_QUEUE_WAIT_SECONDS.labels(group=self.name, priority=priority).observe(ticket.waited)
+        if ticket.waited >= 1.0:
+            logger.info("vLLM 请求排队 %.2fs 后放行: %s %s 客户端 %s", ticket.waited, self.name, priority, client_id)
+        return ticket
+
+    def release(self, ticket: Ticket):
+        with self._lock:
+            self._running[ticket.priority] -= 1
+            self._dispatch_locked()
+
+    def _dispatch_locked(self):
+        while sum(self._running.values()) < self.slots:
+            ticket = self._next_locked(INTERACTIVE)
+            if ticket is None:
+                if self._running[BULK] >= self._effective_bulk_limit():
+                    return
+                ticket = self._next_locked(BULK)
+                if ticket is None:
+                    return
+            ticket.admitted = True
+            self._running[ticket.priority] += 1
+            SCHEDULER_QUEUE_DEPTH.labels(group=self.name, priority=ticket.priority).dec()
+            ticket.event.set()
+
+    def _next_locked(self, priority: str) -> Optional[Ticket]:
+        """轮询取下一个客户端的队首请求"""
+        clients = self._queues[priority]
+        if not clients:
+            return None
+        client_id, tickets = next(iter(clients.items()))
+        ticket = tickets.popleft()
+        if tickets:
+            clients.move_to_end(client_id)
+        else:
+            del clients[client_id]
+        return ticket
+
+    def _remove_locked(self, ticket: Ticket):
+        tickets = self._queues[ticket.priority].get(ticket.client_id)
+        if tickets is not None:
+            try:
+                tickets.remove(ticket)
+            except ValueError:
+                pass
+            if not tickets:
+                del self._queues[ticket.priority][ticket.client_id]
+
+    def _effective_bulk_limit(self) -> int:
+        if self._last_interactive_at is None or \
+                time.monotonic() - self._last_interactive_at > self.config.interactive_idle_seconds:
+            return self.max_bulk
+        return self.bulk_limit
+
+    def observe_interactive_start(self, seconds: float):
+        """记录交互式请求的开始延迟，并按 p95 调整批量并发（AIMD）"""
+        self._latency.observe(self.name, seconds)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_adjust < self.config.adjust_interval:
+                return
+            self._last_adjust = now
+            p95 = self._latency.percentile(self.name, 0.95, min_samples=LATENCY_MIN_SAMPLES)
+            if p95 is None:
+                return
+            target = self.config.interactive_p95_target
+            previous = self.bulk_limit
+            if p95 > target:
+                self.bulk_limit = max(self.bulk_limit // 2, self.bulk_min)
+            elif p95 < target * 0.8:
+                self.bulk_limit = min(self.bulk_limit + 1, self.max_bulk)
+            if self.bulk_limit != previous:
+                logger.info("交互式开始延迟 p95 %.2fs（目标 %gs），%s 批量并发 %s -> %s", p95, target, self.name, previous, self.bulk_limit)
+                SCHEDULER_BULK_LIMIT.labels(group=self.name).set(self.bulk_limit)
+                self._dispatch_locked()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = {p: sum(len(tickets) for tickets in self._queues[p].values()) for p in PRIORITY_CLASSES}
+            running = dict(self._running)
+            bulk_limit = self._effective_bulk_limit()
+        p95 = self._latency.percentile(self.name, 0.95, min_samples=LATENCY_MIN_SAMPLES)
+        return {
+            "slots": self.slots,
+            "running": running,
+            "queued": queued,
+            "bulk_limit": bulk_limit,
+            "interactive_start_p95": round(p95, 3) if p95 is not None else None,
+            "interactive_p95_target": self.config.interactive_p95_target
+        }
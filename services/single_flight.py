@@ -0,0 +1,144 @@
+"""
+Single Flight - 合并相同的进行中调用
+
+用户重复点击提交、前端在响应慢时自动重试，都会对同一篇论文再发起一次完整生成。
+SingleFlight 让相同 key 的并发调用只执行一次，其余调用等待并共享结果（或异常）；
+IdempotencyStore 在此基础上按客户端提供的 Idempotency-Key 保留已完成的响应，
+连接断开后的重试可以直接取回原结果。两者都只在当前进程内生效，gunicorn 的各 worker 互不共享。
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from services.cache_service import LRUCache, estimate_size
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """相同 key 的并发调用只执行一次"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行 fn，或等待相同 key 的进行中调用完成
+
+        Returns:
+            (结果, 是否共享了其他调用的结果)；fn 抛出的异常同样传给所有等待者
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+class IdempotencyConflictError(ValueError):
+    """同一个 Idempotency-Key 对应了不同的请求内容"""
+
+
+class IdempotencyStore:
+    """按 Idempotency-Key 合并并发请求，并在 ttl 内保留成功的响应"""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        """
+        Args:
+            max_bytes: 已完成响应缓存的内存上限（字节），0 表示只合并进行中的请求
+            ttl: 已完成响应的保留时间（秒）
+        """
+        self.ttl = ttl
+        # key -> (请求指纹, 完成时间, 响应)
+        self.cache = LRUCache("idempotency", max_bytes, size_fn=lambda entry: estimate_size(entry[2]))
+        self._flight = SingleFlight("idempotency")
+        # key -> (请求指纹, 等待中的请求数)
+        self._inflight: Dict[Hashable, Tuple[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(body: bytes) -> str:
+        return hashlib.sha256(body).hexdigest()
+
+    def run(self, key: Hashable, fingerprint: str, fn: Callable[[], Any],
+            should_store: Callable[[Any], bool] = lambda value: True) -> Tuple[Any, str]:
+        """
+        执行请求，或返回同一 key 已有的结果
+
+        Returns:
+            (响应, 来源)：executed = 本次执行，joined = 等待进行中的相同请求，replayed = 已完成的响应
+        Raises:
+            IdempotencyConflictError: key 相同但请求内容不同
+        """
+        stored = self._get_stored(key, fingerprint)
+        if stored is not None:
+            return stored, "replayed"
+
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight is not None and inflight[0] != fingerprint:
+                raise IdempotencyConflictError("Idempotency-Key 已用于内容不同的请求")
+            self._inflight[key] = (fingerprint, inflight[1] + 1 if inflight else 1)
+
+        def execute():
+            # 上一次执行可能在检查缓存之后刚刚完成
+            previous = self._get_stored(key, fingerprint)
+            if previous is not None:
+                return previous
+            value = fn()
+            if should_store(value):
+                self.cache.put(key, (fingerprint, time.time(), value))
+            return value
+
+        try:
+            value, shared = self._flight.do((key, fingerprint), execute)
+        finally:
+            with self._lock:
+                _, waiters = self._inflight[key]
+                if waiters > 1:
+                    self._inflight[key] = (fingerprint, waiters - 1)
+                else:
+                    del self._inflight[key]
+        return value, "joined" if shared else "executed"
+
+    def _get_stored(self, key: Hashable, fingerprint: str) -> Optional[Any]:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        stored_fingerprint, stored_at, value = entry
+        if time.time() - stored_at > self.ttl:
+            self.cache.pop(key)
+            return None
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyConflictError("Idempotency-Key 已用于内容不同的请求")
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.cache.stats()
+        stats["in_flight"] = len(self._flight)
+        stats["ttl"] = self.ttl
+        return stats
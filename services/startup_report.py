@@ -0,0 +1,88 @@
+"""
+Startup Report - 记录进程冷启动各阶段的耗时与内存
+
+app.py 最先导入本模块，以此时刻作为起点统计模块导入耗时；create_app 与 gunicorn worker 初始化
+按阶段记录耗时、RSS 与已加载的重量级依赖，写入日志、/metrics 与健康检查，便于跟踪冷启动随功能增长的变化。
+"""
+
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from services.metrics_service import STARTUP_PHASE_SECONDS, STARTUP_RSS_BYTES
+
+logger = logging.getLogger(__name__)
+
+# 本模块的导入时刻，近似为应用开始导入的时刻
+_IMPORT_STARTED_AT = time.perf_counter()
+
+# 导入耗时或内存占用较大的可选依赖
+HEAVY_MODULES = ("transformers", "torch", "tokenizers", "mysql.connector", "flask_cors", "orjson", "zstandard")
+
+
+def current_rss_bytes() -> Optional[int]:
+    """当前常驻内存（Linux 读 /proc，其他平台退化为峰值 RSS）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 单位为字节，Linux 为 KB
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+class StartupReport:
+    """按阶段记录启动耗时与内存"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.phases: List[Dict[str, Any]] = []
+
+    def record(self, phase: str, seconds: float):
+        if os.getpid() != self.pid:
+            # fork 出的 worker 只保留自己的阶段，父进程的记录作为参考保留在日志中
+            self.pid = os.getpid()
+            self.phases = []
+        rss = current_rss_bytes()
+        heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+        self.phases.append({
+            "phase": phase,
+            "seconds": round(seconds, 3),
+            "rss_mb": round(rss / 1024 / 1024, 1) if rss is not None else None,
+            "modules": len(sys.modules),
+            "heavy_modules": heavy
+        })
+        STARTUP_PHASE_SECONDS.labels(phase=phase).set(seconds)
+        if rss is not None:
+            STARTUP_RSS_BYTES.labels(phase=phase).set(rss)
+        rss_text = f"{rss / 1024 / 1024:.1f} MB" if rss is not None else "未知"
+        logger.info(
+            f"启动阶段 {phase}: {seconds:.3f}s, RSS {rss_text}, 已加载模块 {len(sys.modules)} 个, "
+            f"重量级依赖: {', '.join(heavy) or '无'} (pid {self.pid})"
+        )
+
+    def record_imports(self):
+        """记录从本模块导入到现在的耗时（即应用模块导入耗时）"""
+        self.record("imports", time.perf_counter() - _IMPORT_STARTED_AT)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"pid": self.pid, "phases": list(self.phases)}
+
+
+startup_report = StartupReport()
@@ -0,0 +1,206 @@
+"""
+Text Normalizer - 送入模型前压缩论文文本的 token 数
+
+_extract_* 原样拷贝论文 JSON 中的文本，其中的多余空白、成串的行内引用、重复段落和
+长作者列表都会占用 prompt token。每个步骤都是 sections -> sections 的纯函数，
+重复执行结果不变；TextProcessorService.normalize_sections 按配置依次执行并统计各步骤减少的 token 数。
+"""
+
+import re
+from typing import Callable, Dict, List
+
+# 只对这些部分做空白与引用处理，标题/发表信息保持原样
+TEXT_SECTIONS = ("abstract", "body")
+
+# 短于该长度的重复段落（小节标题、"Results" 等）保留
+MIN_DUPLICATE_CHARS = 40
+
+_INLINE_SPACE_RE = re.compile(r"[ \t\u00a0\u2009\u200b]+")
+_SPACE_BEFORE_PUNCT_RE = re.compile(r" +([,.;:)\]])")
+_SPACE_AFTER_OPEN_RE = re.compile(r"([(\[]) +")
+_EMPTY_BRACKETS_RE = re.compile(r" ?(?:\(\s*\)|\[\s*\])")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+# 数字方括号引用 "[3]"、"[3, 4]"、"[3-5]"
+_CITATION_GROUP = r"\[\d+(?:\s*[,–-]\s*\d+)*\]"
+_CITATION_NUMS_RE = re.compile(r"\[(?P<nums>\d+(?:\s*[,–-]\s*\d+)*)\]")
+# 只以逗号/分号（或直接相连）分隔的引用串；作者标签、方法名与 "and" 等正文词语不属于引用串，原样保留
+_CITATION_RUN_RE = re.compile(rf"{_CITATION_GROUP}(?:(?:\s*[,;]\s*)?{_CITATION_GROUP})+")
+
+# 作者-年份引用串："(Kryscinski et al., 2020; Goyal and Durrett, 2020; Laban et al., 2022)"
+_AUTHOR_YEAR_ENTRY = r"[^;()\n]*?\b(?:19|20)\d{2}[a-z]?"
+_AUTHOR_YEAR_RUN_RE = re.compile(rf"\((?P<entries>{_AUTHOR_YEAR_ENTRY}(?:\s*;\s*{_AUTHOR_YEAR_ENTRY})+)\)")
+# 作者-年份引用串中保留的条目数
+MAX_AUTHOR_YEAR_CITATIONS = 2
+
+_REFERENCE_RE = re.compile(r"^(?P<index>\[\d+\])\s(?P<rest>.*?)(?:, (?P<year>\d{4}[a-z]?))?$")
+# 原始字符串形式的 ACL 风格条目："[i] 作者1, 作者2, and 作者3. 2021. 标题"
+_ACL_REFERENCE_RE = re.compile(r"^(?P<index>\[\d+\])\s(?P<authors>[^.]+?)\.\s(?P<year>(?:19|20)\d{2}[a-z]?)\.\s(?P<rest>.+)$")
+_PERSON_NAME_RE = re.compile(r"^[A-Z][\w.'’\-]*(?:\s+[A-Za-z][\w.'’\-]*){0,3}$")
+
+
+def _normalize_whitespace_text(text: str) -> str:
+    lines = []
+    for line in text.split("\n"):
+        line = _INLINE_SPACE_RE.sub(" ", line).strip()
+        line = _EMPTY_BRACKETS_RE.sub("", line)
+        line = _SPACE_BEFORE_PUNCT_RE.sub(r"\1", line)
+        line = _SPACE_AFTER_OPEN_RE.sub(r"\1", line)
+        lines.append(line)
+    return _BLANK_LINES_RE.sub("\n\n", "\n".join(lines)).strip("\n")
+
+
+def normalize_whitespace(sections: Dict[str, str]) -> Dict[str, str]:
+    """合并连续空白，去掉标点前多余空格与抽取后留下的空括号，最多保留一个空行"""
+    result = dict(sections)
+    for name in TEXT_SECTIONS:
+        if result.get(name):
+            result[name] = _normalize_whitespace_text(result[name])
+    if result.get("references"):
+        result["references"] = "\n".join(
+            _INLINE_SPACE_RE.sub(" ", line).strip() for line in result["references"].split("\n") if line.strip()
+        )
+    return result
+
+
+def _parse_numbers(nums: str) -> List[int]:
+    numbers = []
+    for part in re.split(r"\s*,\s*", nums):
+        bounds = re.split(r"\s*[–-]\s*", part)
+        if len(bounds) == 2 and bounds[0].isdigit() and bounds[1].isdigit():
+            start, end = int(bounds[0]), int(bounds[1])
+            if start <= end and end - start <= 100:
+                numbers.extend(range(start, end + 1))
+                continue
+        numbers.extend(int(b) for b in bounds if b.isdigit())
+    return numbers
+
+
+def _format_numbers(numbers: List[int]) -> str:
+    """[1, 2, 3, 5] -> "1-3, 5"（三个及以上连续编号合并为区间）"""
+    numbers = sorted(set(numbers))
+    parts = []
+    i = 0
+    while i < len(numbers):
+        j = i
+        while j + 1 < len(numbers) and numbers[j + 1] == numbers[j] + 1:
+            j += 1
+        if j - i >= 2:
+            parts.append(f"{numbers[i]}-{numbers[j]}")
+        else:
+            parts.extend(str(n) for n in numbers[i:j + 1])
+        i = j + 1
+    return ", ".join(parts)
+
+
+def _compact_citation_run(match: re.Match) -> str:
+    numbers: List[int] = []
+    for group in _CITATION_NUMS_RE.finditer(match.group(0)):
+        numbers.extend(_parse_numbers(group.group("nums")))
+    return f"[{_format_numbers(numbers)}]"
+
+
+def _truncate_author_year_run(match: re.Match) -> str:
+    entries = [entry.strip() for entry in match.group("entries").split(";")]
+    if len(entries) <= MAX_AUTHOR_YEAR_CITATIONS + 1:
+        return match.group(0)
+    kept = "; ".join(entries[:MAX_AUTHOR_YEAR_CITATIONS])
+    return f"({kept}; and {len(entries) - MAX_AUTHOR_YEAR_CITATIONS} more)"
+
+
+def compact_citations(sections: Dict[str, str]) -> Dict[str, str]:
+    """
+    合并以逗号/分号分隔的相邻数字引用，只改变格式，不删除引用或正文词语
+
+    "[3], [4], [5], [9]" -> "[3-5, 9]"
+    "LLM-Eval [141], Wang et al. [228], Zhou et al. [297]" 与 "BERT [3] and T5 [5]" 保持不变
+    """
+    result = dict(sections)
+    for name in TEXT_SECTIONS:
+        if result.get(name):
+            result[name] = _CITATION_RUN_RE.sub(_compact_citation_run, result[name])
+    return result
+
+
+def truncate_author_year_citations(sections: Dict[str, str]) -> Dict[str, str]:
+    """
+    三条以上的作者-年份引用只保留前两条（会从正文中删除被引文献，单独开启）
+
+    "(A et al., 2020; B, 2021; C and D, 2022; E, 2023)" -> "(A et al., 2020; B, 2021; and 2 more)"
+    """
+    result = dict(sections)
+    for name in TEXT_SECTIONS:
+        if result.get(name):
+            result[name] = _AUTHOR_YEAR_RUN_RE.sub(_truncate_author_year_run, result[name])
+    return result
+
+
+def _paragraph_key(paragraph: str) -> str:
+    return " ".join(paragraph.lower().split())
+
+
+def dedupe_paragraphs(sections: Dict[str, str]) -> Dict[str, str]:
+    """删除正文中与摘要或前文完全相同（忽略大小写与空白）的段落"""
+    result = dict(sections)
+    body = result.get("body")
+    if not body:
+        return result
+    seen = {_paragraph_key(p) for p in result.get("abstract", "").split("\n") if len(p.strip()) >= MIN_DUPLICATE_CHARS}
+    kept = []
+    for paragraph in body.split("\n"):
+        if len(paragraph.strip()) >= MIN_DUPLICATE_CHARS:
+            key = _paragraph_key(paragraph)
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append(paragraph)
+    result["body"] = "\n".join(kept)
+    return result
+
+
+def _shorten_reference(line: str) -> str:
+    match = _ACL_REFERENCE_RE.match(line)
+    if match:
+        authors = [a.strip() for a in re.split(r",\s*(?:and\s+)?|\s+and\s+", match.group("authors")) if a.strip()]
+        if len(authors) >= 2 and all(_PERSON_NAME_RE.match(a) for a in authors):
+            return f"{match.group('index')} {authors[0]} et al. {match.group('year')}. {match.group('rest')}"
+        return line
+    
+    match = _REFERENCE_RE.match(line)
+    if not match:
+        return line
+    parts = match.group("rest").split(", ")
+    # _extract_references 的格式为 "[i] 标题, 作者1, 作者2, ..., 年份"，从末尾向前识别作者
+    authors = 0
+    while authors < len(parts) - 1 and _PERSON_NAME_RE.match(parts[len(parts) - 1 - authors]):
+        authors += 1
+    if authors < 3:
+        return line
+    title = ", ".join(parts[:len(parts) - authors])
+    shortened = f"{match.group('index')} {title}, {parts[len(parts) - authors]} et al."
+    if match.group("year"):
+        shortened += f", {match.group('year')}"
+    return shortened
+
+
+def shorten_references(sections: Dict[str, str]) -> Dict[str, str]:
+    """
+    多作者的参考文献只保留第一作者 + et al. + 年份
+
+    支持 _extract_references 生成的 "[i] 标题, 作者..., 年份"（三位及以上作者）
+    与原始字符串中的 ACL 风格 "[i] 作者1, and 作者2. 年份. 标题"
+    """
+    result = dict(sections)
+    if result.get("references"):
+        result["references"] = "\n".join(_shorten_reference(line) for line in result["references"].split("\n"))
+    return result
+
+
+# 步骤名称 -> 函数，按此顺序执行
+STEPS: Dict[str, Callable[[Dict[str, str]], Dict[str, str]]] = {
+    "whitespace": normalize_whitespace,
+    "citations": compact_citations,
+    "author_year": truncate_author_year_citations,
+    "dedupe": dedupe_paragraphs,
+    "references": shorten_references,
+}
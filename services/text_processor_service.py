@@ -1,20 +1,25 @@
+import hashlib
+import importlib.util
+import json
 import logging
-from typing import Dict, Any, List, Optional
+import math
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 import re
+from services.tracing_service import trace_span
+from services.metrics_service import NORMALIZATION_TOKENS_REMOVED_TOTAL
+from services.text_normalizer import STEPS as NORMALIZATION_STEPS
 
-try:
-    from transformers import AutoTokenizer
-    HAS_TOKENIZER = True
-except ImportError:
-    HAS_TOKENIZER = False
+# transformers 导入需要数秒与数百 MB 内存，只在配置了 tokenizer 时导入
+HAS_TOKENIZER = importlib.util.find_spec("transformers") is not None
 
 logger = logging.getLogger(__name__)
 
 class TextProcessorService:
     MAX_LENGTH = 82768  # 32k字符限制
     MAX_TOKENS = 32000  # 32k token限制
+    CHARS_PER_TOKEN = 3.0  # 无tokenizer时估算token数（偏保守）
     
-    def __init__(self, include_authors=False, tokenizer_path=None):
+    def __init__(self, include_authors=False, tokenizer_path=None, normalization_steps: Optional[Sequence[str]] = None):
         """
         初始化文本处理服务
         
@@ -22,15 +27,23 @@ class TextProcessorService:
             include_authors (bool): 是否包含作者信息，默认False
                                   对于peer review，建议设为False以避免偏见
             tokenizer_path (str): tokenizer路径，用于token级别处理
+            normalization_steps: 组装文本前执行的规范化步骤（见 services/text_normalizer.py），默认不处理
         """
         self.include_authors = include_authors
         self.tokenizer = None
         
+        unknown = [step for step in normalization_steps or () if step not in NORMALIZATION_STEPS]
+        if unknown:
+            raise ValueError(f"未知的文本规范化步骤: {', '.join(unknown)}，可选: {', '.join(NORMALIZATION_STEPS)}")
+        # 按固定顺序执行，与配置中的书写顺序无关
+        self.normalization_steps = tuple(step for step in NORMALIZATION_STEPS if step in (normalization_steps or ()))
+        
         # 初始化tokenizer（如果可用）
         if HAS_TOKENIZER and tokenizer_path:
             try:
+                from transformers import AutoTokenizer
                 self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
-                logger.info(f"成功加载tokenizer: {tokenizer_path}")
+                logger.info("成功加载tokenizer: %s", tokenizer_path)
             except Exception as e:
                 logger.warning(f"无法加载tokenizer {tokenizer_path}: {str(e)}")
                 self.tokenizer = None
@@ -44,91 +57,242 @@ class TextProcessorService:
             auto_truncate: 是否自动截断到最大长度，默认True
         """
         logger.info("处理JSON格式论文数据")
-        logger.info(f"自动截断设置: {auto_truncate}")
+        logger.info("自动截断设置: %s", auto_truncate)
         
         try:
-            text_parts = []
-            
-            # 处理标题
-            title = self._extract_title(paper_json)
-            if title:
-                text_parts.append(f"Title: {title}\n")
-                logger.info(f"论文标题: {title}")
-            
-            # 处理作者（可选）
-            if self.include_authors:
-                authors_text = self._extract_authors(paper_json)
-                if authors_text:
-                    text_parts.append(f"Authors: {authors_text}\n")
-                    logger.info(f"包含作者信息: {len(authors_text)} 字符")
-            else:
-                # 对于peer review，跳过作者信息以避免偏见
-                logger.info("跳过作者信息处理（匿名评审模式）")
-            
-            # 处理发表信息
-            publication_text = self._extract_publication(paper_json)
-            if publication_text:
-                text_parts.append(f"Publication: {publication_text}\n")
-            
-            # 处理摘要
-            abstract_text = self._extract_abstract(paper_json)
-            if abstract_text:
-                text_parts.append("Abstract:\n")
-                text_parts.append(f"{abstract_text}\n")
-            
-            # 处理正文
-            body_text = self._extract_body(paper_json)
-            if body_text:
-                text_parts.append("\nMain Content:\n")
-                text_parts.append(body_text)
-            
-            # 处理参考文献
-            references_text = self._extract_references(paper_json)
-            if references_text:
-                text_parts.append("\nReferences:\n")
-                text_parts.append(references_text)
-            
-            # 合并文本
-            full_text = "\n".join(text_parts)
-            
-            # 根据参数决定是否截断
-            if auto_truncate:
-                truncated_text = self._truncate_to_max_tokens(full_text)
-                if truncated_text != full_text:
-                    logger.warning(f"论文内容已截断: 原始长度 {len(full_text)} 字符 => 截断后 {len(truncated_text)} 字符")
-                    if self.tokenizer:
-                        try:
-                            orig_tokens = len(self.tokenizer.encode(full_text))
-                            trunc_tokens = len(self.tokenizer.encode(truncated_text))
-                            logger.warning(f"Token 数量: 原始 {orig_tokens} => 截断后 {trunc_tokens}")
-                        except Exception as e:
-                            logger.warning(f"计算token数量失败: {str(e)}")
-                return truncated_text
-            else:
-                logger.info(f"未启用自动截断，返回完整论文内容: {len(full_text)} 字符")
+            sections = self.extract_sections(paper_json)
+            return self.assemble_text(sections, auto_truncate=auto_truncate)
+        except Exception as e:
+            logger.error(f"处理JSON论文数据失败: {str(e)}")
+            raise RuntimeError(f"处理JSON论文数据失败: {str(e)}")
+    
+    def extract_sections(self, paper_json: Dict[str, Any], include_authors: Optional[bool] = None) -> Dict[str, str]:
+        """
+        提取论文各部分文本（标题、作者、发表信息、摘要、正文、参考文献）
+        
+        Args:
+            paper_json: 论文JSON数据
+            include_authors: 是否提取作者，默认沿用实例设置；论文注册时提取全部以便按需组装
+        """
+        if include_authors is None:
+            include_authors = self.include_authors
+        
+        return {
+            "title": self._extract_title(paper_json),
+            "authors": self._extract_authors(paper_json) if include_authors else "",
+            "publication": self._extract_publication(paper_json),
+            "abstract": self._extract_abstract(paper_json),
+            "body": self._extract_body(paper_json),
+            "references": self._extract_references(paper_json)
+        }
+    
+    def normalize_sections(self, sections: Dict[str, str]) -> Tuple[Dict[str, str], Dict[str, int]]:
+        """
+        依次执行配置的规范化步骤
+        
+        Returns:
+            (规范化后的各部分文本, 各步骤减少的 token 数)
+        """
+        if not self.normalization_steps:
+            return sections, {}
+        
+        report = {}
+        with trace_span("normalize_text", steps=",".join(self.normalization_steps)):
+            tokens = self.estimate_tokens(self._joined_sections(sections))
+            original_tokens = tokens
+            for step in self.normalization_steps:
+                sections = NORMALIZATION_STEPS[step](sections)
+                step_tokens = self.estimate_tokens(self._joined_sections(sections))
+                report[step] = tokens - step_tokens
+                NORMALIZATION_TOKENS_REMOVED_TOTAL.labels(step=step).inc(max(report[step], 0))
+                tokens = step_tokens
+        
+        removed = original_tokens - tokens
+        logger.info(
+            f"文本规范化: {original_tokens} => {tokens} token (减少 {removed}, "
+            f"{removed / max(original_tokens, 1):.1%})，各步骤: {report}"
+        )
+        return sections, report
+    
+    @staticmethod
+    def _joined_sections(sections: Dict[str, str]) -> str:
+        return "\n".join(text for text in sections.values() if text)
+    
+    def assemble_text(self, sections: Dict[str, str], auto_truncate: bool = True, normalize: bool = True) -> str:
+        """
+        将 extract_sections 的结果组装为送入模型的论文文本
+        
+        Args:
+            sections: 论文各部分文本
+            auto_truncate: 是否自动截断到最大长度，默认True
+            normalize: 是否先执行规范化步骤，已规范化的 sections 传 False
+        """
+        if normalize:
+            sections, _ = self.normalize_sections(sections)
+        
+        text_parts = []
+        
+        # 处理标题
+        title = sections.get("title", "")
+        if title:
+            text_parts.append(f"Title: {title}\n")
+            logger.info("论文标题: %s", title)
+        
+        # 处理作者（可选）
+        if self.include_authors:
+            authors_text = sections.get("authors", "")
+            if authors_text:
+                text_parts.append(f"Authors: {authors_text}\n")
+                logger.info("包含作者信息: %s 字符", len(authors_text))
+        else:
+            # 对于peer review，跳过作者信息以避免偏见
+            logger.info("跳过作者信息处理（匿名评审模式）")
+        
+        # 处理发表信息
+        publication_text = sections.get("publication", "")
+        if publication_text:
+            text_parts.append(f"Publication: {publication_text}\n")
+        
+        # 处理摘要
+        abstract_text = sections.get("abstract", "")
+        if abstract_text:
+            text_parts.append("Abstract:\n")
+            text_parts.append(f"{abstract_text}\n")
+        
+        # 处理正文
+        body_text = sections.get("body", "")
+        if body_text:
+            text_parts.append("\nMain Content:\n")
+            text_parts.append(body_text)
+        
+        # 处理参考文献
+        references_text = sections.get("references", "")
+        if references_text:
+            text_parts.append("\nReferences:\n")
+            text_parts.append(references_text)
+        
+        # 合并文本
+        full_text = "\n".join(text_parts)
+        
+        # 根据参数决定是否截断
+        if auto_truncate:
+            truncated_text = self._truncate_to_max_tokens(full_text)
+            if truncated_text != full_text:
+                logger.warning(f"论文内容已截断: 原始长度 {len(full_text)} 字符 => 截断后 {len(truncated_text)} 字符")
                 if self.tokenizer:
                     try:
-                        tokens = len(self.tokenizer.encode(full_text))
-                        logger.info(f"完整论文的token数量: {tokens}")
-                        if tokens > self.MAX_TOKENS:
-                            logger.warning(f"警告: 论文token数量 ({tokens}) 超过了最大限制 ({self.MAX_TOKENS})，可能会被模型截断")
+                        with trace_span("tokenize", purpose="truncation_report"):
+                            orig_tokens = len(self.tokenizer.encode(full_text))
+                            trunc_tokens = len(self.tokenizer.encode(truncated_text))
+                        logger.warning(f"Token 数量: 原始 {orig_tokens} => 截断后 {trunc_tokens}")
                     except Exception as e:
                         logger.warning(f"计算token数量失败: {str(e)}")
-                return full_text
-            
+            return truncated_text
+        else:
+            logger.info("未启用自动截断，返回完整论文内容: %s 字符", len(full_text))
+            if self.tokenizer:
+                try:
+                    with trace_span("tokenize", purpose="length_check"):
+                        tokens = len(self.tokenizer.encode(full_text))
+                    logger.info("完整论文的token数量: %s", tokens)
+                    if tokens > self.MAX_TOKENS:
+                        logger.warning(f"警告: 论文token数量 ({tokens}) 超过了最大限制 ({self.MAX_TOKENS})，可能会被模型截断")
+                except Exception as e:
+                    logger.warning(f"计算token数量失败: {str(e)}")
+            return full_text
+    
+    def count_tokens(self, text: str) -> Optional[int]:
+        """计算文本 token 数；没有 tokenizer 时返回 None"""
+        if not self.tokenizer:
+            return None
+        try:
+            with trace_span("tokenize", purpose="count"):
+                return len(self.tokenizer.encode(text))
         except Exception as e:
-            logger.error(f"处理JSON论文数据失败: {str(e)}")
-            raise RuntimeError(f"处理JSON论文数据失败: {str(e)}")
+            logger.warning(f"计算token数量失败: {str(e)}")
+            return None
+    
+    def estimate_tokens(self, text: str) -> int:
+        """计算 token 数；没有 tokenizer 时按字符数估算"""
+        count = self.count_tokens(text)
+        if count is None:
+            count = int(math.ceil(len(text) / self.CHARS_PER_TOKEN))
+        return count
+    
+    def chunk_body(self, body_text: str, max_chunk_tokens: int) -> List[str]:
+        """
+        按章节边界将正文切分为不超过 max_chunk_tokens 的块
+        _extract_body 在章节之间留有空行，据此切分；超长章节再按段落、字符切分
+        """
+        chunks = []
+        current = []
+        current_tokens = 0
+        for section in body_text.split('\n\n'):
+            section = section.strip('\n')
+            if not section.strip():
+                continue
+            for piece in self._split_oversized(section, max_chunk_tokens):
+                tokens = self.estimate_tokens(piece)
+                if current and current_tokens + tokens > max_chunk_tokens:
+                    chunks.append('\n\n'.join(current))
+                    current = []
+                    current_tokens = 0
+                current.append(piece)
+                current_tokens += tokens
+        if current:
+            chunks.append('\n\n'.join(current))
+        
+        logger.info("正文切分为 %s 块（每块上限 %s token）", len(chunks), max_chunk_tokens)
+        return chunks
+    
+    def _split_oversized(self, section: str, max_tokens: int) -> List[str]:
+        """将超过上限的章节按段落切分，单个段落仍超限时按字符切分"""
+        if self.estimate_tokens(section) <= max_tokens:
+            return [section]
+        
+        max_chars = int(max_tokens * self.CHARS_PER_TOKEN)
+        pieces = []
+        current = []
+        current_tokens = 0
+        for paragraph in section.split('\n'):
+            if not paragraph.strip():
+                continue
+            if self.estimate_tokens(paragraph) > max_tokens:
+                parts = [paragraph[i:i + max_chars] for i in range(0, len(paragraph), max_chars)]
+            else:
+                parts = [paragraph]
+            for part in parts:
+                tokens = self.estimate_tokens(part)
+                if current and current_tokens + tokens > max_tokens:
+                    pieces.append('\n'.join(current))
+                    current = []
+                    current_tokens = 0
+                current.append(part)
+                current_tokens += tokens
+        if current:
+            pieces.append('\n'.join(current))
+        return pieces
+    
+    @staticmethod
+    def compute_content_hash(paper_json: Dict[str, Any]) -> str:
+        """
+        论文 JSON 的稳定内容哈希（键排序后的 sha256）
+
+        哈希作为 paper_id 持久化，固定使用标准库的规范编码：是否安装 orjson 不影响结果
+        （两者的浮点数格式与非字符串键处理不同）。
+        """
+        canonical = json.dumps(paper_json, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
     
     def _truncate_to_max_length(self, text: str) -> str:
         """截断到最大字符长度"""
         if len(text) <= self.MAX_LENGTH:
-            logger.info(f"文本字符长度 ({len(text)}) 在限制范围内，不需要截断")
+            logger.info("文本字符长度 (%s) 在限制范围内，不需要截断", len(text))
             return text
         
         logger.warning(f"文本字符长度 ({len(text)}) 超过限制 ({self.MAX_LENGTH})，进行截断")
         truncated_text = text[:self.MAX_LENGTH - 100] + "..."
-        logger.info(f"截断后字符长度: {len(truncated_text)}")
+        logger.info("截断后字符长度: %s", len(truncated_text))
         return truncated_text
     
     def _truncate_to_max_tokens(self, text: str, max_tokens: int = None) -> str:
@@ -143,18 +307,19 @@ class TextProcessorService:
         
         try:
             # token级别处理
-            tokens = self.tokenizer.encode(text)
+            with trace_span("tokenize", purpose="truncate"):
+                tokens = self.tokenizer.encode(text)
             token_count = len(tokens)
             
             if token_count <= max_tokens:
-                logger.info(f"文本token数量 ({token_count}) 在限制范围内，不需要截断")
+                logger.info("文本token数量 (%s) 在限制范围内，不需要截断", token_count)
                 return text
             
             # 截断并解码
             logger.warning(f"文本token数量 ({token_count}) 超过限制 ({max_tokens})，进行截断")
             truncated_tokens = tokens[:max_tokens - 100]  # 留一些余量给模型生成
             truncated_text = self.tokenizer.decode(truncated_tokens, skip_special_tokens=True)
-            logger.info(f"截断后token数量: {len(self.tokenizer.encode(truncated_text))}")
+            logger.info("截断后token数量: %s", len(self.tokenizer.encode(truncated_text)))
             return truncated_text
             
         except Exception as e:
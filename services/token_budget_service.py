@@ -0,0 +1,116 @@
+"""
+Token Budget Service - 按观测到的生成长度自适应设置 max_tokens
+
+记录每个 (模型, 模板) 最近的生成 token 数；max_tokens 为 "auto" 时取高分位数加余量，
+并保证 prompt + 生成不超过模型上下文窗口。vLLM 按 max_tokens 预留调度容量，
+更贴近实际的上限意味着同一张卡能同时调度更多序列。
+"""
+
+import logging
+import math
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple, Union
+
+from config.config import TokenBudgetConfig
+from services.metrics_service import COMPLETION_TOKENS
+
+logger = logging.getLogger(__name__)
+
+AUTO = "auto"
+
+# 自动取值向上取整到该粒度，避免每个请求的上限都不同
+ROUND_TO = 256
+
+
+def _percentile(sorted_values, q: float) -> int:
+    """最近秩法分位数"""
+    index = max(int(math.ceil(q * len(sorted_values))) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class TokenBudgetService:
+    """生成长度统计与 max_tokens 解析"""
+
+    def __init__(self, config: TokenBudgetConfig, token_counter: Optional[Callable[[str], Optional[int]]] = None):
+        """
+        Args:
+            config: TokenBudgetConfig
+            token_counter: 精确统计 prompt token 数的函数（可选），返回 None 时按字符数估算
+        """
+        self.config = config
+        self.token_counter = token_counter
+        self._samples: Dict[Tuple[str, str], Deque[int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, template: str, completion_tokens: Optional[int]):
+        """记录一次生成的 token 数"""
+        if not completion_tokens or completion_tokens <= 0:
+            return
+        COMPLETION_TOKENS.labels(model=model, template=template).observe(completion_tokens)
+        with self._lock:
+            samples = self._samples.get((model, template))
+            if samples is None:
+                samples = self._samples[(model, template)] = deque(maxlen=self.config.window_size)
+            samples.append(completion_tokens)
+
+    def estimate_prompt_tokens(self, prompt: str) -> int:
+        """统计 prompt token 数，无 tokenizer 时按字符数保守估算"""
+        if self.token_counter:
+            count = self.token_counter(prompt)
+            if count is not None:
+                return count
+        return int(math.ceil(len(prompt) / self.config.chars_per_token))
+
+    def resolve(self, max_tokens: Union[int, str, None], model: str, template: str, prompt: str) -> int:
+        """
+        解析最终传给 vLLM 的 max_tokens
+
+        "auto" 按观测分布取值；显式数值保持不变。两者都不超过上下文窗口减去 prompt 的剩余空间。
+        """
+        if max_tokens is None or max_tokens == AUTO:
+            requested = self.auto_max_tokens(model, template)
+            source = AUTO
+        else:
+            requested = int(max_tokens)
+            source = "request"
+
+        prompt_tokens = self.estimate_prompt_tokens(prompt)
+        available = self.config.context_window - prompt_tokens
+        if available < requested:
+            resolved = max(available, 1)
+            logger.warning(
+                f"max_tokens 受上下文窗口限制: 请求 {requested} ({source})，prompt 约 {prompt_tokens} token，"
+                f"调整为 {resolved}"
+            )
+        else:
+            resolved = requested
+        if source == AUTO:
+            logger.info("自动 max_tokens: %s/%s -> %s", model, template, resolved)
+        return resolved
+
+    def auto_max_tokens(self, model: str, template: str) -> int:
+        """高分位数 × (1 + 余量)，样本不足时返回默认值"""
+        with self._lock:
+            samples = sorted(self._samples.get((model, template), ()))
+        if len(samples) < self.config.min_samples:
+            return self.config.default_max_tokens
+        value = _percentile(samples, self.config.percentile) * (1 + self.config.headroom)
+        value = int(math.ceil(value / ROUND_TO) * ROUND_TO)
+        return max(value, self.config.min_max_tokens)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各 (模型, 模板) 的样本数、分位数与当前自动取值"""
+        with self._lock:
+            snapshot = {key: sorted(values) for key, values in self._samples.items()}
+        stats = {}
+        for (model, template), samples in snapshot.items():
+            stats[f"{model}/{template}"] = {
+                "samples": len(samples),
+                "p50": _percentile(samples, 0.5),
+                "p95": _percentile(samples, 0.95),
+                "p99": _percentile(samples, 0.99),
+                "max": samples[-1],
+                "auto_max_tokens": self.auto_max_tokens(model, template)
+            }
+        return stats
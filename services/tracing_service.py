@@ -0,0 +1,193 @@
+"""
+Tracing Service - 单请求阶段耗时追踪与按需性能剖析
+
+每个请求在 contextvars 中维护一棵 span 树，服务内部用 trace_span() 标记各阶段；
+当请求未开启追踪时 trace_span() 不做任何记录。
+"""
+
+import cProfile
+import json
+import logging
+import os
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+class Span:
+    """追踪中的一个阶段"""
+
+    __slots__ = ('name', 'attrs', 'children', 'start', 'end')
+
+    def __init__(self, name: str, attrs: Dict[str, Any] = None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.children: List['Span'] = []
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return round((end - self.start) * 1000, 3)
+
+    def to_dict(self, max_depth: Optional[int] = None) -> Dict[str, Any]:
+        """max_depth 为保留的子节点层数，超出的部分只记录省略的子节点数"""
+        data = {"name": self.name, "duration_ms": self.duration_ms}
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.children:
+            if max_depth is not None and max_depth <= 0:
+                data["omitted_children"] = len(self.children)
+            else:
+                data["children"] = [
+                    child.to_dict(None if max_depth is None else max_depth - 1) for child in self.children
+                ]
+        return data
+
+    def depth(self) -> int:
+        return 1 + max((child.depth() for child in self.children), default=0)
+
+
+def encode_trace_header(root: Span, max_bytes: int, full_trace: Optional[str] = None) -> str:
+    """
+    追踪树编码为响应头；超过 max_bytes 时逐层减少深度（分块评审的 vLLM span 很多，
+    完整的树可能超出代理的响应头上限），仍超出时只保留根节点。
+    截断时附上完整追踪树的位置：本次请求写出的剖析 .json，或获取方式
+    """
+    value = json.dumps(root.to_dict(), separators=(',', ':'))
+    if len(value) <= max_bytes:
+        return value
+    hint = full_trace or "PROFILE_ENABLED=true 时以 X-Debug-Trace: profile 请求，完整追踪树写入 PROFILE_DIR 下的 .json"
+    for depth in range(root.depth() - 2, -1, -1):
+        data = root.to_dict(max_depth=depth)
+        data["truncated"] = True
+        data["full_trace"] = hint
+        value = json.dumps(data, separators=(',', ':'))
+        if len(value) <= max_bytes:
+            return value
+    return json.dumps({"name": root.name, "duration_ms": root.duration_ms, "truncated": True}, separators=(',', ':'))
+
+
+@contextmanager
+def trace_span(name: str, **attrs):
+    """在当前请求的追踪树下记录一个阶段；没有进行中的追踪时直接跳过"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    span = Span(name, attrs)
+    parent.children.append(span)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.attrs["error"] = str(e)[:200]
+        raise
+    finally:
+        span.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def detached_span(name: str, **attrs) -> Optional[Span]:
+    """在当前追踪树下创建一个不切换上下文的 span（用于生成器等跨 yield 的场景），由调用方设置 end"""
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    span = Span(name, attrs)
+    parent.children.append(span)
+    return span
+
+
+def start_trace(name: str, **attrs):
+    """开始一个请求级追踪，返回 (根 span, 用于结束追踪的 token)"""
+    root = Span(name, attrs)
+    token = _current_span.set(root)
+    return root, token
+
+
+def finish_trace(root: Span, token) -> Span:
+    """结束请求级追踪"""
+    root.end = time.perf_counter()
+    _current_span.reset(token)
+    return root
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class RequestProfiler:
+    """按采样率对请求做 CPU 剖析与 tracemalloc 峰值内存统计，超过延迟阈值时落盘"""
+
+    def __init__(self, config):
+        self.enabled = config.tracing.profile_enabled
+        self.sample_rate = config.tracing.profile_sample_rate
+        self.latency_threshold = config.tracing.profile_latency_threshold
+        self.output_dir = config.tracing.profile_dir
+        # cProfile 与 tracemalloc 均为进程级状态，同一时刻只剖析一个请求
+        self._lock = threading.Lock()
+
+    def should_profile(self, forced: bool = False) -> bool:
+        if not self.enabled:
+            return False
+        return forced or random.random() < self.sample_rate
+
+    def start(self, forced: bool = False) -> Optional[Dict[str, Any]]:
+        """开始剖析；已有请求在剖析时返回 None。forced（X-Debug-Trace: profile）的请求不论耗时都会写出"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            profiler = cProfile.Profile()
+            started_tracemalloc = not tracemalloc.is_tracing()
+            if started_tracemalloc:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            profiler.enable()
+            return {"profiler": profiler, "started_tracemalloc": started_tracemalloc, "forced": forced}
+        except Exception as e:
+            self._lock.release()
+            logger.warning(f"启动性能剖析失败: {str(e)}")
+            return None
+
+    def stop(self, state: Dict[str, Any], endpoint: str, duration: float, trace: Optional[Span] = None) -> Optional[str]:
+        """结束剖析；请求耗时超过阈值时写出 .prof 与 .json，返回文件前缀"""
+        try:
+            profiler = state["profiler"]
+            profiler.disable()
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            if state["started_tracemalloc"]:
+                tracemalloc.stop()
+
+            if duration < self.latency_threshold and not state.get("forced"):
+                return None
+
+            os.makedirs(self.output_dir, exist_ok=True)
+            name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{endpoint.replace('/', '_').strip('_')}_{uuid.uuid4().hex[:8]}"
+            prefix = os.path.join(self.output_dir, name)
+            profiler.dump_stats(f"{prefix}.prof")
+            with open(f"{prefix}.json", 'w', encoding='utf-8') as f:
+                json.dump({
+                    "endpoint": endpoint,
+                    "duration_seconds": duration,
+                    "tracemalloc_peak_bytes": peak_bytes,
+                    "trace": trace.to_dict() if trace else None
+                }, f, ensure_ascii=False, indent=2)
+            logger.info("慢请求剖析已写出: %s.prof (耗时 %.2f 秒, 峰值内存 %.1f MB)", prefix, duration, peak_bytes / 1024 / 1024)
+            return prefix
+        except Exception as e:
+            logger.warning(f"写出性能剖析失败: {str(e)}")
+            return None
+        finally:
+            self._lock.release()
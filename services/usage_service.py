@@ -0,0 +1,173 @@
+"""
+Usage Service - 记录每次生成的 token 用量与性能
+
+每次 vLLM 生成（评审、深度评审、分块摘要）结束后记录一行：接口、客户端、优先级、模型、模板、
+prompt / 生成 token 数、总耗时、首 token 延迟与生成速度，供容量规划、成本归属与自适应限流使用。
+写入在后台线程中批量执行，不阻塞请求；sink 为 db（review_usage 表）、log（JSON Lines 文件）或 none。
+"""
+
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from config.config import UsageConfig
+from services.json_codec import json_dumps_bytes
+from services.request_context import get_request_context
+
+logger = logging.getLogger(__name__)
+
+SINKS = ("db", "log", "none")
+
+# 单次批量写入的最大行数
+BATCH_SIZE = 100
+
+COLUMNS = (
+    "created_at", "endpoint", "client_id", "priority", "model", "template", "mode",
+    "prompt_tokens", "completion_tokens", "wall_time", "ttft", "tokens_per_second"
+)
+
+
+class UsageRecorder:
+    """生成用量记录（后台批量写入）"""
+
+    CREATE_TABLE_SQL = '''
+        CREATE TABLE IF NOT EXISTS review_usage (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            created_at DATETIME(3),
+            endpoint VARCHAR(64),
+            client_id VARCHAR(128),
+            priority VARCHAR(16),
+            model VARCHAR(255),
+            template VARCHAR(64),
+            mode VARCHAR(16),
+            prompt_tokens INT,
+            completion_tokens INT,
+            wall_time FLOAT,
+            ttft FLOAT,
+            tokens_per_second FLOAT,
+            INDEX idx_review_usage_created_at (created_at),
+            INDEX idx_review_usage_client (client_id)
+        )
+    '''
+
+    def __init__(self, config: UsageConfig, db_factory: Optional[Callable] = None):
+        """
+        Args:
+            config: UsageConfig
+            db_factory: 返回数据库连接上下文管理器的函数（sink 为 db 时使用）
+        """
+        if config.sink not in SINKS:
+            raise ValueError(f"未知的用量记录方式: {config.sink}，可选: {', '.join(SINKS)}")
+        self.config = config
+        self.db_factory = db_factory
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=config.max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.sink != "none"
+
+    def record(self, template: str, usage: Dict[str, Any]):
+        """记录一次生成（usage 为 VllmService 返回的用量统计）"""
+        if not self.enabled or not usage:
+            return
+        context = get_request_context()
+        row = {
+            "created_at": datetime.now(),
+            "endpoint": context.endpoint,
+            "client_id": context.client_id,
+            "priority": context.priority,
+            "model": usage.get("model"),
+            "template": template,
+            "mode": usage.get("mode"),
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+            "wall_time": usage.get("wall_time"),
+            "ttft": usage.get("ttft"),
+            "tokens_per_second": usage.get("tokens_per_second")
+        }
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("用量记录队列已满，丢弃一条记录")
+            return
+        self._ensure_writer()
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="usage-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                rows = [self._queue.get(timeout=60)]
+            except queue.Empty:
+                # 长时间空闲时退出，下次记录时重新启动
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+                continue
+            # 等待一个刷新间隔，合并这段时间内的记录
+            deadline = self.config.flush_interval
+            while len(rows) < BATCH_SIZE:
+                try:
+                    rows.append(self._queue.get(timeout=deadline))
+                except queue.Empty:
+                    break
+                deadline = 0.05
+            try:
+                if self.config.sink == "db":
+                    self._write_db(rows)
+                else:
+                    self._write_log(rows)
+                self.written += len(rows)
+            except Exception as e:
+                self.dropped += len(rows)
+                logger.warning(f"写入用量记录失败（{len(rows)} 条）: {str(e)}")
+
+    def _write_db(self, rows: List[Dict[str, Any]]):
+        placeholders = ", ".join(["%s"] * len(COLUMNS))
+        with self.db_factory() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                f"INSERT INTO review_usage ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                [tuple(row.get(column) for column in COLUMNS) for row in rows]
+            )
+            conn.commit()
+            cursor.close()
+
+    def _write_log(self, rows: List[Dict[str, Any]]):
+        directory = os.path.dirname(self.config.log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = b"".join(
+            json_dumps_bytes(dict(row, created_at=row["created_at"].isoformat(timespec="milliseconds"))) + b"\n"
+            for row in rows
+        )
+        # 无缓冲追加，整批一次 write：多个 worker 写同一文件时行不会交错
+        with open(self.config.log_path, "ab", buffering=0) as f:
+            f.write(data)
+
+    def reset_after_fork(self):
+        """fork 出的 worker 进程中调用：父进程的写入线程不属于当前进程"""
+        self._queue = queue.Queue(maxsize=self.config.max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sink": self.config.sink,
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped
+        }
@@ -1,44 +1,274 @@
 import requests
+import itertools
 import logging
-import json
-from typing import Optional, Generator
+import math
+import queue
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Generator, Dict, List, Tuple, Callable
 from config.config import AppConfig
 from models.vllm_models import VllmRequest, VllmMessage, VllmResponse
+from services.json_codec import json_loads, json_dumps_bytes, JSONDecodeError
+from services.tracing_service import trace_span, detached_span
+from services.hedging import LatencyTracker, HedgeBudget
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.deadline_watchdog import DeadlineWatchdog
+from services.request_context import get_request_context, record_token_usage, PRIORITY_CLASSES
+from services.scheduler import PriorityScheduler, Ticket
+from services.metrics_service import (
+    GENERATION_SECONDS, TIME_TO_FIRST_TOKEN_SECONDS, PROMPT_TOKENS_TOTAL,
+    COMPLETION_TOKENS_TOTAL, ERRORS_TOTAL, INFLIGHT_REQUESTS, HEDGED_REQUESTS_TOTAL, VLLM_TIMEOUTS_TOTAL
+)
 
 logger = logging.getLogger(__name__)
 
+
+class VllmTimeoutError(RuntimeError):
+    """请求在某个阶段（connect / ttft / idle / total）超时"""
+    
+    def __init__(self, url: str, phase: str, limit: float):
+        self.url = url
+        self.phase = phase
+        self.limit = limit
+        super().__init__(f"vLLM 请求超时 ({phase} > {limit:g}s): {url}")
+
+
+def _is_backend_failure(error: requests.exceptions.RequestException) -> bool:
+    """连接错误、超时与 5xx 计入熔断；4xx（如上下文超长）说明端点本身正常"""
+    response = getattr(error, "response", None)
+    if response is not None:
+        return response.status_code >= 500
+    return True
+
+
+class _StreamAttempt:
+    """对冲流式请求中的一次尝试"""
+    
+    def __init__(self, url: str):
+        self.url = url
+        self.cancelled = threading.Event()
+        self.response = None
+        self.usage: Dict = {}
+        self._lock = threading.Lock()
+    
+    def attach(self, response):
+        with self._lock:
+            self.response = response
+            cancelled = self.cancelled.is_set()
+        if cancelled:
+            VllmService._abort_response(response)
+    
+    def cancel(self):
+        with self._lock:
+            self.cancelled.set()
+            response = self.response
+        if response is not None:
+            VllmService._abort_response(response)
+
 class VllmService:
     def __init__(self, config: AppConfig):
         self.config = config
-        self.automatic_review_url = config.vllm.automatic_review_url.rstrip('/')
-        self.deep_review_url = config.vllm.deep_review_url.rstrip('/')
+        # 端点可用逗号分隔配置多个副本，按进行中请求数最少选择
+        self.automatic_review_urls = self._parse_urls(config.vllm.automatic_review_url)
+        self.deep_review_urls = self._parse_urls(config.vllm.deep_review_url)
+        self.automatic_review_url = self.automatic_review_urls[0]
+        self.deep_review_url = self.deep_review_urls[0]
         self.automatic_review_model = config.vllm.automatic_review_model
         self.deep_review_model = config.vllm.deep_review_model
         
-        logger.info(f"自动评审端点: {self.automatic_review_url}, 模型: {self.automatic_review_model}")
-        logger.info(f"深度评审端点: {self.deep_review_url}, 模型: {self.deep_review_model}")
+        logger.info("自动评审端点: %s, 模型: %s", ', '.join(self.automatic_review_urls), self.automatic_review_model)
+        logger.info("深度评审端点: %s, 模型: %s", ', '.join(self.deep_review_urls), self.deep_review_model)
+        
+        # 各端点当前进行中的请求数（供健康检查与副本选择读取）
+        self._inflight_lock = threading.Lock()
+        self._inflight: Dict[str, int] = {url: 0 for url in self.automatic_review_urls + self.deep_review_urls}
+        # 进行中请求数相同时轮询
+        self._rotation = itertools.count()
+        
+        # 对冲请求：按模型统计 TTFT 作为自适应阈值，额度限制额外负载
+        self._ttft_tracker = LatencyTracker()
+        self._hedge_budget = HedgeBudget(ratio=config.vllm.hedge_budget_ratio)
+        
+        # 流式请求的分阶段超时（首 token / 分片间隔 / 总时长）
+        self._watchdog = DeadlineWatchdog()
+        
+        # 复用到各端点的 HTTP 连接（keep-alive）
+        self._session = self._new_session()
+        
+        # 各副本组的优先级调度（交互式优先，同优先级内按客户端轮询）
+        self._schedulers = self._new_schedulers()
+        
+        # 各端点熔断器：连续失败后快速失败，不再让请求等待超时
+        self._breakers: Dict[str, CircuitBreaker] = {
+            url: CircuitBreaker(
+                url,
+                failure_threshold=config.vllm.circuit_failure_threshold,
+                recovery_timeout=config.vllm.circuit_recovery_timeout
+            )
+            for url in self.automatic_review_urls + self.deep_review_urls
+        }
         
         self._warmup_model()
     
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=len(self._inflight),
+            pool_maxsize=self.config.vllm.http_pool_size
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+    
+    def _new_schedulers(self) -> Dict[str, PriorityScheduler]:
+        scheduler_config = self.config.scheduler
+        if not scheduler_config.enabled:
+            return {}
+        # 配置的并发是整个实例（所有 worker）合计，每个 worker 只分到其中一份
+        processes = self.config.server.worker_processes
+        return {
+            group: PriorityScheduler(
+                group,
+                math.ceil(scheduler_config.slots_per_replica * len(urls) / processes),
+                scheduler_config,
+                reserved_slots=math.ceil(scheduler_config.interactive_reserved_slots / processes)
+            )
+            for group, urls in (("automatic_review", self.automatic_review_urls), ("deep_review", self.deep_review_urls))
+        }
+    
+    def reset_after_fork(self):
+        """
+        fork 出的 worker 进程中调用：父进程的连接、线程与计数不可复用
+        直接丢弃继承的 Session（关闭会影响父进程仍在使用的 socket 状态），重新创建
+        """
+        self._session = self._new_session()
+        self._schedulers = self._new_schedulers()
+        self._watchdog = DeadlineWatchdog()
+        self._inflight_lock = threading.Lock()
+        self._inflight = {url: 0 for url in self._inflight}
+    
+    @staticmethod
+    def _parse_urls(value: str) -> List[str]:
+        urls = [url.strip().rstrip('/') for url in value.split(',') if url.strip()]
+        if not urls:
+            raise ValueError(f"无效的 vLLM 端点配置: {value!r}")
+        return urls
+    
+    def get_backends(self) -> List[Dict[str, str]]:
+        """返回所有后端端点信息（多副本时名称带序号）"""
+        backends = []
+        for name, urls, model in [
+            ("automatic_review", self.automatic_review_urls, self.automatic_review_model),
+            ("deep_review", self.deep_review_urls, self.deep_review_model)
+        ]:
+            for index, url in enumerate(urls):
+                backend_name = name if len(urls) == 1 else f"{name}[{index}]"
+                backends.append({"name": backend_name, "url": url, "model": model})
+        return backends
+    
+    def get_replica_count(self, model_name: str = None) -> int:
+        """模型可用的副本数"""
+        return len(self._get_replicas(model_name))
+    
+    def _get_replicas(self, model_name: str = None) -> List[str]:
+        return self.deep_review_urls if model_name == "deep-review-7b" else self.automatic_review_urls
+    
+    def get_circuit_state(self, url: str) -> Optional[Dict]:
+        """获取端点熔断器状态"""
+        breaker = self._breakers.get(url)
+        return breaker.snapshot() if breaker else None
+    
+    def get_inflight_count(self, url: str) -> int:
+        """获取端点当前进行中的请求数"""
+        return self._inflight.get(url, 0)
+    
+    @contextmanager
+    def _track_inflight(self, url: str):
+        """统计端点进行中的请求数"""
+        with self._inflight_lock:
+            self._inflight[url] = self._inflight.get(url, 0) + 1
+        INFLIGHT_REQUESTS.labels(backend=url).inc()
+        try:
+            yield
+        finally:
+            with self._inflight_lock:
+                self._inflight[url] -= 1
+            INFLIGHT_REQUESTS.labels(backend=url).dec()
+    
+    def get_scheduler_stats(self) -> Dict[str, Dict]:
+        return {group: scheduler.stats() for group, scheduler in self._schedulers.items()}
+    
+    @contextmanager
+    def _schedule(self, model_name: str = None):
+        """按当前请求的优先级与客户端排队，获得执行机会后返回 Ticket（未启用调度时为 None）"""
+        scheduler = self._schedulers.get("deep_review" if model_name == "deep-review-7b" else "automatic_review")
+        if scheduler is None:
+            yield None
+            return
+        context = get_request_context()
+        ticket = scheduler.acquire(context.priority, context.client_id)
+        try:
+            yield ticket
+        finally:
+            scheduler.release(ticket)
+    
+    def _vllm_priority(self) -> Optional[int]:
+        """传给 vLLM 的优先级：interactive = 0，bulk = 1"""
+        if not self.config.scheduler.vllm_priority:
+            return None
+        return PRIORITY_CLASSES.index(get_request_context().priority)
+    
+    def get_model(self, model_name: str = None) -> str:
+        """根据模型名称获取实际请求的模型名"""
+        return self.deep_review_model if model_name == "deep-review-7b" else self.automatic_review_model
+    
     def _get_endpoint_and_model(self, model_name: str = None):
-        """根据模型名称获取对应的端点和模型名"""
+        """根据模型名称获取对应的端点（进行中请求最少的副本）和模型名"""
         if model_name == "deep-review-7b":
-            url = self.deep_review_url
+            urls = self.deep_review_urls
             model = self.deep_review_model
         else:
-            url = self.automatic_review_url
+            urls = self.automatic_review_urls
             model = self.automatic_review_model
         
-        return url, model
+        return self._select_replica(urls), model
+    
+    def _select_replica(self, urls: List[str]) -> str:
+        if len(urls) == 1:
+            return urls[0]
+        # 优先选择未熔断的副本；全部熔断时照常选择，由熔断器快速失败
+        available = [url for url in urls if self._breakers[url].allow_request()]
+        urls = available or urls
+        offset = next(self._rotation) % len(urls)
+        rotated = urls[offset:] + urls[:offset]
+        with self._inflight_lock:
+            return min(rotated, key=lambda url: self._inflight.get(url, 0))
     
-    def generate_text(self, prompt: str, temperature: float = 0.0, max_tokens: int = 8192, model_name: str = None) -> str:
+    def generate_text(self, prompt: str, temperature: float = 0.0, max_tokens: int = 8192, model_name: str = None,
+                      stop: Optional[List[str]] = None) -> str:
         """通用文本生成方法，直接接收完整的prompt"""
+        content, _ = self.generate_text_with_usage(prompt, temperature, max_tokens, model_name, stop)
+        return content
+    
+    def generate_text_with_usage(self, prompt: str, temperature: float = 0.0, max_tokens: int = 8192, model_name: str = None,
+                                 stop: Optional[List[str]] = None) -> Tuple[str, Dict]:
+        """同 generate_text，额外返回 vLLM 报告的 token 用量"""
+        with self._schedule(model_name) as ticket:
+            if ticket is not None:
+                # 非流式请求没有首 token 信号，开始延迟只计排队时间
+                ticket.started()
+            return self._generate_text_with_usage(prompt, temperature, max_tokens, model_name, stop)
+    
+    def _generate_text_with_usage(self, prompt: str, temperature: float, max_tokens: int, model_name: Optional[str],
+                                  stop: Optional[List[str]]) -> Tuple[str, Dict]:
         logger.info("Calling vLLM to generate text")
-        logger.info(f"温度设置: {temperature}, 最大生成token: {max_tokens}")
+        logger.info("温度设置: %s, 最大生成token: %s", temperature, max_tokens)
         
         # 获取对应的端点和模型
         url, model = self._get_endpoint_and_model(model_name)
-        logger.info(f"使用模型: {model}, 端点: {url}")
+        logger.info("使用模型: %s, 端点: %s", model, url)
         
         try:
             # 创建请求
@@ -48,30 +278,58 @@ class VllmService:
                     VllmMessage(role="user", content=prompt)
                 ],
                 max_tokens=max_tokens,
-                temperature=temperature
+                temperature=temperature,
+                stop=stop or self.config.vllm.stop_sequences,
+                priority=self._vllm_priority()
             )
             
             # 调用API
-            logger.info(f"调用 API: {url}/v1/chat/completions, 模型: {model}")
-            response = self._call_vllm_api(vllm_request, url)
+            logger.info("调用 API: %s/v1/chat/completions, 模型: %s", url, model)
+            start_time = time.perf_counter()
+            with trace_span("vllm.generate", model=model, url=url, max_tokens=max_tokens) as span:
+                response = self._call_vllm_api(vllm_request, url)
+                if span is not None and response.usage:
+                    span.attrs["usage"] = response.usage
+            wall_time = time.perf_counter() - start_time
+            GENERATION_SECONDS.labels(model=model, mode="blocking").observe(wall_time)
+            self._record_usage(model, response.usage)
             content = response.get_content()
             
             if not content.strip():
                 raise RuntimeError("vLLM 服务返回空结果")
                 
-            logger.info(f"vLLM 文本生成完成，输出长度: {len(content)} 字符")
-            return content
+            logger.info("vLLM 文本生成完成，输出长度: %s 字符", len(content))
+            return content, self._usage_stats(model, "blocking", response.usage, wall_time)
             
+        except CircuitOpenError as e:
+            ERRORS_TOTAL.labels(model=model).inc()
+            logger.warning(f"vLLM 调用被熔断器拒绝: {str(e)}")
+            raise
         except Exception as e:
+            ERRORS_TOTAL.labels(model=model).inc()
             logger.error(f"vLLM 调用失败: {str(e)}")
             raise RuntimeError(f"文本生成失败: {str(e)}")
     
-    def generate_text_stream(self, prompt: str, temperature: float = 0.0, max_tokens: int = 8192, model_name: str = None) -> Generator[str, None, None]:
-        """通用文本生成方法（流式），直接接收完整的prompt"""
+    def generate_text_stream(self, prompt: str, temperature: float = 0.0, max_tokens: int = 8192, model_name: str = None,
+                             stop: Optional[List[str]] = None, usage: Optional[Dict] = None) -> Generator[str, None, None]:
+        """
+        通用文本生成方法（流式），直接接收完整的prompt
+        调用方提前结束迭代（close）时会关闭到 vLLM 的连接，vLLM 随之中止该请求
+        
+        usage: 传入字典时，流结束（包括提前关闭）后写入 token 用量、耗时、首 token 延迟与生成速度
+        """
+        with self._schedule(model_name) as ticket:
+            yield from self._generate_text_stream(prompt, temperature, max_tokens, model_name, stop, ticket, usage)
+    
+    def _generate_text_stream(self, prompt: str, temperature: float, max_tokens: int, model_name: Optional[str],
+                              stop: Optional[List[str]], ticket: Optional[Ticket],
+                              usage: Optional[Dict]) -> Generator[str, None, None]:
         logger.info("Calling vLLM to generate text (streaming)")
         
         # 获取对应的端点和模型
         url, model = self._get_endpoint_and_model(model_name)
+        replicas = self._get_replicas(model_name)
+        hedged = self.config.vllm.hedge_enabled and len(replicas) > 1
         
         try:
             # 创建流式请求
@@ -82,98 +340,403 @@ class VllmService:
                 ],
                 max_tokens=max_tokens,
                 temperature=temperature,
-                stream=True
+                stream=True,
+                stop=stop or self.config.vllm.stop_sequences,
+                priority=self._vllm_priority(),
+                stream_usage=self.config.vllm.stream_usage
             )
             
             # 调用流式API
-            for chunk in self._call_vllm_stream_api(vllm_request, url):
-                yield chunk
+            start_time = time.perf_counter()
+            span = detached_span("vllm.generate_stream", model=model, url=url, max_tokens=max_tokens)
+            first_token = True
+            ttft = None
+            chunks = 0
+            # vLLM 在分片中报告的用量（stream_options.include_usage）
+            reported: Dict = {}
+            if hedged:
+                source = self._hedged_stream(vllm_request, url, replicas, model, span, usage=reported)
+            else:
+                source = self._call_vllm_stream_api(vllm_request, url, usage=reported)
+            try:
+                for chunk in source:
+                    if first_token:
+                        ttft = time.perf_counter() - start_time
+                        TIME_TO_FIRST_TOKEN_SECONDS.labels(model=model).observe(ttft)
+                        if not hedged:
+                            self._ttft_tracker.observe(model, ttft)
+                        if ticket is not None:
+                            ticket.started(ttft)
+                        if span is not None:
+                            span.attrs["ttft_ms"] = round(ttft * 1000, 3)
+                        first_token = False
+                    chunks += 1
+                    yield chunk
+            except GeneratorExit:
+                # 调用方已拿到所需内容，提前结束不算失败
+                GENERATION_SECONDS.labels(model=model, mode="stream").observe(time.perf_counter() - start_time)
+                logger.info("vLLM 流式生成被调用方提前终止")
+                raise
+            finally:
+                source.close()
+                # vLLM 未报告用量时（旧版本或关闭了 VLLM_STREAM_USAGE），生成 token 数按分片数估算
+                stream_usage = {
+                    "prompt_tokens": reported.get("prompt_tokens", 0),
+                    "completion_tokens": reported.get("completion_tokens") or chunks
+                }
+                if chunks or reported:
+                    self._record_usage(model, stream_usage)
+                stats = self._usage_stats(model, "stream", stream_usage, time.perf_counter() - start_time, ttft)
+                if usage is not None:
+                    usage.update(stats)
+                if span is not None:
+                    span.attrs["usage"] = stats
+                    span.end = time.perf_counter()
+            GENERATION_SECONDS.labels(model=model, mode="stream").observe(time.perf_counter() - start_time)
             
             logger.info("vLLM 文本生成流式完成")
             
+        except CircuitOpenError as e:
+            ERRORS_TOTAL.labels(model=model).inc()
+            logger.warning(f"vLLM 流式调用被熔断器拒绝: {str(e)}")
+            raise
         except Exception as e:
+            ERRORS_TOTAL.labels(model=model).inc()
             logger.error(f"vLLM 流式调用失败: {str(e)}")
             raise RuntimeError(f"文本流式生成失败: {str(e)}")
     
-    def _call_vllm_api(self, vllm_request: VllmRequest, url: str = None) -> VllmResponse:
-        """调用API"""
+    def _hedge_delay(self, model: str) -> float:
+        """对冲阈值：观测到的 TTFT 分位数，样本不足时用默认值"""
+        vllm_config = self.config.vllm
+        observed = self._ttft_tracker.percentile(model, vllm_config.hedge_percentile, min_samples=20)
+        if observed is None:
+            return vllm_config.hedge_default_delay
+        return max(observed, vllm_config.hedge_min_delay)
+    
+    def _start_stream_attempt(self, vllm_request: VllmRequest, url: str, model: str, events: "queue.Queue") -> _StreamAttempt:
+        """在后台线程中发起一次流式请求，分片以 (attempt, 类型, 内容) 写入 events"""
+        attempt = _StreamAttempt(url)
+        
+        def run():
+            start_time = time.perf_counter()
+            first_token = True
+            try:
+                for chunk in self._call_vllm_stream_api(vllm_request, url, attempt=attempt, usage=attempt.usage):
+                    if attempt.cancelled.is_set():
+                        break
+                    if first_token:
+                        self._ttft_tracker.observe(model, time.perf_counter() - start_time)
+                        first_token = False
+                    events.put((attempt, "chunk", chunk))
+                events.put((attempt, "done", None))
+            except Exception as e:
+                events.put((attempt, "error", e))
+        
+        threading.Thread(target=run, name=f"vllm-stream-{url}", daemon=True).start()
+        return attempt
+    
+    def _hedged_stream(self, vllm_request: VllmRequest, primary_url: str, replicas: List[str], model: str, span=None,
+                       usage: Optional[Dict] = None) -> Generator[str, None, None]:
+        """
+        对冲流式请求：首 token 超过阈值未到（或主请求在此之前就失败）时向另一副本发送重复请求，
+        先返回首 token（或先结束）的一方胜出，另一方立即被中断；usage 写入胜出一方报告的用量
+        """
+        self._hedge_budget.deposit()
+        events: "queue.Queue" = queue.Queue()
+        attempts = [self._start_stream_attempt(vllm_request, primary_url, model, events)]
+        delay = self._hedge_delay(model)
+        deadline = time.perf_counter() + delay
+        failed = 0
+        winner = None
+        first = None
+        
+        def start_backup(reason: str) -> bool:
+            if not self._hedge_budget.try_spend():
+                HEDGED_REQUESTS_TOTAL.labels(model=model, outcome="budget_exhausted").inc()
+                return False
+            backup_url = self._select_replica([url for url in replicas if url != primary_url])
+            logger.info("%s，向 %s 发送对冲请求", reason, backup_url)
+            attempts.append(self._start_stream_attempt(vllm_request, backup_url, model, events))
+            return True
+        
+        try:
+            while winner is None:
+                timeout = max(deadline - time.perf_counter(), 0) if deadline is not None else None
+                try:
+                    attempt, kind, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    deadline = None
+                    start_backup(f"首 token {delay:.2f}s 未返回")
+                    continue
+                
+                if kind == "error":
+                    failed += 1
+                    if failed < len(attempts):
+                        continue
+                    # 主请求在对冲阈值之前就失败：预算允许时立即改用另一副本，而不是直接报错
+                    if deadline is not None:
+                        deadline = None
+                        if start_backup(f"首 token 前请求失败（{payload}）"):
+                            continue
+                    raise payload
+                winner = attempt
+                first = payload
+            
+            for attempt in attempts:
+                if attempt is not winner:
+                    attempt.cancel()
+            if len(attempts) > 1:
+                outcome = "primary_won" if winner is attempts[0] else "hedge_won"
+                HEDGED_REQUESTS_TOTAL.labels(model=model, outcome=outcome).inc()
+                logger.info("对冲请求结果: %s, 胜出端点 %s", outcome, winner.url)
+                if span is not None:
+                    span.attrs["hedge"] = outcome
+                    span.attrs["url"] = winner.url
+            
+            kind = "chunk" if first is not None else "done"
+            while kind == "chunk":
+                yield first
+                attempt, kind, first = events.get()
+                while attempt is not winner:
+                    attempt, kind, first = events.get()
+            if kind == "error":
+                raise first
+        finally:
+            # 调用方提前结束或出错时中断所有仍在进行的请求
+            for attempt in attempts:
+                attempt.cancel()
+            if winner is not None and usage is not None:
+                usage.update(winner.usage)
+    
+    @staticmethod
+    def _abort_response(response):
+        """中断流式响应：关闭底层 socket，阻塞在读取上的线程会立即返回"""
+        sock = None
+        try:
+            sock = getattr(getattr(response.raw, "_connection", None), "sock", None)
+            if sock is None:
+                sock = response.raw._fp.fp.raw._sock
+        except AttributeError:
+            pass
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        try:
+            response.close()
+        except Exception:
+            pass
+    
+    @staticmethod
+    def _usage_stats(model: str, mode: str, usage: dict, wall_time: float, ttft: Optional[float] = None) -> Dict:
+        """单次生成的用量与性能：token 数、总耗时、首 token 延迟与生成速度（流式按首 token 之后的时间计算）"""
+        usage = usage or {}
+        completion_tokens = usage.get("completion_tokens")
+        decode_time = wall_time - (ttft or 0.0)
+        return {
+            "model": model,
+            "mode": mode,
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": completion_tokens,
+            "wall_time": round(wall_time, 3),
+            "ttft": round(ttft, 3) if ttft is not None else None,
+            "tokens_per_second": round(completion_tokens / decode_time, 1) if completion_tokens and decode_time > 0 else None
+        }
+    
+    def _record_usage(self, model: str, usage: dict):
+        """记录 vLLM 返回的 token 用量"""
+        if not usage:
+            return
+        PROMPT_TOKENS_TOTAL.labels(model=model).inc(usage.get('prompt_tokens', 0) or 0)
+        COMPLETION_TOKENS_TOTAL.labels(model=model).inc(usage.get('completion_tokens', 0) or 0)
+        record_token_usage(usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+    
+    def _timeout_error(self, url: str, phase: str) -> VllmTimeoutError:
+        vllm_config = self.config.vllm
+        limit = {
+            "connect": vllm_config.connect_timeout,
+            "ttft": vllm_config.ttft_timeout,
+            "idle": vllm_config.idle_timeout,
+            "total": vllm_config.timeout
+        }[phase]
+        VLLM_TIMEOUTS_TOTAL.labels(backend=url, phase=phase).inc()
+        logger.error(f"vLLM 请求超时: 阶段 {phase}，上限 {limit:g}s，端点 {url}")
+        return VllmTimeoutError(url, phase, limit)
+    
+    def _call_vllm_api(self, vllm_request: VllmRequest, url: str = None, use_breaker: bool = True) -> VllmResponse:
+        """
+        调用API（非流式：连接超时 + 总时长超时，vLLM 生成结束前不会返回任何数据）
+        use_breaker=False 时不经过熔断器（预热：启动阶段 vLLM 尚未就绪的失败不计入熔断）
+        """
         if url is None:
             url = self.automatic_review_url
         
         api_url = f"{url}/v1/chat/completions"
+        breaker = self._breakers[url] if use_breaker else None
+        if breaker is not None:
+            breaker.before_call()
         
         try:
-            response = requests.post(
-                api_url,
-                json=vllm_request.to_dict(),
-                timeout=self.config.vllm.timeout,
-                headers={'Content-Type': 'application/json'}
-            )
-            response.raise_for_status()
-            
-            return VllmResponse.from_dict(response.json())
+            with self._track_inflight(url):
+                response = self._session.post(
+                    api_url,
+                    data=json_dumps_bytes(vllm_request.to_dict()),
+                    timeout=(self.config.vllm.connect_timeout, self.config.vllm.timeout),
+                    headers={'Content-Type': 'application/json'}
+                )
+                response.raise_for_status()
+                if breaker is not None:
+                    breaker.record_success()
+                
+                return VllmResponse.from_dict(json_loads(response.content))
             
         except requests.exceptions.RequestException as e:
+            if breaker is not None:
+                if _is_backend_failure(e):
+                    breaker.record_failure(str(e))
+                else:
+                    breaker.record_success()
+            if isinstance(e, requests.exceptions.ConnectTimeout):
+                raise self._timeout_error(url, "connect")
+            if isinstance(e, requests.exceptions.ReadTimeout):
+                raise self._timeout_error(url, "total")
             logger.error(f"vLLM API 调用失败: {str(e)}")
             raise RuntimeError(f"vLLM API 调用失败: {str(e)}")
+        except Exception as e:
+            # 与流式调用一致：其余异常也结束本次熔断记录，避免占住半开探测名额
+            if breaker is not None:
+                breaker.record_failure(str(e))
+            raise
 
-    def _call_vllm_stream_api(self, vllm_request: VllmRequest, url: str = None) -> Generator[str, None, None]:
-        """调用流式API"""
+    def _call_vllm_stream_api(self, vllm_request: VllmRequest, url: str = None,
+                              attempt: Optional[_StreamAttempt] = None, usage: Optional[Dict] = None) -> Generator[str, None, None]:
+        """
+        调用流式API；attempt 为对冲请求中的一次尝试，收到响应头后登记连接以便中断
+        超时分阶段执行：连接、首 token、分片间隔与总时长，由 watchdog 在超时后中断连接
+        usage 传入字典时写入分片中报告的最新用量
+        """
         if url is None:
             url = self.automatic_review_url
             
         api_url = f"{url}/v1/chat/completions"
+        breaker = self._breakers[url]
+        breaker.before_call()
+        vllm_config = self.config.vllm
+        start = time.monotonic()
+        total_deadline = start + vllm_config.timeout
+        watch = None
         
         try:
-            response = requests.post(
-                api_url,
-                json=vllm_request.to_dict(),
-                timeout=self.config.vllm.timeout,
-                headers={'Content-Type': 'application/json'},
-                stream=True
-            )
-            response.raise_for_status()
-            
-            for line in response.iter_lines():
-                if line:
-                    line = line.decode('utf-8')
-                    if line.startswith('data: '):
-                        data_content = line[6:]  # 移除 'data: ' 前缀
-                        
-                        if data_content.strip() == '[DONE]':
-                            break
+            with self._track_inflight(url):
+                # 读超时作为兜底：响应头同样受首 token 超时限制
+                response = self._session.post(
+                    api_url,
+                    data=json_dumps_bytes(vllm_request.to_dict()),
+                    timeout=(vllm_config.connect_timeout, max(vllm_config.ttft_timeout, vllm_config.idle_timeout)),
+                    headers={'Content-Type': 'application/json'},
+                    stream=True
+                )
+                if attempt is not None:
+                    attempt.attach(response)
+                watch = self._watchdog.watch(lambda: self._abort_response(response))
+                watch.set_deadline(min(start + vllm_config.ttft_timeout, total_deadline),
+                                   "ttft" if vllm_config.ttft_timeout < vllm_config.timeout else "total")
+                try:
+                    response.raise_for_status()
+                    # 响应头正常即视为端点可用（调用方可能提前结束迭代）
+                    breaker.record_success()
+                    first_token = True
+                
+                    for line in response.iter_lines():
+                        if line:
+                            line = line.decode('utf-8')
+                            if line.startswith('data: '):
+                                data_content = line[6:]  # 移除 'data: ' 前缀
                             
-                        try:
-                            chunk_data = json.loads(data_content)
-                            choices = chunk_data.get('choices', [])
-                            if choices and len(choices) > 0:
-                                delta = choices[0].get('delta', {})
-                                content = delta.get('content', '')
-                                if content:
-                                    yield content
-                        except json.JSONDecodeError:
-                            # 忽略无法解析的行
-                            continue
+                                if data_content.strip() == '[DONE]':
+                                    break
+                                
+                                try:
+                                    chunk_data = json_loads(data_content)
+                                    if usage is not None and chunk_data.get('usage'):
+                                        usage.update(chunk_data['usage'])
+                                    choices = chunk_data.get('choices', [])
+                                    if choices and len(choices) > 0:
+                                        delta = choices[0].get('delta', {})
+                                        content = delta.get('content', '')
+                                        if content:
+                                            first_token = False
+                                            yield content
+                                except JSONDecodeError:
+                                    # 忽略无法解析的行
+                                    continue
+                        if not first_token:
+                            # 首 token 之后按分片间隔计时，同时不超过总时长
+                            idle_deadline = time.monotonic() + vllm_config.idle_timeout
+                            if idle_deadline < total_deadline:
+                                watch.set_deadline(idle_deadline, "idle")
+                            else:
+                                watch.set_deadline(total_deadline, "total")
+                    if watch.expired_phase is not None:
+                        # 连接被中断后 iter_lines 也可能正常结束
+                        raise self._timeout_error(url, watch.expired_phase)
+                except VllmTimeoutError:
+                    raise
+                except Exception as e:
+                    if watch.expired_phase is not None:
+                        raise self._timeout_error(url, watch.expired_phase) from e
+                    raise
+                finally:
+                    watch.cancel()
+                    # 提前结束迭代时关闭连接，vLLM 检测到断开后中止生成
+                    response.close()
             
+        except VllmTimeoutError as e:
+            breaker.record_failure(str(e))
+            raise
         except requests.exceptions.RequestException as e:
+            # 对冲中被主动中断的请求不计入熔断
+            if attempt is not None and attempt.cancelled.is_set():
+                breaker.release()
+            elif _is_backend_failure(e):
+                breaker.record_failure(str(e))
+            else:
+                breaker.record_success()
+            if isinstance(e, requests.exceptions.ConnectTimeout):
+                raise self._timeout_error(url, "connect")
+            if isinstance(e, requests.exceptions.ReadTimeout):
+                # 响应头迟迟未返回为首 token 超时，之后为分片间隔超时
+                raise self._timeout_error(url, "ttft" if watch is None else "idle")
             logger.error(f"vLLM 流式API 调用失败: {str(e)}")
             raise RuntimeError(f"vLLM 流式API 调用失败: {str(e)}")
+        except Exception as e:
+            # 其余异常同样要结束本次调用在熔断器上的记录，否则半开状态的探测名额一直被占用
+            if attempt is not None and attempt.cancelled.is_set():
+                breaker.release()
+            else:
+                breaker.record_failure(str(e))
+            raise
 
     def _warmup_model(self):
-        """预热模型"""
-        try:
-            logger.info("正在预热vLLM模型...")
-            
-            dummy_request = VllmRequest(
-                model=self.automatic_review_model,
-                messages=[
-                    VllmMessage(role="system", content="You are an AI assistant."),
-                    VllmMessage(role="user", content="test")
-                ],
-                max_tokens=10,
-                temperature=0.1
-            )
-            self._call_vllm_api(dummy_request, self.automatic_review_url)
-            logger.info("vLLM模型预热完成")
-        except Exception as e:
-            logger.warning(f"模型预热失败，但服务仍可正常运行: {str(e)}")
\ No newline at end of file
+        """预热模型：逐个副本执行，某个副本失败不影响其余副本，也不计入熔断"""
+        logger.info("正在预热vLLM模型...")
+        
+        dummy_request = VllmRequest(
+            model=self.automatic_review_model,
+            messages=[
+                VllmMessage(role="system", content="You are an AI assistant."),
+                VllmMessage(role="user", content="test")
+            ],
+            max_tokens=10,
+            temperature=0.1
+        )
+        failed = 0
+        for url in self.automatic_review_urls:
+            try:
+                self._call_vllm_api(dummy_request, url, use_breaker=False)
+            except Exception as e:
+                failed += 1
+                logger.warning(f"模型预热失败，但服务仍可正常运行: {url}: {str(e)}")
+        if failed < len(self.automatic_review_urls):
+            logger.info("vLLM模型预热完成: %s/%s 个副本", len(self.automatic_review_urls) - failed, len(self.automatic_review_urls))
\ No newline at end of file
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from config.config import AppConfig
+from models.vllm_models import VllmMessage, VllmRequest
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from services.vllm_service import VllmService
+
+
+def _open(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure("boom")
+
+
+def _expire(breaker: CircuitBreaker):
+    # 跳过 recovery_timeout，下一次检查进入半开状态
+    breaker._opened_at = time.monotonic() - breaker.recovery_timeout - 1
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("backend", failure_threshold=3, recovery_timeout=30)
+    breaker.record_failure("boom")
+    breaker.record_failure("boom")
+    breaker.record_success()
+    breaker.record_failure("boom")
+    assert breaker.state == CLOSED
+
+    _open(breaker)
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_half_open_probe_closes_or_reopens():
+    breaker = CircuitBreaker("backend", failure_threshold=2, recovery_timeout=30, half_open_max_calls=1)
+    _open(breaker)
+    _expire(breaker)
+    assert breaker.state == HALF_OPEN
+
+    breaker.before_call()
+    # 探测名额已被占用
+    assert not breaker.allow_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure("still down")
+    assert breaker.state == OPEN
+
+    _expire(breaker)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_release_returns_half_open_slot():
+    breaker = CircuitBreaker("backend", failure_threshold=1, recovery_timeout=30)
+    _open(breaker)
+    _expire(breaker)
+    breaker.before_call()
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_stream_unexpected_error_frees_half_open_slot(monkeypatch):
+    service = VllmService(AppConfig())
+    url = service.automatic_review_url
+    breaker = service._breakers[url]
+    _open(breaker)
+    _expire(breaker)
+
+    def post(*args, **kwargs):
+        raise ValueError("unexpected")
+
+    monkeypatch.setattr(service._session, "post", post)
+    request = VllmRequest(model="m", messages=[VllmMessage(role="user", content="hi")])
+    with pytest.raises(ValueError):
+        list(service._call_vllm_stream_api(request, url))
+
+    # 探测失败重新熔断；等待结束后可以再次探测，而不是一直被占用的名额拒绝
+    assert breaker.state == OPEN
+    _expire(breaker)
+    assert breaker.allow_request()
@@ -0,0 +1,74 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from services.compression_service import RequestDecompressionMiddleware
+
+LIMIT = 64 * 1024
+
+
+def _echo_app(environ, start_response):
+    body = environ["wsgi.input"].read()
+    start_response("200 OK", [("Content-Type", "application/octet-stream")])
+    return [body]
+
+
+def _call(body: bytes, encoding: str):
+    captured = {}
+
+    def start_response(status, headers):
+        captured["status"] = status
+
+    environ = {
+        "HTTP_CONTENT_ENCODING": encoding,
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": io.BytesIO(body),
+    }
+    result = b"".join(RequestDecompressionMiddleware(_echo_app, LIMIT)(environ, start_response))
+    return captured["status"], result
+
+
+def test_gzip_roundtrip():
+    status, body = _call(gzip.compress(b"paper" * 100), "gzip")
+    assert status.startswith("200")
+    assert body == b"paper" * 100
+
+
+def test_zstd_roundtrip():
+    zstandard = pytest.importorskip("zstandard")
+    payload = json.dumps({"title": "t" * 1000}).encode()
+    status, body = _call(zstandard.ZstdCompressor().compress(payload), "zstd")
+    assert status.startswith("200")
+    assert body == payload
+
+
+def test_zstd_bomb_rejected():
+    zstandard = pytest.importorskip("zstandard")
+    bomb = zstandard.ZstdCompressor().compress(b"\0" * (LIMIT * 64))
+    assert len(bomb) < LIMIT
+    status, _ = _call(bomb, "zstd")
+    assert status.startswith("413")
+
+
+def test_zstd_bomb_without_content_size_rejected():
+    zstandard = pytest.importorskip("zstandard")
+    # 流式压缩的帧头不带原始大小
+    bomb = zstandard.ZstdCompressor(write_content_size=False).compressobj()
+    data = bomb.compress(b"\0" * (LIMIT * 64)) + bomb.flush()
+    status, _ = _call(data, "zstd")
+    assert status.startswith("413")
+
+
+def test_zstd_truncated_frame_rejected():
+    zstandard = pytest.importorskip("zstandard")
+    data = zstandard.ZstdCompressor().compress(b"paper body " * 500)
+    status, _ = _call(data[:-6], "zstd")
+    assert status.startswith("400")
+
+
+def test_gzip_truncated_rejected():
+    data = gzip.compress(b"paper body " * 500)
+    status, _ = _call(data[:-6], "gzip")
+    assert status.startswith("400")
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+from flask import Flask, jsonify
+
+from services.json_codec import FastJSONProvider
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.json.ensure_ascii = False
+    app.json.compact = True
+    return app
+
+
+@pytest.mark.parametrize("args, kwargs, expected", [
+    (({"标题": "论文"},), {}, {"标题": "论文"}),
+    ((1, "a"), {}, [1, "a"]),
+    ((), {"score": 6}, {"score": 6}),
+    ((), {}, None),
+])
+def test_jsonify_arguments(app, args, kwargs, expected):
+    with app.app_context():
+        response = jsonify(*args, **kwargs)
+    assert response.mimetype == "application/json"
+    assert json.loads(response.get_data()) == expected
+
+
+def test_jsonify_rejects_args_and_kwargs(app):
+    with app.app_context(), pytest.raises(TypeError):
+        jsonify(1, score=6)
@@ -0,0 +1,42 @@
+import json
+import logging
+
+from config.config import LoggingConfig
+from services.logging_service import SamplingFilter, configure_logging, stop_logging
+
+
+def _record(name: str, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 1, "message", None, None)
+
+
+def test_sampling_filter_uses_longest_prefix():
+    sampling = SamplingFilter({"services": 0.5, "services.vllm_service": 0.1})
+    assert sampling.rate_for("services.vllm_service") == 0.1
+    assert sampling.rate_for("services.vllm_service.stream") == 0.1
+    assert sampling.rate_for("services.text_processor_service") == 0.5
+    assert sampling.rate_for("services_extra") is None
+    assert sampling.rate_for("app") is None
+
+
+def test_sampling_filter_keeps_warnings():
+    sampling = SamplingFilter({"services": 0.0})
+    assert not sampling.filter(_record("services.vllm_service"))
+    assert sampling.filter(_record("services.vllm_service", logging.WARNING))
+    assert sampling.filter(_record("app"))
+
+
+def test_configure_logging_samples_child_loggers(capsys):
+    configure_logging(LoggingConfig(level="INFO", format="json", sampling={
+        "tests.sampled": 0.0,
+        "tests.sampled.kept": 1.0,
+    }))
+    try:
+        logging.getLogger("tests.sampled.child").info("dropped")
+        logging.getLogger("tests.sampled.child").warning("warning kept")
+        logging.getLogger("tests.sampled.kept.child").info("child kept")
+        logging.getLogger("tests.other").info("unsampled kept")
+    finally:
+        stop_logging()
+
+    messages = [json.loads(line)["message"] for line in capsys.readouterr().err.splitlines()]
+    assert messages == ["warning kept", "child kept", "unsampled kept"]
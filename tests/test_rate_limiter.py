@@ -0,0 +1,60 @@
+import types
+
+import pytest
+
+from config.config import RateLimitConfig
+from services import rate_limiter
+from services.rate_limiter import RateLimitExceededError, TokenRateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def _limiter(processes: int = 1) -> TokenRateLimiter:
+    return TokenRateLimiter(RateLimitConfig(enabled=True, tokens_per_second=100, burst_tokens=1000), processes)
+
+
+def test_bucket_refills_over_time(clock):
+    limiter = _limiter()
+    limiter.reserve("client", 1000)
+    with pytest.raises(RateLimitExceededError) as exc:
+        limiter.reserve("client", 500)
+    assert exc.value.retry_after == pytest.approx(5.0)
+
+    clock[0] += 5
+    limiter.reserve("client", 500)
+    # 回满后不超过容量
+    clock[0] += 3600
+    limiter.reserve("client", 1000)
+    with pytest.raises(RateLimitExceededError):
+        limiter.reserve("client", 1)
+
+
+def test_reconcile_refunds_and_charges(clock):
+    limiter = _limiter()
+    reservation = limiter.reserve("client", 800)
+    limiter.reconcile(reservation, 300)
+    limiter.reserve("client", 700)
+
+    reservation = limiter.reserve("other", 100)
+    limiter.reconcile(reservation, 1100)
+    # 少扣的补扣使桶为负，需要等待回到所需额度
+    with pytest.raises(RateLimitExceededError) as exc:
+        limiter.reserve("other", 100)
+    assert exc.value.retry_after == pytest.approx(2.0)
+
+
+def test_quota_divided_per_worker(clock):
+    limiter = _limiter(processes=4)
+    assert limiter.tokens_per_second == 25
+    assert limiter.burst_tokens == 250
+
+    # 超过本 worker 容量的请求只要求桶满
+    limiter.reserve("client", 1000)
+    with pytest.raises(RateLimitExceededError) as exc:
+        limiter.reserve("client", 250)
+    assert exc.value.retry_after == pytest.approx(1000 / 25)
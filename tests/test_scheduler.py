@@ -0,0 +1,77 @@
+import threading
+import time
+
+from config.config import SchedulerConfig
+from services.request_context import BULK, INTERACTIVE
+from services.scheduler import PriorityScheduler
+
+
+def _wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.005)
+
+
+def _acquire_in_background(scheduler: PriorityScheduler, priority: str, client_id: str, admitted: list):
+    def run():
+        admitted.append((priority, client_id, scheduler.acquire(priority, client_id)))
+
+    queued = scheduler.stats()["queued"][priority]
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    # 保证入队顺序确定
+    _wait_until(lambda: scheduler.stats()["queued"][priority] == queued + 1)
+    return thread
+
+
+def test_interactive_admitted_before_bulk():
+    scheduler = PriorityScheduler("test_priority", slots=1, config=SchedulerConfig(queue_timeout=5),
+                                  reserved_slots=0)
+    held = scheduler.acquire(BULK, "batch")
+    admitted = []
+    _acquire_in_background(scheduler, BULK, "batch", admitted)
+    _acquire_in_background(scheduler, INTERACTIVE, "user", admitted)
+
+    scheduler.release(held)
+    _wait_until(lambda: len(admitted) == 1)
+    assert admitted[0][:2] == (INTERACTIVE, "user")
+
+    scheduler.release(admitted[0][2])
+    _wait_until(lambda: len(admitted) == 2)
+    assert admitted[1][:2] == (BULK, "batch")
+    scheduler.release(admitted[1][2])
+
+
+def test_clients_round_robin_within_priority():
+    scheduler = PriorityScheduler("test_round_robin", slots=1, config=SchedulerConfig(queue_timeout=5),
+                                  reserved_slots=0)
+    held = scheduler.acquire(BULK, "a")
+    admitted = []
+    for client_id in ("a", "a", "b"):
+        _acquire_in_background(scheduler, BULK, client_id, admitted)
+
+    scheduler.release(held)
+    for expected in range(1, 4):
+        _wait_until(lambda: len(admitted) == expected)
+        scheduler.release(admitted[-1][2])
+    assert [client_id for _, client_id, _ in admitted] == ["a", "b", "a"]
+
+
+def test_bulk_limit_shrinks_and_recovers():
+    config = SchedulerConfig(interactive_p95_target=1.0, adjust_interval=0, bulk_min_slots=1)
+    scheduler = PriorityScheduler("test_aimd", slots=10, config=config, reserved_slots=2)
+    assert scheduler.bulk_limit == 8
+
+    # 交互式开始延迟超过目标：批量并发逐次减半，不低于 bulk_min_slots
+    limits = []
+    for _ in range(13):
+        scheduler.observe_interactive_start(5.0)
+        limits.append(scheduler.bulk_limit)
+    # 样本数达到 LATENCY_MIN_SAMPLES（10）之前不调整
+    assert limits == [8] * 9 + [4, 2, 1, 1]
+
+    # 延迟回落后每次加 1，直到全部非保留并发
+    for _ in range(60):
+        scheduler.observe_interactive_start(0.1)
+    assert scheduler.bulk_limit == 8
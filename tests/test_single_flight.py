@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from services.single_flight import IdempotencyConflictError, IdempotencyStore, SingleFlight
+
+
+def _run_concurrently(target, count: int):
+    results = [None] * count
+
+    def run(index):
+        try:
+            results[index] = ("ok", target())
+        except Exception as e:
+            results[index] = ("error", e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def _leader_blocked_call(release: threading.Event, started: threading.Event, calls: list, outcome):
+    def fn():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return fn
+
+
+def test_concurrent_callers_share_one_result():
+    flight = SingleFlight("test")
+    release, started, calls = threading.Event(), threading.Event(), []
+    fn = _leader_blocked_call(release, started, calls, {"review": "ok"})
+
+    threads, results = _run_concurrently(lambda: flight.do("paper", fn), 5)
+    assert started.wait(5)
+    # 等其余调用进入等待后再放行
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert [status for status, _ in results] == ["ok"] * 5
+    assert sorted(shared for _, (_, shared) in results) == [False, True, True, True, True]
+    assert all(value == {"review": "ok"} for _, (value, _) in results)
+    assert len(flight) == 0
+
+
+def test_error_reaches_every_waiter():
+    flight = SingleFlight("test")
+    release, started, calls = threading.Event(), threading.Event(), []
+    error = RuntimeError("vLLM 不可用")
+    fn = _leader_blocked_call(release, started, calls, error)
+
+    threads, results = _run_concurrently(lambda: flight.do("paper", fn), 4)
+    assert started.wait(5)
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [("error", error)] * 4
+    # 失败后不残留进行中的调用，下一次重新执行
+    assert flight.do("paper", lambda: "retry") == ("retry", False)
+
+
+def test_idempotency_replays_stored_response():
+    store = IdempotencyStore(max_bytes=1 << 20, ttl=60)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return {"score": 6}
+
+    assert store.run("key", "fp", fn) == ({"score": 6}, "executed")
+    assert store.run("key", "fp", fn) == ({"score": 6}, "replayed")
+    assert len(calls) == 1
+
+
+def test_idempotency_conflict_on_different_body():
+    store = IdempotencyStore(max_bytes=1 << 20, ttl=60)
+    store.run("key", store.fingerprint(b'{"a": 1}'), lambda: "first")
+    with pytest.raises(IdempotencyConflictError):
+        store.run("key", store.fingerprint(b'{"a": 2}'), lambda: "second")
+
+
+def test_idempotency_conflict_while_in_flight():
+    store = IdempotencyStore(max_bytes=1 << 20, ttl=60)
+    release, started, calls = threading.Event(), threading.Event(), []
+    fn = _leader_blocked_call(release, started, calls, "first")
+
+    threads, results = _run_concurrently(lambda: store.run("key", "fp-1", fn), 1)
+    assert started.wait(5)
+    try:
+        with pytest.raises(IdempotencyConflictError):
+            store.run("key", "fp-2", lambda: "second")
+    finally:
+        release.set()
+        threads[0].join(5)
+    assert results == [("ok", ("first", "executed"))]
+
+
+def test_idempotency_skips_unstored_and_expired_responses():
+    store = IdempotencyStore(max_bytes=1 << 20, ttl=60)
+    assert store.run("failed", "fp", lambda: {"error": 1}, should_store=lambda value: False)[1] == "executed"
+    assert store.run("failed", "fp", lambda: {"ok": 1})[1] == "executed"
+
+    expired = IdempotencyStore(max_bytes=1 << 20, ttl=0)
+    expired.run("key", "fp", lambda: "first")
+    time.sleep(0.01)
+    assert expired.run("key", "fp", lambda: "second") == ("second", "executed")
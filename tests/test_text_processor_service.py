@@ -0,0 +1,21 @@
+import hashlib
+import json
+
+from services import json_codec
+from services.text_processor_service import TextProcessorService
+
+
+def test_content_hash_is_canonical_and_key_order_independent():
+    paper = {"title": "论文", "body": [{"section": "引言", "score": 1.0}], "year": 2024}
+    reordered = {"year": 2024, "body": [{"score": 1.0, "section": "引言"}], "title": "论文"}
+    canonical = json.dumps(paper, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+    assert TextProcessorService.compute_content_hash(paper) == hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    assert TextProcessorService.compute_content_hash(reordered) == TextProcessorService.compute_content_hash(paper)
+
+
+def test_content_hash_does_not_depend_on_codec(monkeypatch):
+    paper = {"title": "论文", "score": 1e-7, "values": [0.1, 3.0]}
+    expected = TextProcessorService.compute_content_hash(paper)
+    monkeypatch.setattr(json_codec, "HAS_ORJSON", not json_codec.HAS_ORJSON)
+    assert TextProcessorService.compute_content_hash(paper) == expected
@@ -0,0 +1,15 @@
+import math
+
+from services.automatic_review_service import AutomaticReviewService
+
+
+def test_review_service_uses_token_counter():
+    service = AutomaticReviewService(config=None, token_counter=lambda prompt: 7)
+    assert service.token_budget.estimate_prompt_tokens("x" * 300) == 7
+
+
+def test_token_counter_falls_back_to_estimate():
+    # 没有 tokenizer 时 PreprocessingService.count_tokens 返回 None
+    service = AutomaticReviewService(config=None, token_counter=lambda prompt: None)
+    expected = math.ceil(300 / service.token_budget.config.chars_per_token)
+    assert service.token_budget.estimate_prompt_tokens("x" * 300) == expected
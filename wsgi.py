@@ -0,0 +1,10 @@
+"""
+生产环境入口：gunicorn -c gunicorn.conf.py wsgi:app
+
+应用在导入时创建一次（preload_app 时在 gunicorn 父进程中，模型预热也只执行一次），
+后台线程与连接池由 gunicorn.conf.py 的 post_worker_init 在各 worker 中启动。
+"""
+
+from app import create_app
+
+app = create_app(start_background_tasks=False)